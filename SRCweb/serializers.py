@@ -0,0 +1,67 @@
+from typing import Callable, Iterator, List, Optional
+from django.db.models import QuerySet
+from rest_framework.fields import DateTimeField
+
+# Shared field used to format datetimes exactly like a ModelSerializer would
+_datetime_field = DateTimeField()
+
+
+def _next_datetime(values: Iterator) -> Optional[str]:
+    return _datetime_field.to_representation(next(values))
+
+
+class ValuesSerializer:
+    """
+    Serializes rows fetched with `.values_list()` straight into dicts, skipping
+    the per-object DRF field machinery. The output matches the equivalent
+    ModelSerializer, so the two can be swapped without changing the JSON.
+
+    Subclasses declare their schema with `fields`, a list of lookups in output
+    order. A `(name, ValuesSerializer)` tuple nests a (non-null) relation, and
+    any name in `datetime_fields` is rendered as an ISO 8601 string.
+    """
+    fields = []
+    datetime_fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.lookups = list(cls._lookups(''))
+        cls.build = staticmethod(cls._make_builder())
+
+    @classmethod
+    def _lookups(cls, prefix: str) -> Iterator[str]:
+        for field in cls.fields:
+            if isinstance(field, tuple):
+                name, nested = field
+                yield from nested._lookups(f'{prefix}{name}__')
+            else:
+                yield prefix + field
+
+    @classmethod
+    def _make_builder(cls) -> Callable[[Iterator], dict]:
+        steps = []
+        for field in cls.fields:
+            if isinstance(field, tuple):
+                name, nested = field
+                steps.append((name, nested.build))
+            elif field in cls.datetime_fields:
+                steps.append((field, _next_datetime))
+            else:
+                steps.append((field, next))
+
+        def build(values: Iterator) -> dict:
+            return {name: step(values) for name, step in steps}
+
+        return build
+
+    @classmethod
+    def many(cls, queryset: QuerySet) -> List[dict]:
+        build = cls.build
+        return [build(iter(row)) for row in queryset.values_list(*cls.lookups)]
+
+    @classmethod
+    def one(cls, queryset: QuerySet) -> Optional[dict]:
+        row = queryset.values_list(*cls.lookups).first()
+        if row is None:
+            return None
+        return cls.build(iter(row))
@@ -249,3 +249,11 @@ else:  # production
 
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30 days
 MAX_UPLOAD_SIZE = "5242880"
+# How ranked tiers are assigned: 'linear' between the lowest and highest MMR,
+# or 'quantile' by each player's position on the leaderboard
+RANKED_TIER_MODE = os.getenv('RANKED_TIER_MODE', 'linear')
+# Each spectator long-polling an event's changes holds a worker thread for up to
+# events.lib.LONG_POLL_TIMEOUT seconds, so the server needs about as many threads
+# as spectators on top of normal traffic. Past this many waiting in one process,
+# polls answer at once and ask the client to retry later.
+EVENT_LONG_POLL_MAX_WAITERS = int(os.getenv('EVENT_LONG_POLL_MAX_WAITERS', '8'))
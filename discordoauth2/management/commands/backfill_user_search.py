@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from discordoauth2.models import User, normalize_search
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Fills in the lowercase search columns for existing users.'
+
+    def handle(self, *args, **options):
+        batch = []
+        updated = 0
+        for user in User.objects.only('id', 'display_name', 'username').iterator(chunk_size=BATCH_SIZE):
+            user.search_display_name = normalize_search(user.display_name)
+            user.search_username = normalize_search(user.username)
+            batch.append(user)
+            if len(batch) == BATCH_SIZE:
+                User.objects.bulk_update(batch, ['search_display_name', 'search_username'])
+                updated += len(batch)
+                batch = []
+
+        User.objects.bulk_update(batch, ['search_display_name', 'search_username'])
+        updated += len(batch)
+        self.stdout.write(f'Updated search columns for {updated} users')
@@ -8,6 +8,13 @@ from django.contrib.auth.validators import ASCIIUsernameValidator
 
 # Create your models here.
 
+def normalize_search(value) -> str:
+    """
+    Normalizes a name for the search columns, which are matched by prefix.
+    """
+    return (value or '').lower()
+
+
 class User(AbstractUser):
     objects = DiscordUserOAuth2Manager()
     display_name_validator = ASCIIUsernameValidator()
@@ -30,6 +37,10 @@ class User(AbstractUser):
     )
     date_joined = models.DateTimeField(_('date joined'), default=timezone.now)
 
+    # Lowercase copies of the names, indexed so players can be found by prefix
+    search_display_name = models.CharField(max_length=25, default='', db_index=True, editable=False)
+    search_username = models.CharField(max_length=100, default='', db_index=True, editable=False)
+
     is_staff = models.BooleanField(
         _('staff'),
         default=False,
@@ -49,6 +60,21 @@ class User(AbstractUser):
     USERNAME_FIELD = 'id'
     REQUIRED_FIELDS = ['email']
 
+    def save(self, *args, **kwargs):
+        self.search_display_name = normalize_search(self.display_name)
+        self.search_username = normalize_search(self.username)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'display_name' in update_fields:
+                update_fields.add('search_display_name')
+            if 'username' in update_fields:
+                update_fields.add('search_username')
+            kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         if self.display_name:
             return self.display_name
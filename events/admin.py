@@ -8,9 +8,19 @@ class PlayerAdmin(admin.ModelAdmin):
     list_filter = ('event',)
     search_fields = ('player_name',)
 
+class ChampionshipPointsAdmin(admin.ModelAdmin):
+    list_display = ('player_name', 'total', 'event_1', 'event_2',)
+    search_fields = ('player_name',)
+
+class ChampionshipPointsEntryAdmin(admin.ModelAdmin):
+    list_display = ('player_name', 'event', 'points',)
+    list_filter = ('event',)
+    search_fields = ('player_name',)
+
 admin.site.register(Event)
 admin.site.register(Player, PlayerAdmin)
 admin.site.register(Ranking)
 admin.site.register(Match)
 admin.site.register(ElimsAlliance)
-admin.site.register(ChampionshipPoints)
+admin.site.register(ChampionshipPoints, ChampionshipPointsAdmin)
+admin.site.register(ChampionshipPointsEntry, ChampionshipPointsEntryAdmin)
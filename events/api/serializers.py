@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from events.models import Event
+from events.models import ElimsAlliance, Event, Match, Ranking
 
 class EventSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField(read_only=True)
@@ -8,9 +8,11 @@ class EventSerializer(serializers.ModelSerializer):
         fields = [
             'url',
             'name',
+            'slug',
             'start_time',
             'end_time',
         ]
+        read_only_fields = ['slug']
 
     # Converts to JSON
     # Validates data
@@ -25,4 +27,34 @@ class EventSerializer(serializers.ModelSerializer):
             qs = qs.exclude(pk=self.instance.pk)
         if qs.exists():
             raise serializers.ValidationError("The event name has already been used")
-        return value
\ No newline at end of file
+        return value
+
+class MatchChangeSerializer(serializers.ModelSerializer):
+    match_name = serializers.CharField(read_only=True)
+    red = serializers.SerializerMethodField()
+    blue = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Match
+        fields = ['id', 'match_type', 'match_number', 'match_name', 'red', 'blue',
+                  'red_score', 'blue_score', 'red_climb_rp', 'red_wheel_rp',
+                  'blue_climb_rp', 'blue_wheel_rp']
+
+    def get_red(self, obj):
+        return [obj.red1, obj.red2, obj.red3]
+
+    def get_blue(self, obj):
+        return [obj.blue1, obj.blue2, obj.blue3]
+
+
+class RankingChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ranking
+        fields = ['id', 'player_name', 'ranking_points', 'matches_played', 'auto_points',
+                  'endgame_points', 'average_contribution']
+
+
+class ElimsAllianceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ElimsAlliance
+        fields = ['id', 'alliance_number', 'player1', 'player2', 'player3', 'advancement']
@@ -1,4 +1,4 @@
-from .views import EventsRudView, EventsAPIView
+from .views import EventBracketView, EventChangesView, EventPowerRatingsView, EventsRudView, EventsAPIView
 
 from django.urls import path
 
@@ -8,4 +8,7 @@ app_name = "api-events"
 urlpatterns = [
     path('create/', EventsAPIView.as_view(), name="event-create"),
     path('<int:pk>/', EventsRudView.as_view(), name="event-rud"),
+    path('<int:pk>/changes/', EventChangesView.as_view(), name="event-changes"),
+    path('<int:pk>/power-ratings/', EventPowerRatingsView.as_view(), name="event-power-ratings"),
+    path('<int:pk>/bracket/', EventBracketView.as_view(), name="event-bracket"),
 ]
@@ -1,9 +1,13 @@
 from rest_framework import generics, mixins
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from events.lib import LONG_POLL_RETRY_AFTER, LONG_POLL_TIMEOUT, compute_power_ratings, get_bracket, get_event_changes, wait_for_event_version
 from events.models import Event
-from .serializers import EventSerializer
+from .serializers import ElimsAllianceChangeSerializer, EventSerializer, MatchChangeSerializer, RankingChangeSerializer
 from django.db.models import Q
+from django.shortcuts import get_object_or_404
 from .permissions import IsOwnerOrReadOnly
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import AllowAny, IsAdminUser
 
 class EventsAPIView(mixins.CreateModelMixin, generics.ListAPIView):
     lookup_field = 'pk'
@@ -34,4 +38,65 @@ class EventsRudView(generics.RetrieveUpdateDestroyAPIView):
         return Event.objects.all()
 
     def get_serializer_context(self, *args, **kwargs):
-        return {"request": self.request}
\ No newline at end of file
+        return {"request": self.request}
+
+class EventChangesView(APIView):
+    """
+    Long-polls for changes to an event. Waits until the event has changed
+    since `?since=<version>` (or `?timeout=` seconds pass) and returns only the
+    matches, rankings and alliances that changed, with the new version to send
+    next time. `full` means everything was sent and the client should replace
+    what it has. When too many clients are already waiting, answers at once
+    with `retry_after`, the seconds to wait before polling again.
+    """
+    permission_classes = (AllowAny, )
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event, pk=pk)
+
+        try:
+            since = int(request.GET.get('since', -1))
+            timeout = min(float(request.GET.get('timeout', LONG_POLL_TIMEOUT)), LONG_POLL_TIMEOUT)
+        except ValueError:
+            return Response(status=400, data={
+                'error': 'since and timeout must be numbers.'
+            })
+
+        version, waited = wait_for_event_version(event.pk, since, timeout)
+        if not waited:
+            return Response({'version': version, 'changed': False, 'retry_after': LONG_POLL_RETRY_AFTER},
+                            headers={'Retry-After': str(LONG_POLL_RETRY_AFTER)})
+        if version <= since:
+            return Response({'version': version, 'changed': False})
+
+        event.refresh_from_db(fields=['version', 'reset_version'])
+        full, matches, rankings, alliances = get_event_changes(event, since)
+        return Response({
+            'version': event.version,
+            'changed': True,
+            'full': full,
+            'matches': MatchChangeSerializer(matches, many=True).data,
+            'rankings': RankingChangeSerializer(rankings, many=True).data,
+            'alliances': ElimsAllianceChangeSerializer(alliances, many=True).data,
+        })
+
+class EventPowerRatingsView(APIView):
+    """
+    Gets every player's OPR and CCWM for an event, best OPR first.
+    """
+    permission_classes = (AllowAny, )
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event, pk=pk)
+        return Response(compute_power_ratings(event))
+
+class EventBracketView(APIView):
+    """
+    Gets an event's elimination bracket: every series by round, with the
+    alliances, their wins, the winner and its matches.
+    """
+    permission_classes = (AllowAny, )
+
+    def get(self, request, pk):
+        event = get_object_or_404(Event, pk=pk)
+        return Response(get_bracket(event))
@@ -0,0 +1,420 @@
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from statistics import NormalDist
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import ChampionshipPoints, ChampionshipPointsEntry, ElimsAlliance, Event, Match, Ranking, \
+    series_number
+
+# How long a change request waits for something to happen before answering anyway
+LONG_POLL_TIMEOUT = 25
+LONG_POLL_INTERVAL = 0.5
+# Seconds a client turned away because too many are waiting should wait before polling again
+LONG_POLL_RETRY_AFTER = 5
+# The cache can be separate in each process, so a version is only cached for
+# about a poll interval; other processes then see a bump from the database
+EVENT_VERSION_CACHE_TIMEOUT = 1
+# Power ratings and brackets are keyed by event version, so this only bounds how long stale ones linger
+POWER_RATINGS_CACHE_TIMEOUT = 60 * 60
+BRACKET_CACHE_TIMEOUT = 60 * 60
+
+# Elimination rounds in order, with the advancement an alliance reaches by playing in them
+ELIMS_ROUNDS = [('qf', 'quarterfinals'), ('sf', 'semifinals'), ('f', 'finals')]
+ADVANCEMENT_ORDER = ['qf', 'sf', 'f', 'w']
+SERIES_WINS_NEEDED = 2
+
+
+_long_poll_slots = threading.BoundedSemaphore(settings.EVENT_LONG_POLL_MAX_WAITERS)
+
+
+def get_event_version(event_id):
+    """
+    Gets an event's current version. It is cached briefly so that the clients
+    waiting in a process share one database read per interval.
+    """
+    version = cache.get(Event.version_cache_key(event_id))
+    if version is None:
+        version = Event.objects.values_list('version', flat=True).get(pk=event_id)
+        cache.set(Event.version_cache_key(event_id), version, EVENT_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def wait_for_event_version(event_id, since, timeout=LONG_POLL_TIMEOUT):
+    """
+    Waits until the event's version is past `since`, or the timeout runs out.
+    Returns the version and whether the request got to wait: a waiting request
+    holds its worker thread, so once EVENT_LONG_POLL_MAX_WAITERS are waiting
+    in this process, others get the current version straight away.
+    """
+    version = get_event_version(event_id)
+    if version > since or timeout <= 0:
+        return version, True
+    if not _long_poll_slots.acquire(blocking=False):
+        return version, False
+
+    try:
+        deadline = time.monotonic() + timeout
+        while version <= since and time.monotonic() < deadline:
+            time.sleep(LONG_POLL_INTERVAL)
+            version = get_event_version(event_id)
+    finally:
+        _long_poll_slots.release()
+    return version, True
+
+
+def get_event_changes(event, since):
+    """
+    Gets the matches, rankings and alliances of an event that changed after
+    version `since`. Everything is returned when something was deleted since.
+    """
+    full = since < event.reset_version
+    matches = Match.objects.filter(event=event)
+    rankings = Ranking.objects.filter(event=event)
+    alliances = ElimsAlliance.objects.filter(event=event)
+    if not full:
+        matches = matches.filter(version__gt=since)
+        rankings = rankings.filter(version__gt=since)
+        alliances = alliances.filter(version__gt=since)
+
+    return full, matches.order_by('match_type', 'match_number'), \
+        rankings.order_by(*Ranking.ORDERING), alliances.order_by('alliance_number')
+
+
+RANKING_STAT_FIELDS = ['ranking_points', 'matches_played', 'auto_points', 'endgame_points',
+                       'total_contribution', 'contribution_matches']
+
+
+def match_ranking_stats(match):
+    """
+    Works out what a qualification match adds to each player's ranking. A win
+    is worth 2 ranking points and a tie 1, plus 1 each for the climb and wheel
+    RPs. A red card costs the player that match's ranking points, and matches
+    played as a surrogate don't count at all. Unscored matches add nothing.
+    """
+    stats = defaultdict(Counter)
+    if match is None or match.match_type != 'q' or match.red_score is None or match.blue_score is None:
+        return stats
+
+    for alliance, score, opponent_score in (('red', match.red_score, match.blue_score),
+                                            ('blue', match.blue_score, match.red_score)):
+        ranking_points = 2 if score > opponent_score else 1 if score == opponent_score else 0
+        ranking_points += bool(getattr(match, f'{alliance}_climb_rp')) + \
+            bool(getattr(match, f'{alliance}_wheel_rp'))
+        auto_points = getattr(match, f'{alliance}_auto_points') or 0
+        endgame_points = getattr(match, f'{alliance}_endgame_points') or 0
+
+        for slot in range(1, 4):
+            player_name = getattr(match, f'{alliance}{slot}')
+            if not player_name or getattr(match, f'{alliance}{slot}_surrogate'):
+                continue
+
+            contribution = getattr(match, f'{alliance}{slot}_contribution')
+            stats[player_name].update({
+                'ranking_points': 0 if getattr(match, f'{alliance}{slot}_redcard') else ranking_points,
+                'matches_played': 1,
+                'auto_points': auto_points,
+                'endgame_points': endgame_points,
+                'total_contribution': contribution or 0,
+                'contribution_matches': 0 if contribution is None else 1,
+            })
+    return stats
+
+
+def apply_ranking_changes(event_id, changes, version, replace=False):
+    """
+    Adds (or with replace, sets) ranking stats for the given players of an
+    event, reading their rankings once and writing them back in bulk.
+    """
+    changes = {player_name: change for player_name, change in changes.items()
+               if replace or any(change.values())}
+    if not changes:
+        return
+
+    rankings = {ranking.player_name: ranking for ranking in Ranking.objects.filter(
+        event_id=event_id, player_name__in=changes)}
+    now = timezone.now()
+
+    created = []
+    for player_name, change in changes.items():
+        ranking = rankings.get(player_name)
+        if ranking is None:
+            ranking = Ranking(event_id=event_id, player_name=player_name, ranking_points=0)
+            created.append(ranking)
+        for field in RANKING_STAT_FIELDS:
+            value = change.get(field, 0)
+            setattr(ranking, field, value if replace else getattr(ranking, field) + value)
+        ranking.time_set = now
+        ranking.version = version
+
+    Ranking.objects.bulk_create(created)
+    Ranking.objects.bulk_update(list(rankings.values()),
+                                RANKING_STAT_FIELDS + ['time_set', 'version'])
+
+
+def update_rankings_for_match(old, new, version):
+    """
+    Moves the rankings from a match's old state to its new one. Either side
+    may be None, when the match is created or deleted.
+    """
+    old_stats = match_ranking_stats(old)
+    new_stats = match_ranking_stats(new)
+
+    if old is not None and new is not None and old.event_id != new.event_id:
+        apply_ranking_changes(old.event_id, {player_name: {field: -value for field, value in stats.items()}
+                                             for player_name, stats in old_stats.items()},
+                              Event.bump_version(old.event_id))
+        old_stats = {}
+
+    event_id = (new or old).event_id
+    changes = defaultdict(Counter)
+    for player_name, stats in new_stats.items():
+        changes[player_name].update(stats)
+    for player_name, stats in old_stats.items():
+        changes[player_name].subtract(stats)
+    apply_ranking_changes(event_id, changes, version)
+
+
+def compute_event_rankings(event):
+    """
+    Recomputes every ranking of an event from its qualification matches in one
+    pass. Rankings of players without a scored match are left alone.
+    """
+    totals = defaultdict(Counter)
+    for match in Match.objects.filter(event=event, match_type='q'):
+        for player_name, stats in match_ranking_stats(match).items():
+            totals[player_name].update(stats)
+
+    apply_ranking_changes(event.pk, totals, Event.bump_version(event.pk), replace=True)
+
+
+def compute_power_ratings(event):
+    """
+    Estimates each player's offensive power rating (OPR: their share of their
+    alliance's score) and calculated contribution to winning margin (CCWM)
+    from the event's scored qualification matches, by least squares.
+    Cached until the event next changes.
+    """
+    cache_key = f'event_power_ratings_{event.pk}_{event.version}'
+    ratings = cache.get(cache_key)
+    if ratings is not None:
+        return ratings
+
+    # One row per alliance: who played in it, what it scored and what it conceded
+    alliances = []
+    for row in Match.objects.filter(event=event, match_type='q', red_score__isnull=False,
+                                    blue_score__isnull=False).values_list(
+            'red1', 'red2', 'red3', 'blue1', 'blue2', 'blue3', 'red_score', 'blue_score'):
+        alliances.append(([name for name in row[:3] if name], row[6], row[7]))
+        alliances.append(([name for name in row[3:6] if name], row[7], row[6]))
+
+    players = sorted({name for members, _, _ in alliances for name in members})
+    if not players:
+        cache.set(cache_key, [], POWER_RATINGS_CACHE_TIMEOUT)
+        return []
+    index = {name: i for i, name in enumerate(players)}
+
+    # Accumulate the normal equations straight from the memberships instead of
+    # building the (alliances x players) matrix, which is almost all zeros
+    normal = np.zeros((len(players), len(players)))
+    scores = np.zeros(len(players))
+    margins = np.zeros(len(players))
+    for members, score, opponent_score in alliances:
+        members = [index[name] for name in members]
+        normal[np.ix_(members, members)] += 1
+        scores[members] += score
+        margins[members] += score - opponent_score
+
+    # lstsq copes with players who always played together, where the system is singular
+    solution = np.linalg.lstsq(normal, np.column_stack((scores, margins)), rcond=None)[0]
+
+    ratings = sorted(({
+        'player_name': name,
+        'opr': float(opr),
+        'ccwm': float(ccwm),
+    } for name, (opr, ccwm) in zip(players, solution.tolist())), key=lambda rating: -rating['opr'])
+    cache.set(cache_key, ratings, POWER_RATINGS_CACHE_TIMEOUT)
+    return ratings
+
+
+def _find_alliance(players, alliance_by_player):
+    # The alliance most of the players belong to, so a backup player doesn't matter
+    alliances = Counter(alliance_by_player[name] for name in players if name in alliance_by_player)
+    return alliances.most_common(1)[0][0] if alliances else None
+
+
+def build_bracket(event_id):
+    """
+    Works out every elimination series of an event from its matches in one
+    pass: which alliances played, how many matches each won and who won the
+    series. Returns the bracket and each alliance's advancement.
+    """
+    alliances = list(ElimsAlliance.objects.filter(event_id=event_id).order_by('alliance_number'))
+    alliance_by_player = {}
+    for alliance in alliances:
+        for name in (alliance.player1, alliance.player2, alliance.player3):
+            if name:
+                alliance_by_player[name] = alliance.alliance_number
+
+    series = {}
+    for match in Match.objects.filter(event_id=event_id).exclude(match_type='q').order_by(
+            'match_type', 'match_number'):
+        if match.match_number is None:
+            continue
+        # Finals are one series played until an alliance has won twice, however many
+        # matches that takes; the earlier rounds give each series three match numbers
+        number = 1 if match.match_type == 'f' else series_number(match.match_number)[0]
+        entry = series.setdefault((match.match_type, number), {
+            'series': number,
+            'red_alliance': _find_alliance((match.red1, match.red2, match.red3), alliance_by_player),
+            'blue_alliance': _find_alliance((match.blue1, match.blue2, match.blue3), alliance_by_player),
+            'red_wins': 0,
+            'blue_wins': 0,
+            'winner': None,
+            'matches': [],
+        })
+        entry['matches'].append({
+            'name': match.match_name,
+            'red_score': match.red_score,
+            'blue_score': match.blue_score,
+        })
+        if match.red_score is None or match.blue_score is None or entry['winner'] is not None:
+            continue
+        if match.red_score > match.blue_score:
+            entry['red_wins'] += 1
+        elif match.blue_score > match.red_score:
+            entry['blue_wins'] += 1
+        if entry['red_wins'] == SERIES_WINS_NEEDED:
+            entry['winner'] = entry['red_alliance']
+        elif entry['blue_wins'] == SERIES_WINS_NEEDED:
+            entry['winner'] = entry['blue_alliance']
+
+    # An alliance reaches the round it played in, or the next one if it won there
+    advancement = {}
+    for (match_type, _), entry in series.items():
+        level = ADVANCEMENT_ORDER.index(match_type)
+        for alliance_number in (entry['red_alliance'], entry['blue_alliance']):
+            if alliance_number is None:
+                continue
+            reached = level + 1 if entry['winner'] == alliance_number else level
+            advancement[alliance_number] = max(advancement.get(alliance_number, 0), reached)
+
+    bracket = {name: sorted((entry for (match_type, _), entry in series.items() if match_type == round_type),
+                            key=lambda entry: entry['series'])
+               for round_type, name in ELIMS_ROUNDS}
+    bracket['alliances'] = [{
+        'alliance_number': alliance.alliance_number,
+        'players': [name for name in (alliance.player1, alliance.player2, alliance.player3) if name],
+        'advancement': ADVANCEMENT_ORDER[advancement[alliance.alliance_number]]
+        if alliance.alliance_number in advancement else alliance.advancement,
+    } for alliance in alliances]
+    return bracket, alliances, {number: ADVANCEMENT_ORDER[level] for number, level in advancement.items()}
+
+
+def advance_alliances(event_id, version):
+    """
+    Sets each elimination alliance's advancement from the series it has
+    played. Alliances that haven't played yet are left alone.
+    """
+    _, alliances, advancement = build_bracket(event_id)
+    changed = []
+    for alliance in alliances:
+        if alliance.alliance_number in advancement and alliance.advancement != advancement[alliance.alliance_number]:
+            alliance.advancement = advancement[alliance.alliance_number]
+            alliance.version = version
+            changed.append(alliance)
+    ElimsAlliance.objects.bulk_update(changed, ['advancement', 'version'])
+
+
+def get_bracket(event):
+    """
+    Gets an event's elimination bracket for rendering, cached until the event
+    next changes.
+    """
+    cache_key = f'event_bracket_{event.pk}_{event.version}'
+    bracket = cache.get(cache_key)
+    if bracket is None:
+        bracket = build_bracket(event.pk)[0]
+        cache.set(cache_key, bracket, BRACKET_CACHE_TIMEOUT)
+    return bracket
+
+
+# Championship points, following the FRC district model
+QUALIFICATION_POINTS_ALPHA = 1.07
+# Captains and first picks get 17 minus their alliance number, second picks the alliance number
+ALLIANCE_CAPTAIN_POINTS = 17
+ADVANCEMENT_POINTS = {'qf': 0, 'sf': 10, 'f': 20, 'w': 30}
+
+
+def _erfinv(x):
+    return NormalDist().inv_cdf((x + 1) / 2) / math.sqrt(2)
+
+
+def qualification_points(rank, player_count):
+    """
+    Points for finishing quals at `rank` of `player_count`, on a normal curve
+    from 22 for first down to about 4 for last.
+    """
+    alpha = QUALIFICATION_POINTS_ALPHA
+    return math.ceil(_erfinv((player_count - 2 * rank + 2) / (alpha * player_count))
+                     * (10 / _erfinv(1 / alpha)) + 12)
+
+
+def refresh_championship_totals(player_names=None):
+    """
+    Recomputes the total of the given players' (or everyone's) championship
+    points from the ledger and the legacy event columns, in one read and one
+    bulk write.
+    """
+    entries = ChampionshipPointsEntry.objects.all()
+    standings = ChampionshipPoints.objects.all()
+    if player_names is not None:
+        entries = entries.filter(player_name__in=player_names)
+        standings = standings.filter(player_name__in=player_names)
+
+    ledger = dict(entries.values('player_name').annotate(points=Sum('points')).values_list(
+        'player_name', 'points'))
+    standings = {standing.player_name: standing for standing in standings}
+
+    created = [ChampionshipPoints(player_name=player_name) for player_name in ledger
+               if player_name not in standings]
+    for standing in list(standings.values()) + created:
+        standing.total = standing.event_1 + standing.event_2 + ledger.get(standing.player_name, 0)
+
+    ChampionshipPoints.objects.bulk_create(created)
+    ChampionshipPoints.objects.bulk_update(list(standings.values()), ['total'])
+
+
+def award_championship_points(event):
+    """
+    Awards an event's championship points from its final rankings and
+    elimination results, replacing any awarded before.
+    """
+    points = Counter()
+    rankings = list(Ranking.objects.filter(event=event).order_by(*Ranking.ORDERING).values_list(
+        'player_name', flat=True))
+    for rank, player_name in enumerate(rankings, start=1):
+        points[player_name] += qualification_points(rank, len(rankings))
+
+    for alliance in ElimsAlliance.objects.filter(event=event):
+        number = alliance.alliance_number or 0
+        for player_name, selection_points in ((alliance.player1, ALLIANCE_CAPTAIN_POINTS - number),
+                                              (alliance.player2, ALLIANCE_CAPTAIN_POINTS - number),
+                                              (alliance.player3, number)):
+            if player_name:
+                points[player_name] += max(selection_points, 0) + ADVANCEMENT_POINTS[alliance.advancement]
+
+    with transaction.atomic():
+        # The delete refreshes the totals of the players it takes points from
+        ChampionshipPointsEntry.objects.filter(event=event).delete()
+        ChampionshipPointsEntry.objects.bulk_create([
+            ChampionshipPointsEntry(player_name=player_name, event=event, points=player_points)
+            for player_name, player_points in points.items()
+        ])
+        refresh_championship_totals(set(points))
+    return points
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from events.lib import award_championship_points, refresh_championship_totals
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Awards championship points for an event from its final rankings and ' \
+        'elimination results. With no event, only recomputes every player\'s total.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event', nargs='?', help='The event (by slug).')
+
+    def handle(self, *args, **options):
+        if not options['event']:
+            refresh_championship_totals()
+            self.stdout.write('Championship point totals recomputed')
+            return
+
+        try:
+            event = Event.objects.get(slug=options['event'])
+        except Event.DoesNotExist:
+            raise CommandError(f'Event {options["event"]} does not exist.')
+
+        points = award_championship_points(event)
+        self.stdout.write(f'{event.name}: awarded points to {len(points)} players')
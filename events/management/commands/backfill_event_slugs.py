@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Gives every event without a slug one made from its name.'
+
+    def handle(self, *args, **options):
+        events = Event.objects.filter(slug__isnull=True).order_by('start_time')
+        for event in events:
+            # save() fills in a unique slug
+            event.save()
+            self.stdout.write(f'{event.name}: {event.slug}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from events.models import Match, match_display_name
+
+
+class Command(BaseCommand):
+    help = 'Fills in display_name for matches saved before it existed.'
+
+    def handle(self, *args, **options):
+        # Written directly rather than through save(), which would also recompute
+        # rankings and bump the event versions; the names shown don't change
+        matches = list(Match.objects.filter(display_name='').only('match_type', 'match_number'))
+        for match in matches:
+            match.display_name = match_display_name(match.match_type, match.match_number)
+        Match.objects.bulk_update(matches, ['display_name'], batch_size=1000)
+        self.stdout.write(f'Named {len(matches)} matches')
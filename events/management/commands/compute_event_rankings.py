@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from events.lib import compute_event_rankings
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Recomputes event rankings from their qualification matches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', dest='event',
+                            help='Only recompute this event (by slug).')
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options['event']:
+            events = events.filter(slug=options['event'])
+
+        for event in events:
+            compute_event_rankings(event)
+            self.stdout.write(f'{event.name}: rankings recomputed')
@@ -1,20 +1,108 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F
 from django.urls import reverse
+from django.utils.text import slugify
 
 from rest_framework.reverse import reverse as api_reverse
 
-from math import floor
 
 # Create your models here.
 
+# Cached list of events for the archive page, dropped whenever an event or player changes.
+# The default cache is per process, so the drop only reaches the process that made
+# the change; the timeout bounds how long the others can show the old list
+EVENT_SUMMARY_CACHE_KEY = 'event_summary'
+EVENT_SUMMARY_CACHE_TIMEOUT = 60
+
+class ChampionshipTotalsQuerySet(models.QuerySet):
+    """
+    Bulk deletes skip the models' delete(), so this refreshes the championship
+    totals of every player whose points the delete takes away.
+    """
+    # Lookup from the model to the player names of the points entries it removes
+    entry_player_lookup = 'player_name'
+
+    def delete(self):
+        from .lib import refresh_championship_totals
+        with transaction.atomic():
+            player_names = set(self.values_list(self.entry_player_lookup, flat=True)) - {None}
+            result = super().delete()
+            refresh_championship_totals(player_names)
+        return result
+
+class EventQuerySet(ChampionshipTotalsQuerySet):
+    entry_player_lookup = 'championshippointsentry__player_name'
+
+    def delete(self):
+        result = super().delete()
+        cache.delete(EVENT_SUMMARY_CACHE_KEY)
+        return result
+
 class Event(models.Model):
     name = models.CharField(max_length=25)
+    # Used in event page URLs; filled in from the name when left blank
+    slug = models.SlugField(max_length=50, unique=True, null=True, blank=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
 
+    # Bumped whenever one of the event's matches, rankings or alliances
+    # changes; reset_version is the last bump that removed one
+    version = models.IntegerField(default=0, editable=False)
+    reset_version = models.IntegerField(default=0, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
     def __str__(self):
         return self.name
-    
+
+    @staticmethod
+    def version_cache_key(event_id):
+        return f'event_version_{event_id}'
+
+    @classmethod
+    def bump_version(cls, event_id, reset=False):
+        """
+        Bumps the event's version and returns the new one. Pass reset when
+        something was deleted, so clients know to reload everything.
+        """
+        changes = {'version': F('version') + 1}
+        if reset:
+            changes['reset_version'] = F('version') + 1
+        cls.objects.filter(pk=event_id).update(**changes)
+        version = cls.objects.values_list('version', flat=True).get(pk=event_id)
+        # Only reaches this process's waiters early; others notice once their cached version expires
+        transaction.on_commit(lambda: cache.delete(cls.version_cache_key(event_id)))
+        return version
+
+    def unique_slug(self):
+        base = slugify(self.name) or 'event'
+        slug = base
+        suffix = 2
+        while Event.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = self.unique_slug()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The versions are only changed by bump_version, so don't write back stale ones
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in ('version', 'reset_version')]
+        super().save(*args, **kwargs)
+        cache.delete(EVENT_SUMMARY_CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        from .lib import refresh_championship_totals
+        with transaction.atomic():
+            # The event's championship points go with it, so those players' totals change
+            player_names = list(self.championshippointsentry_set.values_list('player_name', flat=True))
+            result = super().delete(*args, **kwargs)
+            refresh_championship_totals(player_names)
+        cache.delete(EVENT_SUMMARY_CACHE_KEY)
+        return result
 
     def get_api_url(self, request=None):
         return api_reverse("api-events:event-rud", kwargs={'pk': self.pk}, request=request)
@@ -26,16 +114,84 @@ class Player(models.Model):
     def __str__(self):
         return self.player_name
 
-class Ranking(models.Model):
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(EVENT_SUMMARY_CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(EVENT_SUMMARY_CACHE_KEY)
+        return result
+
+class EventVersionedModel(models.Model):
+    """
+    A part of an event that live clients follow. Saving or deleting one bumps
+    the event's version, and each row keeps the version it last changed at.
+    """
+    version = models.IntegerField(default=0, editable=False, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.version = Event.bump_version(self.event_id)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.version = Event.bump_version(self.event_id, reset=True)
+            return super().delete(*args, **kwargs)
+
+class Ranking(EventVersionedModel):
+    # Best first: most ranking points, then auto points, then endgame points
+    ORDERING = ('-ranking_points', '-auto_points', '-endgame_points')
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     player_name = models.CharField(max_length=25)
     ranking_points = models.IntegerField()
     time_set = models.DateTimeField(null=True, blank=True)
 
+    # Totals over the player's scored qualification matches, kept up to date
+    # as matches are saved (see events.lib)
+    matches_played = models.IntegerField(default=0)
+    auto_points = models.IntegerField(default=0)
+    endgame_points = models.IntegerField(default=0)
+    total_contribution = models.IntegerField(default=0)
+    contribution_matches = models.IntegerField(default=0)
+
+    @property
+    def average_contribution(self):
+        if not self.contribution_matches:
+            return None
+        return self.total_contribution / self.contribution_matches
+
     def __str__(self):
         return f"Ranking - {self.event} - {self.player_name}"
 
-class Match(models.Model):
+def series_number(match_number):
+    """
+    Gets the best-of-three series a quarterfinal or semifinal match belongs to,
+    and which match of the series it is.
+    """
+    return (match_number - 1) // 3 + 1, (match_number - 1) % 3 + 1
+
+def match_display_name(match_type, match_number):
+    if match_number is None:
+        return ''
+    if match_type == 'q':
+        return f"Quals {match_number}"
+    elif match_type == 'qf':
+        return "Quarters %d Match %d" % series_number(match_number)
+    elif match_type == 'sf':
+        return "Semis %d Match %d" % series_number(match_number)
+    elif match_type == 'f':
+        return f"Finals {match_number}"
+    return ''
+
+class Match(EventVersionedModel):
     MATCH_TYPES = [
         ('q', 'Qualifications'),
         ('qf', 'Quarterfinals'),
@@ -94,25 +250,38 @@ class Match(models.Model):
     blue_endgame_points = models.IntegerField(null=True, blank=True)
     blue_power_cells = models.IntegerField(null=True, blank=True)
 
+    # Filled in on save so pages don't work out series numbers for every row
+    display_name = models.CharField(max_length=25, blank=True, default='', editable=False)
+
     @property
     def match_name(self):
-        if self.match_type == 'q':
-            return "Quals " + str(self.match_number)
-        elif self.match_type == 'qf':
-            series = floor((self.match_number - 1) / 3 + 1)
-            match = ((self.match_number - 1) % 3) + 1
-            return "Quarters " + str(series) + " Match " + str(match)
-        elif self.match_type == 'sf':
-            series = floor((self.match_number - 1) / 3 + 1)
-            match = ((self.match_number - 1) % 3) + 1
-            return "Semis " + str(series) + " Match " + str(match)
-        elif self.match_type == 'f':
-            return "Finals " + str(self.match_number)
-    
+        return self.display_name or match_display_name(self.match_type, self.match_number)
+
+    def save(self, *args, **kwargs):
+        from .lib import advance_alliances, update_rankings_for_match
+        self.display_name = match_display_name(self.match_type, self.match_number)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'display_name'}
+        with transaction.atomic():
+            old = Match.objects.filter(pk=self.pk).first() if self.pk else None
+            super().save(*args, **kwargs)
+            update_rankings_for_match(old, self, self.version)
+            if self.match_type != 'q' or (old is not None and old.match_type != 'q'):
+                advance_alliances(self.event_id, self.version)
+
+    def delete(self, *args, **kwargs):
+        from .lib import advance_alliances, update_rankings_for_match
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            update_rankings_for_match(self, None, self.version)
+            if self.match_type != 'q':
+                advance_alliances(self.event_id, self.version)
+            return result
+
     def __str__(self):
         return f"{self.event} - {self.match_name}"
 
-class ElimsAlliance(models.Model):
+class ElimsAlliance(EventVersionedModel):
     ADVANCEMENT_LEVELS = [
         ('qf', 'QF'),
         ('sf', 'SF'),
@@ -126,13 +295,69 @@ class ElimsAlliance(models.Model):
     player3 = models.CharField(max_length=25)
     advancement = models.CharField(max_length=25, choices=ADVANCEMENT_LEVELS, default='qf')
 
+    def save(self, *args, **kwargs):
+        from .lib import advance_alliances
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # A new or renumbered alliance, or new players, can change who won each series
+            advance_alliances(self.event_id, self.version)
+            self.refresh_from_db(fields=['advancement'])
+
+    def delete(self, *args, **kwargs):
+        from .lib import advance_alliances
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            advance_alliances(self.event_id, self.version)
+            return result
+
     def __str__(self):
         return f"{self.event} - Alliance {self.alliance_number}"
 
 class ChampionshipPoints(models.Model):
     player_name = models.CharField(max_length=25)
+    # Points from before the ledger existed; still counted in the total
     event_1 = models.IntegerField(default=0)
     event_2 = models.IntegerField(default=0)
+    # event_1 + event_2 + the player's ChampionshipPointsEntry rows
+    total = models.IntegerField(default=0, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        ledger = ChampionshipPointsEntry.objects.filter(player_name=self.player_name).aggregate(
+            points=models.Sum('points'))['points'] or 0
+        self.total = self.event_1 + self.event_2 + ledger
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.player_name
+
+class ChampionshipPointsEntry(models.Model):
+    """
+    Championship points a player earned at one event.
+    """
+    player_name = models.CharField(max_length=25)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    points = models.IntegerField(default=0)
+
+    objects = ChampionshipTotalsQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['player_name', 'event'], name='unique_championship_points_entry'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .lib import refresh_championship_totals
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            refresh_championship_totals([self.player_name])
+
+    def delete(self, *args, **kwargs):
+        from .lib import refresh_championship_totals
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            refresh_championship_totals([self.player_name])
+            return result
+
+    def __str__(self):
+        return f"{self.player_name} - {self.event} - {self.points}"
@@ -1,3 +1,281 @@
+import threading
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .lib import RANKING_STAT_FIELDS, award_championship_points, compute_event_rankings, compute_power_ratings, \
+    get_event_version, qualification_points
+from .models import ChampionshipPoints, ChampionshipPointsEntry, ElimsAlliance, Event, Match, Ranking
 
 # Create your tests here.
+
+class RankingsTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+        self.match = Match.objects.create(
+            event=self.event, match_type='q', match_number=1,
+            red1='a', red2='b', red3='c', blue1='d', blue2='e', blue3='f',
+            red1_redcard=True, blue3_surrogate=True,
+            red_score=30, blue_score=20, red_climb_rp=True, red_auto_points=8)
+
+    def ranking_points(self):
+        return dict(Ranking.objects.filter(event=self.event).values_list('player_name', 'ranking_points'))
+
+    def test_match_save_updates_rankings(self):
+        self.assertEqual(self.ranking_points(), {'a': 0, 'b': 3, 'c': 3, 'd': 0, 'e': 0})
+        self.assertEqual(Ranking.objects.get(event=self.event, player_name='b').auto_points, 8)
+
+        self.match.blue_score = 30
+        self.match.save()
+        self.assertEqual(self.ranking_points(), {'a': 0, 'b': 2, 'c': 2, 'd': 1, 'e': 1})
+
+        self.match.delete()
+        self.assertEqual(set(self.ranking_points().values()), {0})
+
+    def stats(self):
+        return {ranking.player_name: [getattr(ranking, field) for field in RANKING_STAT_FIELDS]
+                for ranking in Ranking.objects.filter(event=self.event)}
+
+    def assert_matches_rebuild(self):
+        incremental = self.stats()
+        compute_event_rankings(self.event)
+        self.assertEqual(incremental, self.stats())
+
+    def test_edits_and_deletes_match_rebuild(self):
+        other = Match.objects.create(
+            event=self.event, match_type='q', match_number=2,
+            red1='a', red2='d', red3='g', blue1='b', blue2='e', blue3='h',
+            red_score=10, blue_score=10, blue_wheel_rp=True, red1_contribution=12, blue_endgame_points=5)
+        self.assert_matches_rebuild()
+
+        # A different lineup, card and score all move the rankings
+        self.match.red2 = 'g'
+        self.match.red1_redcard = False
+        self.match.blue3_surrogate = False
+        self.match.red_score = 5
+        self.match.save()
+        self.assert_matches_rebuild()
+        self.assertEqual(Ranking.objects.get(event=self.event, player_name='f').ranking_points, 2)
+
+        # Elimination matches don't count towards rankings
+        other.match_type = 'qf'
+        other.save()
+        self.assert_matches_rebuild()
+        self.assertEqual(Ranking.objects.get(event=self.event, player_name='h').matches_played, 0)
+
+        self.match.delete()
+        self.assertEqual(set(self.ranking_points().values()), {0})
+        self.assert_matches_rebuild()
+
+    def test_command_rebuilds_existing_rankings(self):
+        # Rankings entered by hand before they were computed from matches
+        Ranking.objects.filter(event=self.event).update(ranking_points=F('ranking_points') + 10)
+        call_command('compute_event_rankings', stdout=StringIO())
+
+        self.assertEqual(self.ranking_points(), {'a': 0, 'b': 3, 'c': 3, 'd': 0, 'e': 0})
+
+
+class PowerRatingsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+
+    def add_match(self, red, blue, red_score, blue_score):
+        Match.objects.create(event=self.event, match_type='q', red1=red[0], red2=red[1], red3='',
+                             blue1=blue[0], blue2=blue[1], blue3='', red_score=red_score, blue_score=blue_score)
+
+    def ratings(self):
+        return {rating['player_name']: (rating['opr'], rating['ccwm'])
+                for rating in compute_power_ratings(Event.objects.get(pk=self.event.pk))}
+
+    def assert_ratings(self, expected):
+        ratings = self.ratings()
+        self.assertEqual(set(ratings), set(expected))
+        for name, (opr, ccwm) in expected.items():
+            self.assertAlmostEqual(ratings[name][0], opr, msg=name)
+            self.assertAlmostEqual(ratings[name][1], ccwm, msg=name)
+
+    def test_every_pairing(self):
+        # Each pair plays together once, so the contributions (4, 3, 2, 1) are exact
+        self.add_match('ab', 'cd', 7, 3)
+        self.add_match('ac', 'bd', 6, 4)
+        self.add_match('ad', 'bc', 5, 5)
+
+        self.assert_ratings({'a': (4, 3), 'b': (3, 1), 'c': (2, -1), 'd': (1, -3)})
+        self.assertEqual([rating['player_name'] for rating in compute_power_ratings(self.event)],
+                         ['a', 'b', 'c', 'd'])
+
+    def test_partners_who_always_play_together_share(self):
+        # a and b can't be told apart, so the least-norm solution splits their score evenly
+        self.add_match('ab', 'cd', 10, 6)
+        self.add_match('ab', 'cd', 8, 4)
+
+        self.assert_ratings({'a': (4.5, 2), 'b': (4.5, 2), 'c': (2.5, -2), 'd': (2.5, -2)})
+
+    def test_unscored_and_elimination_matches_are_ignored(self):
+        self.assertEqual(compute_power_ratings(self.event), [])
+
+        self.add_match('ab', 'cd', None, None)
+        Match.objects.create(event=self.event, match_type='f', match_number=1, red1='a', red2='b', red3='',
+                             blue1='c', blue2='d', blue3='', red_score=10, blue_score=0)
+        self.assertEqual(self.ratings(), {})
+
+
+class BracketTestCase(TestCase):
+    def test_series_winner_advances(self):
+        event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+        for alliance_number, captain in ((1, 'a'), (2, 'b')):
+            ElimsAlliance.objects.create(event=event, alliance_number=alliance_number, advancement='f',
+                                         player1=captain, player2=f'{captain}2', player3=f'{captain}3')
+        for match_number, red_score, blue_score in ((1, 10, 5), (2, 5, 10), (3, 10, 5)):
+            Match.objects.create(event=event, match_type='f', match_number=match_number,
+                                 red1='a', red2='a2', red3='a3', blue1='b', blue2='b2', blue3='b3',
+                                 red_score=red_score, blue_score=blue_score)
+
+        self.assertEqual(dict(ElimsAlliance.objects.values_list('alliance_number', 'advancement')),
+                         {1: 'w', 2: 'f'})
+        self.assertEqual(Match.objects.get(match_type='f', match_number=3).display_name, 'Finals 3')
+
+
+class ElimsRunTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+
+    def add_alliance(self, alliance_number):
+        return ElimsAlliance.objects.create(event=self.event, alliance_number=alliance_number,
+                                            player1=f'c{alliance_number}', player2=f'p{alliance_number}',
+                                            player3=f's{alliance_number}')
+
+    def play(self, match_type, match_number, red, blue, red_score, blue_score):
+        return Match.objects.create(event=self.event, match_type=match_type, match_number=match_number,
+                                    red1=f'c{red}', red2=f'p{red}', red3=f's{red}',
+                                    blue1=f'c{blue}', blue2=f'p{blue}', blue3=f's{blue}',
+                                    red_score=red_score, blue_score=blue_score)
+
+    def advancement(self):
+        return dict(ElimsAlliance.objects.filter(event=self.event).values_list('alliance_number', 'advancement'))
+
+    def test_full_bracket(self):
+        for alliance_number in range(1, 9):
+            self.add_alliance(alliance_number)
+
+        # Quarterfinal series take match numbers 1-3, 4-6, 7-9 and 10-12
+        for match_number, red, blue, red_score, blue_score in (
+                (1, 1, 8, 10, 5), (2, 1, 8, 10, 5),
+                (4, 4, 5, 10, 5), (5, 4, 5, 5, 10), (6, 4, 5, 5, 10),
+                (7, 2, 7, 10, 5), (8, 2, 7, 10, 5),
+                (10, 3, 6, 10, 5), (11, 3, 6, 10, 5)):
+            self.play('qf', match_number, red, blue, red_score, blue_score)
+        self.assertEqual(self.advancement(), {1: 'sf', 2: 'sf', 3: 'sf', 4: 'qf', 5: 'sf', 6: 'qf', 7: 'qf', 8: 'qf'})
+
+        for match_number, red, blue, red_score, blue_score in (
+                (1, 1, 5, 10, 5), (2, 1, 5, 10, 5),
+                (4, 2, 3, 5, 10), (5, 2, 3, 5, 10)):
+            self.play('sf', match_number, red, blue, red_score, blue_score)
+        self.assertEqual(self.advancement(), {1: 'f', 2: 'sf', 3: 'f', 4: 'qf', 5: 'sf', 6: 'qf', 7: 'qf', 8: 'qf'})
+
+        # A tied final doesn't count, so it takes a fourth match
+        self.play('f', 1, 1, 3, 10, 5)
+        self.play('f', 2, 1, 3, 7, 7)
+        self.play('f', 3, 1, 3, 5, 10)
+        last = self.play('f', 4, 1, 3, 10, 5)
+        self.assertEqual(self.advancement(), {1: 'w', 2: 'sf', 3: 'f', 4: 'qf', 5: 'sf', 6: 'qf', 7: 'qf', 8: 'qf'})
+
+        last.delete()
+        self.assertEqual(self.advancement()[1], 'f')
+        self.assertEqual(self.advancement()[3], 'f')
+
+    def test_alliance_added_after_its_matches(self):
+        self.play('f', 1, 1, 2, 10, 5)
+        self.play('f', 2, 1, 2, 10, 5)
+        self.add_alliance(2)
+        winner = self.add_alliance(1)
+
+        self.assertEqual(winner.advancement, 'w')
+        self.assertEqual(self.advancement(), {1: 'w', 2: 'f'})
+
+    def test_backfill_display_names(self):
+        self.play('sf', 5, 1, 2, 10, 5)
+        Match.objects.update(display_name='')
+        call_command('backfill_match_display_names', stdout=StringIO())
+
+        self.assertEqual(Match.objects.get().display_name, 'Semis 2 Match 2')
+
+
+class EventChangesTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+
+    def poll(self, since, timeout):
+        return self.client.get(reverse('api-events:event-changes', args=[self.event.pk]),
+                               {'since': since, 'timeout': timeout}).json()
+
+    def test_sees_bump_from_another_process(self):
+        version = get_event_version(self.event.pk)
+        # Another process bumping the version leaves this process's cached copy alone
+        Event.objects.filter(pk=self.event.pk).update(version=version + 1)
+
+        data = self.poll(version, 3)
+        self.assertTrue(data['changed'])
+        self.assertEqual(data['version'], version + 1)
+
+    def test_busy_answers_at_once(self):
+        with mock.patch('events.lib._long_poll_slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            data = self.poll(get_event_version(self.event.pk), 3)
+        self.assertFalse(data['changed'])
+        self.assertIn('retry_after', data)
+
+
+class ChampionshipPointsTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name='Test Event', start_time=timezone.now(), end_time=timezone.now())
+        for rank, player_name in enumerate('abcdef'):
+            Ranking.objects.create(event=self.event, player_name=player_name, ranking_points=60 - rank * 10)
+        ElimsAlliance.objects.create(event=self.event, alliance_number=1, player1='a', player2='b', player3='c',
+                                     advancement='w')
+        ElimsAlliance.objects.create(event=self.event, alliance_number=2, player1='d', player2='e', player3='f',
+                                     advancement='f')
+        ChampionshipPoints.objects.create(player_name='a', event_1=5)
+
+    def totals(self):
+        return dict(ChampionshipPoints.objects.values_list('player_name', 'total'))
+
+    def test_qualification_points(self):
+        # The FRC district table for a 30 team event
+        self.assertEqual([qualification_points(rank, 30) for rank in range(1, 31)], [
+            22, 21, 20, 19, 18, 17, 17, 16, 16, 15, 15, 14, 14, 13, 13,
+            12, 12, 12, 11, 11, 10, 10, 9, 9, 8, 8, 7, 6, 5, 4])
+
+    def test_award_and_delete(self):
+        call_command('award_championship_points', self.event.slug, stdout=StringIO())
+
+        # Qualification, alliance selection and advancement points
+        self.assertEqual(self.totals(), {'a': 5 + 22 + 16 + 30, 'b': 17 + 16 + 30, 'c': 15 + 1 + 30,
+                                         'd': 12 + 15 + 20, 'e': 10 + 15 + 20, 'f': 8 + 2 + 20})
+
+        # Awarding again replaces the event's points rather than adding to them
+        Ranking.objects.filter(event=self.event, player_name='f').delete()
+        award_championship_points(self.event)
+        self.assertEqual(self.totals()['f'], 2 + 20)
+
+        other = Event.objects.create(name='Other Event', start_time=timezone.now(), end_time=timezone.now())
+        ChampionshipPointsEntry.objects.create(player_name='a', event=other, points=10)
+        self.assertEqual(self.totals()['a'], 5 + 22 + 16 + 30 + 10)
+
+        # Bulk deletes, as the admin does them, refresh the totals too
+        Event.objects.filter(pk=self.event.pk).delete()
+        self.assertEqual(self.totals(), {'a': 15, 'b': 0, 'c': 0, 'd': 0, 'e': 0, 'f': 0})
+        ChampionshipPointsEntry.objects.filter(event=other).delete()
+        self.assertEqual(self.totals()['a'], 5)
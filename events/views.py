@@ -1,49 +1,59 @@
+from django.http import Http404
 from django.shortcuts import render
-from django.db.models import F, Window
+from django.core.cache import cache
+from django.db.models import Count, F, Window
 from django.db.models.functions import Rank, PercentRank
 
-from .models import ElimsAlliance, Event, Player, Match, Ranking, ChampionshipPoints
+from .lib import compute_power_ratings
+from .models import EVENT_SUMMARY_CACHE_KEY, EVENT_SUMMARY_CACHE_TIMEOUT, ElimsAlliance, Event, Player, Match, Ranking, ChampionshipPoints
 
 # Create your views here.
 
 def event_summary(response):
-    events = Event.objects.all()
-    context = []
-    for event in events:
-        players = Player.objects.filter(event__name=event.name)
-        context.append({"player_num": len(players), "event": event})
-
-    return render(response, "events/event_summary.html", {"context": context})
+    events = cache.get(EVENT_SUMMARY_CACHE_KEY)
+    if events is None:
+        events = list(Event.objects.annotate(player_num=Count('player')).order_by('start_time'))
+        cache.set(EVENT_SUMMARY_CACHE_KEY, events, EVENT_SUMMARY_CACHE_TIMEOUT)
+
+    return render(response, "events/event_summary.html", {"events": events})
+
+def get_event_or_404(event_name):
+    """
+    Finds an event by slug, or by name for links made before events had slugs.
+    """
+    event = Event.objects.filter(slug=event_name).first() or \
+        Event.objects.filter(name=event_name).order_by('pk').first()
+    if event is None:
+        raise Http404(f'Event {event_name} does not exist.')
+    return event
 
 def robot_event(response, event_name, tab):
-    players = Player.objects.filter(event__name=event_name).order_by("player_name")
-    num = []
-    i = 1 
-    for player in players:
-        num.append(i)
-        i += 1 
+    event = get_event_or_404(event_name)
+
+    players = Player.objects.filter(event_id=event.pk).order_by("player_name")
 
-    matches = Match.objects.filter(event__name=event_name)
-    quals = matches.filter(match_type='q').order_by('match_number')
-    quarters = matches.filter(match_type='qf').order_by('match_number')
-    semis = matches.filter(match_type='sf').order_by('match_number')
-    finals = matches.filter(match_type='f').order_by('match_number')
+    # One query for every match, split up by type here
+    matches_by_type = {match_type: [] for match_type, _ in Match.MATCH_TYPES}
+    for match in Match.objects.filter(event_id=event.pk).order_by('match_number'):
+        matches_by_type[match.match_type].append(match)
 
-    rankings = Ranking.objects.filter(event__name=event_name).order_by('-ranking_points')
+    rankings = list(Ranking.objects.filter(event_id=event.pk).order_by(*Ranking.ORDERING))
+    power_ratings = {rating['player_name']: rating for rating in compute_power_ratings(event)}
+    for ranking in rankings:
+        ranking.power_rating = power_ratings.get(ranking.player_name)
 
-    alliances = ElimsAlliance.objects.filter(event__name=event_name).order_by('alliance_number')
+    alliances = ElimsAlliance.objects.filter(event_id=event.pk).order_by('alliance_number')
 
-    return render(response, "events/event.html", {"event_name": event_name, "tab": tab, "players": players, "num": num, "quals": quals, "quarters": quarters, "semis": semis, "finals": finals, "rankings": rankings, "alliances": alliances})
+    return render(response, "events/event.html", {"event_name": event.name, "event_slug": event.slug, "tab": tab, "players": players, "quals": matches_by_type['q'], "quarters": matches_by_type['qf'], "semis": matches_by_type['sf'], "finals": matches_by_type['f'], "rankings": rankings, "alliances": alliances})
 
 def robot_event_tabless(response, event_name):
     return robot_event(response, event_name, '')
 
 def championship_points(request):
     points = ChampionshipPoints.objects.annotate(
-        sum=F("event_1")+F("event_2"),
         rank=Window(
             expression=Rank(),
-            order_by=F("sum").desc(),
+            order_by=F("total").desc(),
         )
-        ).order_by("-sum")
+        ).order_by("-total")
     return render(request, "events/championship_points.html", {"points": points})
@@ -1,4 +1,5 @@
 from rest_framework.serializers import ModelSerializer
+from SRCweb.serializers import ValuesSerializer
 from discordoauth2.models import User
 from ..models import Score, Leaderboard
 
@@ -30,3 +31,27 @@ class ScoreWithPlayerSerializer(ModelSerializer):
     class Meta:
         model = Score
         fields = ['player', 'score', 'time_set']
+
+
+# Fast-path equivalents of the serializers above, built from `.values_list()`
+# rows. These must stay in sync with the ModelSerializer field lists.
+
+class UserValuesSerializer(ValuesSerializer):
+    fields = ['id', 'display_name', 'username',
+              'avatar', 'date_joined', 'is_staff']
+    datetime_fields = ('date_joined',)
+
+
+class LeaderboardValuesSerializer(ValuesSerializer):
+    fields = ['id', 'name', 'robot', 'game',
+              'game_slug', 'auto_or_teleop', 'message']
+
+
+class ScoreWithLeaderboardValuesSerializer(ValuesSerializer):
+    fields = [('leaderboard', LeaderboardValuesSerializer), 'score', 'time_set']
+    datetime_fields = ('time_set',)
+
+
+class ScoreWithPlayerValuesSerializer(ValuesSerializer):
+    fields = [('player', UserValuesSerializer), 'score', 'time_set']
+    datetime_fields = ('time_set',)
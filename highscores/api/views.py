@@ -6,7 +6,7 @@ from rest_framework.decorators import api_view
 from rest_framework.authtoken.models import Token
 
 from discordoauth2.models import User
-from .serializers import UserSerializer, ScoreWithLeaderboardSerializer, ScoreWithPlayerSerializer, LeaderboardSerializer
+from .serializers import UserSerializer, ScoreWithPlayerSerializer, LeaderboardSerializer, ScoreWithLeaderboardValuesSerializer, ScoreWithPlayerValuesSerializer
 from ..models import Score, Leaderboard
 from ..lib import game_to_submit_func, get_client_ip
 
@@ -44,8 +44,7 @@ def get_my_scores(request: Request) -> Response:
 
     scores = Score.objects.filter(
         player=request.user, approved=True).order_by('-time_set')
-    serializer = ScoreWithLeaderboardSerializer(scores, many=True)
-    return Response({'success': True, 'scores': serializer.data})
+    return Response({'success': True, 'scores': ScoreWithLeaderboardValuesSerializer.many(scores)})
 
 
 @api_view(['GET'])
@@ -58,8 +57,7 @@ def get_player_scores(request: Request, user_id: int) -> Response:
 
     scores = Score.objects.filter(
         player=user, approved=True).order_by('-time_set')
-    serializer = ScoreWithLeaderboardSerializer(scores, many=True)
-    return Response({'success': True, 'scores': serializer.data})
+    return Response({'success': True, 'scores': ScoreWithLeaderboardValuesSerializer.many(scores)})
 
 
 @api_view(['GET'])
@@ -75,8 +73,7 @@ def get_robot_leaderboard(request: Request, game: str, robot: str) -> Response:
     scores = Score.objects.filter(leaderboard__robot=robot, leaderboard__game=game, approved=True).order_by(
         '-score', 'time_set').all()
 
-    top_scores = scores[:10]
-    serializer = ScoreWithPlayerSerializer(top_scores, many=True)
+    top_scores = ScoreWithPlayerValuesSerializer.many(scores[:10])
 
     self_score_data = None
     if request.user.is_authenticated:
@@ -87,7 +84,7 @@ def get_robot_leaderboard(request: Request, game: str, robot: str) -> Response:
             self_score_data['rank'] = scores.filter(score__gt=self_score.score).count(
             ) + scores.filter(score=self_score.score, time_set__lt=self_score.time_set).count() + 1
 
-    return Response({'success': True, 'message': message, 'scores': serializer.data, 'self': self_score_data})
+    return Response({'success': True, 'message': message, 'scores': top_scores, 'self': self_score_data})
 
 
 @api_view(['GET'])
@@ -101,8 +98,7 @@ def get_leaderboard(request: Request, leaderboard: str) -> Response:
     scores = Score.objects.filter(leaderboard__name=leaderboard, approved=True).order_by(
         '-score', 'time_set').all()
 
-    top_scores = scores[:10]
-    serializer = ScoreWithPlayerSerializer(top_scores, many=True)
+    top_scores = ScoreWithPlayerValuesSerializer.many(scores[:10])
 
     self_score_data = None
     if request.user.is_authenticated:
@@ -113,7 +109,7 @@ def get_leaderboard(request: Request, leaderboard: str) -> Response:
             self_score_data['rank'] = scores.filter(score__gt=self_score.score).count(
             ) + scores.filter(score=self_score.score, time_set__lt=self_score.time_set).count() + 1
 
-    return Response({'success': True, 'message': message, 'scores': serializer.data, 'self': self_score_data})
+    return Response({'success': True, 'message': message, 'scores': top_scores, 'self': self_score_data})
 
 
 @api_view(['GET'])
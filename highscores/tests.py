@@ -1,3 +1,33 @@
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
 
-# Create your tests here.
+from discordoauth2.models import User
+from .api.serializers import ScoreWithLeaderboardSerializer, ScoreWithLeaderboardValuesSerializer, \
+    ScoreWithPlayerSerializer, ScoreWithPlayerValuesSerializer
+from .models import Leaderboard, Score
+
+
+class ValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create(
+            id=1, username='player', discriminator='0000',
+            avatar='https://cdn.discordapp.com/avatars/1/player.webp',
+            public_flags=0, flags=0, locale='en-US', mfa_enabled=False,
+            email='player@secondrobotics.org', verified=True)
+        leaderboard = Leaderboard.objects.create(
+            name='Robot', robot='Robot', game='Game', game_slug='GM')
+        for score in (10, 30, 20):
+            Score.objects.create(
+                leaderboard=leaderboard, player=user, score=score, approved=True,
+                source='https://secondrobotics.org/', clean_code='code')
+        self.scores = Score.objects.order_by('-score', 'time_set')
+
+    def test_score_with_leaderboard_matches_serializer(self):
+        self.assertEqual(
+            JSONRenderer().render(ScoreWithLeaderboardValuesSerializer.many(self.scores)),
+            JSONRenderer().render(ScoreWithLeaderboardSerializer(self.scores, many=True).data))
+
+    def test_score_with_player_matches_serializer(self):
+        self.assertEqual(
+            JSONRenderer().render(ScoreWithPlayerValuesSerializer.many(self.scores)),
+            JSONRenderer().render(ScoreWithPlayerSerializer(self.scores, many=True).data))
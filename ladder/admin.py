@@ -3,10 +3,44 @@ from .models import *
 
 # Register your models here.
 
+class DivisionPlayerInline(admin.TabularInline):
+    model = DivisionPlayer
+    fields = ('slot', 'name', 'absent')
+    extra = 0
+
+
+class DivisionMatchInline(admin.TabularInline):
+    model = DivisionMatch
+    fields = ('match_index', 'red', 'blue')
+    extra = 0
+
+
 class DivisionAdmin(admin.ModelAdmin):
     list_display = ('week', 'level')
     list_filter = ('week', 'level')
     search_fields = ('week', 'level')
-    exclude = ('rank1_info', 'rank2_info', 'rank3_info', 'rank4_info', 'rank5_info', 'rank6_info')
+    exclude = ['standings'] + [field for fields in LEGACY_PLAYER_FIELDS + LEGACY_MATCH_FIELDS for field in fields]
+    inlines = [DivisionPlayerInline, DivisionMatchInline]
+
+    def save_model(self, request, obj, form, change):
+        # A new division is written now so its players and matches can point at it, and
+        # again in save_related once they are in to rank them; an edited one is written
+        # once, in save_related
+        if not change:
+            super().save_model(request, obj, form, change)
+
+    def save_formset(self, request, form, formset, change):
+        # The division is ranked once for all its rows, in save_related
+        rows = formset.save(commit=False)
+        for row in formset.deleted_objects:
+            row.delete(refresh_division=False)
+        for row in rows:
+            row.save(refresh_division=False)
+        formset.save_m2m()
+
+    def save_related(self, request, form, formsets, change):
+        # Players and scores are saved after the division, so rank them once they are in
+        super().save_related(request, form, formsets, change)
+        form.instance.save()
 
-admin.site.register(Division, DivisionAdmin)
\ No newline at end of file
+admin.site.register(Division, DivisionAdmin)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ladder.models import LEGACY_MATCH_FIELDS, LEGACY_PLAYER_FIELDS, Division, DivisionMatch, DivisionPlayer
+
+
+class Command(BaseCommand):
+    help = 'Copies the legacy playerN and match_N_red/match_N_blue columns into DivisionPlayer and DivisionMatch rows, then ranks each division again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replace', action='store_true',
+                            help='Also copy divisions that already have players, replacing their rows.')
+
+    def handle(self, *args, **options):
+        divisions = Division.objects.all()
+        if not options['replace']:
+            divisions = divisions.filter(players__isnull=True)
+        columns = [field for fields in LEGACY_PLAYER_FIELDS + LEGACY_MATCH_FIELDS for field in fields]
+
+        players = []
+        matches = []
+        copied = []
+        for pk, *values in divisions.values_list('pk', *columns):
+            copied.append(pk)
+            player_values, match_values = values[:2 * len(LEGACY_PLAYER_FIELDS)], values[2 * len(LEGACY_PLAYER_FIELDS):]
+            for index in range(len(LEGACY_PLAYER_FIELDS)):
+                name, absent = player_values[2 * index], player_values[2 * index + 1]
+                if name is not None:
+                    players.append(DivisionPlayer(division_id=pk, slot=index + 1, name=name, absent=absent))
+            for index in range(len(LEGACY_MATCH_FIELDS)):
+                red, blue = match_values[2 * index], match_values[2 * index + 1]
+                if red is not None or blue is not None:
+                    matches.append(DivisionMatch(division_id=pk, match_index=index + 1, red=red, blue=blue))
+
+        with transaction.atomic():
+            DivisionPlayer.objects.filter(division_id__in=copied).delete()
+            DivisionMatch.objects.filter(division_id__in=copied).delete()
+            DivisionPlayer.objects.bulk_create(players, batch_size=1000)
+            DivisionMatch.objects.bulk_create(matches, batch_size=1000)
+            for division in Division.objects.filter(pk__in=copied).prefetch_related('players', 'matches'):
+                division.save(update_fields=['standings'])
+
+        self.stdout.write(f'{len(copied)} divisions, {len(players)} players, {len(matches)} matches copied')
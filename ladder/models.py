@@ -1,9 +1,15 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from SRCweb import settings
-import copy
 
 # Create your models here.
 
+SCHEDULE_CACHE_TIMEOUT = 60 * 60
+
+
+def _present_count(players):
+    return sum(1 for player in players.values() if not player.absent)
+
 class Division(models.Model):
     week = models.IntegerField(null=False,blank=False)
 
@@ -11,6 +17,8 @@ class Division(models.Model):
 
     complete = models.BooleanField(default=False)
 
+    # Legacy player and match columns, only read by the copy_division_rows command.
+    # Players live in DivisionPlayer and scores in DivisionMatch; drop these once every division has been copied.
     player1 = models.CharField(max_length=25,null=True,blank=True)
     player2 = models.CharField(max_length=25,null=True,blank=True)
     player3 = models.CharField(max_length=25,null=True,blank=True)
@@ -70,208 +78,176 @@ class Division(models.Model):
     match_15_red = models.IntegerField(null=True, blank=True)
     match_15_blue = models.IntegerField(null=True, blank=True)
 
+    def players_by_slot(self):
+        return {player.slot: player for player in self.players.all()}
+
+    def scores_by_match(self):
+        return {match.match_index: (match.red, match.blue) for match in self.matches.all()}
+
     @property
     def num_players(self):
-        count = 0
-        count += 0 if self.player1 == None or self.player1_absent == True else 1
-        count += 0 if self.player2 == None or self.player2_absent == True else 1
-        count += 0 if self.player3 == None or self.player3_absent == True else 1
-        count += 0 if self.player4 == None or self.player4_absent == True else 1
-        count += 0 if self.player5 == None or self.player5_absent == True else 1
-        count += 0 if self.player6 == None or self.player6_absent == True else 1
-        return count
+        return _present_count(self.players_by_slot())
 
     # @property
-    def get_schedule(self):
-        if self.num_players == 6:
-            return SIX_PLAYER_SCHEDULE
-        elif self.num_players == 5:
-            return FIVE_PLAYER_SCHEDULE
-        else:
-            return FOUR_PLAYER_SCHEDULE
+    def get_schedule(self, players=None):
+        # Takes the players_by_slot() map when the caller has already read it
+        present = _present_count(self.players_by_slot() if players is None else players)
+        return SCHEDULES.get(present, FOUR_PLAYER_SCHEDULE)
 
     
     def save(self, *args, **kwargs):
+        # Rank the players before the write, so an edit is saved once
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'standings' in update_fields:
+            self.standings = self.calculate_rankings()
+
+        self.version += 1
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
         super(Division, self).save(*args, **kwargs)
-        
-        should_calc = True
 
-        if len(kwargs.get('update_fields', [])) > 0:
-            should_calc = False
-        
-        if should_calc:
-            self.calculate_rankings()
+    def refresh(self):
+        """
+        Ranks the division again after its players or scores changed, which
+        also moves the cached schedule on to a new version.
+        """
+        self.save(update_fields=['standings'])
 
     def calculate_rankings(self):
-        schedule = self.get_schedule()
+        """
+        Works out the standings from the division's players and scores without saving them.
+        """
+        if self.pk is None:
+            return []
+        players = self.players_by_slot()
+        schedule = self.get_schedule(players)
+        scores = self.scores_by_match()
 
-        wins = [0, 0, 0, 0, 0, 0]
-        losses = [0, 0, 0, 0, 0, 0]
-        ties = [0, 0, 0, 0, 0, 0]
-        total_points = [0, 0, 0, 0, 0, 0]
+        records = {slot: {'wins': 0, 'losses': 0, 'ties': 0, 'total_points': 0} for slot in players}
 
-        for match_num in range(len(schedule)): # we need the match number (from 0) to be able to grab scores
-            match = schedule[match_num] # get the players in the match as array
-            
-            red_score = self.get_red_score(match_num + 1)
-            blue_score = self.get_blue_score(match_num + 1)
+        for match_num, match in enumerate(schedule, 1):
+            red_score, blue_score = scores.get(match_num, (None, None))
 
             if red_score == None or blue_score == None: # check if the match has happened yet
                 continue
 
-            for player_index in range(0, 3): # iterate through red alliance 
-                player = match[player_index]
-                
-                if player == -1: # there is no player -1
+            for player_index in range(0, 6):
+                # The first three players are red, the last three blue; player -1 is an empty spot
+                if match[player_index] == -1:
                     continue
-
-                total_points[player] += red_score
-                
-                if red_score > blue_score:
-                    wins[player] += 1
-                elif red_score < blue_score:
-                    losses[player] += 1
-                else:
-                    ties[player] += 1
-            
-            for player_index in range(3, 6): # iterate through blue alliance 
-                player = match[player_index]
-                
-                if player == -1: # there is no player -1
+                record = records.get(match[player_index] + 1)
+                if record is None:
                     continue
 
-                total_points[player] += blue_score
-                
-                if blue_score > red_score:
-                    wins[player] += 1
-                elif blue_score < red_score:
-                    losses[player] += 1
+                score, opponent_score = (red_score, blue_score) if player_index < 3 else (blue_score, red_score)
+                record['total_points'] += score
+                if score > opponent_score:
+                    record['wins'] += 1
+                elif score < opponent_score:
+                    record['losses'] += 1
                 else:
-                    ties[player] += 1
-        
-        player1_info = {'name': self.player1, 'wins':wins[0], 'losses':losses[0], 'ties':ties[0], 'total_points':total_points[0], 'absent':self.player1_absent}
-        player2_info = {'name': self.player2, 'wins':wins[1], 'losses':losses[1], 'ties':ties[1], 'total_points':total_points[1], 'absent':self.player2_absent}
-        player3_info = {'name': self.player3, 'wins':wins[2], 'losses':losses[2], 'ties':ties[2], 'total_points':total_points[2], 'absent':self.player3_absent}
-        player4_info = {'name': self.player4, 'wins':wins[3], 'losses':losses[3], 'ties':ties[3], 'total_points':total_points[3], 'absent':self.player4_absent}
-        player5_info = {'name': self.player5, 'wins':wins[4], 'losses':losses[4], 'ties':ties[4], 'total_points':total_points[4], 'absent':self.player5_absent}
-        player6_info = {'name': self.player6, 'wins':wins[5], 'losses':losses[5], 'ties':ties[5], 'total_points':total_points[5], 'absent':self.player6_absent}
-
-        info_list = [player1_info, player2_info, player3_info, player4_info, player5_info, player6_info]
-
-        info_list = sorted(info_list, key = lambda x: (x['wins'], x['total_points']), reverse=True)
-
-        self.rank1_info = info_list[0]
-        self.rank2_info = info_list[1]
-        self.rank3_info = info_list[2]
-        self.rank4_info = info_list[3]
-        self.rank5_info = info_list[4]
-        self.rank6_info = info_list[5]
-
-
-        self.save(update_fields=['rank1_info', 'rank2_info', 'rank3_info', 'rank4_info', 'rank5_info', 'rank6_info'])
-        
-
-    rank1_info = models.JSONField(null=True, blank=True)
-    rank2_info = models.JSONField(null=True, blank=True)
-    rank3_info = models.JSONField(null=True, blank=True)
-    rank4_info = models.JSONField(null=True, blank=True)
-    rank5_info = models.JSONField(null=True, blank=True)
-    rank6_info = models.JSONField(null=True, blank=True)
-
-    def get_player(self, num):
-        if num == 1:
-            return self.player1
-        elif num == 2:
-            return self.player2
-        elif num == 3:
-            return self.player3
-        elif num == 4:
-            return self.player4
-        elif num == 5:
-            return self.player5
-        elif num == 6:
-            return self.player6
-        else:
-            return ''
+                    record['ties'] += 1
+
+        standings = [{'name': players[slot].name, **record, 'absent': players[slot].absent}
+                     for slot, record in records.items()]
+        return sorted(standings, key = lambda x: (x['wins'], x['total_points']), reverse=True)
+
+    # Players from first to last, each as {name, wins, losses, ties, total_points, absent}
+    standings = models.JSONField(default=list, blank=True)
+
+    # Bumped on every save; the admin saves the division after its players and matches
+    version = models.IntegerField(default=0, editable=False)
 
     def get_prepared_schedule(self):
-        schedule = copy.deepcopy(self.get_schedule())
-        
-        for i in range(len(schedule)):
-            for j in range(0, 6):
-                print(schedule[i][j])
-                schedule[i][j] = self.get_player(schedule[i][j] + 1)
-            schedule[i].append(self.get_red_score(i + 1))
-            schedule[i].append(self.get_blue_score(i + 1))
-        
+        """
+        Lists each match in the schedule as its six player names (blank for an
+        empty spot) followed by the red and blue scores. Cached until the
+        division is next saved.
+        """
+        cache_key = f'ladder_schedule_{self.pk}_{self.version}'
+        schedule = cache.get(cache_key)
+        if schedule is None:
+            players = self.players_by_slot()
+            scores = self.scores_by_match()
+
+            schedule = []
+            for match_num, match in enumerate(self.get_schedule(players), 1):
+                # Schedules number players from 0 and slots from 1, so an empty spot (-1) finds no player
+                names = [players[index + 1].name if index + 1 in players else '' for index in match]
+                schedule.append(names + list(scores.get(match_num, (None, None))))
+            cache.set(cache_key, schedule, SCHEDULE_CACHE_TIMEOUT)
         return schedule
-    
-    def get_red_score(self, match):
-        if match == 1:
-            return self.match_1_red
-        elif match == 2:
-            return self.match_2_red
-        elif match == 3:
-            return self.match_3_red
-        elif match == 4:
-            return self.match_4_red
-        elif match == 5:
-            return self.match_5_red
-        elif match == 6:
-            return self.match_6_red
-        elif match == 7:
-            return self.match_7_red
-        elif match == 8:
-            return self.match_8_red
-        elif match == 9:
-            return self.match_9_red
-        elif match == 10:
-            return self.match_10_red
-        elif match == 11:
-            return self.match_11_red
-        elif match == 12:
-            return self.match_12_red
-        elif match == 13:
-            return self.match_13_red
-        elif match == 14:
-            return self.match_14_red
-        elif match == 15:
-            return self.match_15_red
-
-    def get_blue_score(self, match):
-        if match == 1:
-            return self.match_1_blue
-        elif match == 2:
-            return self.match_2_blue
-        elif match == 3:
-            return self.match_3_blue
-        elif match == 4:
-            return self.match_4_blue
-        elif match == 5:
-            return self.match_5_blue
-        elif match == 6:
-            return self.match_6_blue
-        elif match == 7:
-            return self.match_7_blue
-        elif match == 8:
-            return self.match_8_blue
-        elif match == 9:
-            return self.match_9_blue
-        elif match == 10:
-            return self.match_10_blue
-        elif match == 11:
-            return self.match_11_blue
-        elif match == 12:
-            return self.match_12_blue
-        elif match == 13:
-            return self.match_13_blue
-        elif match == 14:
-            return self.match_14_blue
-        elif match == 15:
-            return self.match_15_blue
-        
 
 
+# (name, absent) legacy column names for each player, in slot order
+LEGACY_PLAYER_FIELDS = [(f'player{i}', f'player{i}_absent') for i in range(1, 7)]
+
+# (red, blue) legacy column names for each match, in order
+LEGACY_MATCH_FIELDS = [(f'match_{i}_red', f'match_{i}_blue') for i in range(1, 16)]
+
+
+class DivisionPlayer(models.Model):
+    division = models.ForeignKey(Division, on_delete=models.CASCADE, related_name='players')
+    # Position in the division, from 1; the schedules refer to players by slot
+    slot = models.PositiveIntegerField()
+
+    name = models.CharField(max_length=25)
+    absent = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['slot']
+        constraints = [
+            models.UniqueConstraint(fields=['division', 'slot'], name='unique_division_player_slot'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, refresh_division=True, **kwargs):
+        # Pass refresh_division=False when the caller saves the division afterwards, as the admin does
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if refresh_division:
+                self.division.refresh()
+
+    def delete(self, *args, refresh_division=True, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if refresh_division:
+                self.division.refresh()
+        return result
+
+
+class DivisionMatch(models.Model):
+    division = models.ForeignKey(Division, on_delete=models.CASCADE, related_name='matches')
+    match_index = models.PositiveIntegerField()
+
+    red = models.IntegerField(null=True, blank=True)
+    blue = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['match_index']
+        constraints = [
+            models.UniqueConstraint(fields=['division', 'match_index'], name='unique_division_match'),
+        ]
+
+    def __str__(self):
+        return f'Week {self.division.week} Division {self.division.level} - Match {self.match_index}'
+
+    def save(self, *args, refresh_division=True, **kwargs):
+        # Pass refresh_division=False when the caller saves the division afterwards, as the admin does
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if refresh_division:
+                self.division.refresh()
+
+    def delete(self, *args, refresh_division=True, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if refresh_division:
+                self.division.refresh()
+        return result
+
 
 # Schedule uses players 0-5, with -1 as no player (filling the gap makes calculations easier)
 
@@ -313,4 +289,11 @@ FOUR_PLAYER_SCHEDULE = [
     [0, 2, -1, 1, 3, -1],
     [0, 3, -1, 1, 2, -1],
     [0, 3, -1, 1, 2, -1],
-    [0, 3, -1, 1, 2, -1]]
\ No newline at end of file
+    [0, 3, -1, 1, 2, -1]]
+
+# Schedules by number of players present
+SCHEDULES = {
+    6: SIX_PLAYER_SCHEDULE,
+    5: FIVE_PLAYER_SCHEDULE,
+    4: FOUR_PLAYER_SCHEDULE,
+}
@@ -1,3 +1,82 @@
+import unittest
+from io import StringIO
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
+if not apps.is_installed('ladder'):
+    raise unittest.SkipTest('ladder is not in INSTALLED_APPS')
+
+from .models import Division, DivisionMatch, DivisionPlayer
+
 # Create your tests here.
+
+# Four players: matches 1 and 4 played, in which slots 1-2 beat 3-4 and then 2, 4 beat 1, 3
+EXPECTED_STANDINGS = [
+    {'name': 'p2', 'wins': 2, 'losses': 0, 'ties': 0, 'total_points': 17, 'absent': False},
+    {'name': 'p1', 'wins': 1, 'losses': 1, 'ties': 0, 'total_points': 13, 'absent': False},
+    {'name': 'p4', 'wins': 1, 'losses': 1, 'ties': 0, 'total_points': 12, 'absent': False},
+    {'name': 'p3', 'wins': 0, 'losses': 2, 'ties': 0, 'total_points': 8, 'absent': False},
+]
+
+
+class DivisionTestCase(TestCase):
+    def test_calculate_rankings(self):
+        division = Division.objects.create(week=1, level=1)
+        for slot in range(1, 5):
+            DivisionPlayer.objects.create(division=division, slot=slot, name=f'p{slot}')
+        DivisionMatch.objects.create(division=division, match_index=1, red=10, blue=5)
+        DivisionMatch.objects.create(division=division, match_index=4, red=3, blue=7)
+        DivisionMatch.objects.create(division=division, match_index=2)
+
+        self.assertEqual(division.calculate_rankings(), EXPECTED_STANDINGS)
+        # The direct saves above ranked the division as they went
+        self.assertEqual(Division.objects.get(pk=division.pk).standings, EXPECTED_STANDINGS)
+
+        DivisionMatch.objects.get(division=division, match_index=4).delete()
+        self.assertEqual([player['name'] for player in Division.objects.get(pk=division.pk).standings],
+                         ['p1', 'p2', 'p3', 'p4'])
+
+    def test_copy_legacy_rows(self):
+        division = Division.objects.create(week=1, level=1, player1='p1', player2='p2', player3='p3',
+                                           player4='p4', player5='gone', player5_absent=True,
+                                           match_1_red=10, match_1_blue=5, match_4_red=3, match_4_blue=7)
+        call_command('copy_division_rows', stdout=StringIO())
+
+        division = Division.objects.get(pk=division.pk)
+        self.assertEqual([(player.slot, player.name, player.absent) for player in division.players.all()],
+                         [(1, 'p1', False), (2, 'p2', False), (3, 'p3', False), (4, 'p4', False),
+                          (5, 'gone', True)])
+        self.assertEqual(division.scores_by_match(), {1: (10, 5), 4: (3, 7)})
+        # The absent player leaves four present, so the four player schedule is used
+        self.assertEqual(division.standings, EXPECTED_STANDINGS + [
+            {'name': 'gone', 'wins': 0, 'losses': 0, 'ties': 0, 'total_points': 0, 'absent': True}])
+
+
+class DivisionSaveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.division = Division.objects.create(week=1, level=1)
+        for slot in range(1, 5):
+            DivisionPlayer.objects.create(division=self.division, slot=slot, name=f'p{slot}')
+        self.match = DivisionMatch.objects.create(division=self.division, match_index=1, red=10, blue=5)
+
+    def test_save_is_one_write(self):
+        division = Division.objects.get(pk=self.division.pk)
+        # The players and the scores are each read once, then the division written once
+        with self.assertNumQueries(3):
+            division.save()
+
+    def test_schedule_follows_edits(self):
+        self.assertEqual(Division.objects.get(pk=self.division.pk).get_prepared_schedule()[0],
+                         ['p1', 'p2', '', 'p3', 'p4', '', 10, 5])
+
+        self.match.red = 2
+        self.match.save()
+        DivisionPlayer.objects.filter(division=self.division, slot=1).get().delete()
+        DivisionPlayer.objects.create(division=self.division, slot=1, name='renamed')
+
+        division = Division.objects.get(pk=self.division.pk)
+        self.assertEqual(division.get_prepared_schedule()[0], ['renamed', 'p2', '', 'p3', 'p4', '', 2, 5])
+        self.assertEqual(division.standings[0]['name'], 'p3')
@@ -22,7 +22,7 @@ def index(response):
 def division(response, week, division):
 
     try:
-        division = Division.objects.get(week=week, level=division)
+        division = Division.objects.prefetch_related('players').get(week=week, level=division)
     except:
         return render(response, "ladder/division_error.html")
     
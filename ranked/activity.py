@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from typing import List
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .models import GameMode, GameModeActivity, Match
+
+# Days of activity the home page sorts game modes by, counted back from now
+ACTIVITY_DAYS = 7
+
+
+def record_matches(game_mode: GameMode, count: int = 1, time=None):
+    """
+    Adds matches to the game mode's activity counter for the day they were played.
+    """
+    date = timezone.localdate(time or timezone.now())
+    counter = GameModeActivity.objects.filter(game_mode=game_mode, date=date)
+    if counter.update(match_count=F('match_count') + count):
+        return
+
+    try:
+        with transaction.atomic():
+            GameModeActivity.objects.create(
+                game_mode=game_mode, date=date, match_count=count)
+    except IntegrityError:
+        # Another request created today's counter first
+        counter.update(match_count=F('match_count') + count)
+
+
+def record_retimed_match(game_mode: GameMode, old_time, new_time):
+    """
+    Moves a match whose time was changed to the counter for its new day.
+    """
+    old_date = timezone.localdate(old_time)
+    if old_date == timezone.localdate(new_time):
+        return
+
+    GameModeActivity.objects.filter(game_mode=game_mode, date=old_date, match_count__gt=0).update(
+        match_count=F('match_count') - 1)
+    record_matches(game_mode, time=new_time)
+
+
+def _count_matches(game_mode_ids: List[int], start, end=None) -> dict:
+    # Filtering on the game modes lets the (game_mode, time) index serve the range
+    matches = Match.objects.filter(game_mode_id__in=game_mode_ids, time__gte=start)
+    if end is not None:
+        matches = matches.filter(time__lt=end)
+    return dict(matches.values('game_mode').annotate(
+        total=Count('match_number')).values_list('game_mode', 'total'))
+
+
+def get_game_modes_by_activity() -> List[GameMode]:
+    """
+    Gets every game mode, most played in the last week first, with the number
+    of matches as `match_count`. Whole days are read from the daily counters
+    and only the part of the oldest day still in the week is counted from
+    Match. Game modes with no counters yet are counted from Match entirely.
+    """
+    now = timezone.now()
+    window_start = now - timedelta(days=ACTIVITY_DAYS)
+    first_full_date = timezone.localdate(window_start) + timedelta(days=1)
+    first_full_day = timezone.make_aware(datetime.combine(first_full_date, datetime.min.time()))
+
+    game_modes = list(GameMode.objects.all())
+    counted = set(GameModeActivity.objects.values_list('game_mode', flat=True).distinct())
+    match_counts = dict(GameModeActivity.objects.filter(date__gte=first_full_date).values(
+        'game_mode').annotate(total=Sum('match_count')).values_list('game_mode', 'total'))
+
+    uncounted = [game_mode.id for game_mode in game_modes if game_mode.id not in counted]
+    if uncounted:
+        match_counts.update(_count_matches(uncounted, first_full_day))
+
+    partial_day = _count_matches([game_mode.id for game_mode in game_modes], window_start, first_full_day)
+    for game_mode in game_modes:
+        game_mode.match_count = match_counts.get(game_mode.id, 0) + partial_day.get(game_mode.id, 0)
+    game_modes.sort(key=lambda game_mode: -game_mode.match_count)
+    return game_modes
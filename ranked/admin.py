@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import GameMode, Match, PlayerElo, EloHistory
+from .models import GameMode, Match, PlayerElo, EloHistory, EloHistoryChunk, GameModeActivity, GameModeStats, PlayerPairStats
 
 # Register your models here.
 
@@ -15,14 +15,15 @@ class MatchAdmin(admin.ModelAdmin):
     list_display = ('match_number', 'time', 'game_mode',
                     'red_score', 'blue_score')
     list_filter = ('time', 'game_mode')
-    search_fields = ('match_number', 'time')
+    search_fields = ('match_number', 'time', 'idempotency_key')
+    exclude = ('idempotent_response',)
 
 
 class PlayerEloAdmin(admin.ModelAdmin):
     list_display = ('player', 'game_mode', 'elo',
                     'matches_played', 'matches_won', 'matches_lost', 'matches_drawn')
     list_filter = ('game_mode',)
-    search_fields = ('player',)
+    search_fields = ('player__username', 'player__display_name')
 
 
 class EloHistoryAdmin(admin.ModelAdmin):
@@ -30,8 +31,35 @@ class EloHistoryAdmin(admin.ModelAdmin):
     search_fields = ('player_elo',)
 
 
+class EloHistoryChunkAdmin(admin.ModelAdmin):
+    list_display = ('player_elo', 'first_match_number',
+                    'last_match_number', 'length')
+    exclude = ('match_numbers', 'elos')
+
+
+class GameModeActivityAdmin(admin.ModelAdmin):
+    list_display = ('game_mode', 'date', 'match_count')
+    list_filter = ('game_mode',)
+
+
+class PlayerPairStatsAdmin(admin.ModelAdmin):
+    list_display = ('game_mode', 'player', 'other', 'wins_with', 'losses_with',
+                    'draws_with', 'wins_against', 'losses_against', 'draws_against')
+    list_filter = ('game_mode',)
+    search_fields = ('player__username', 'player__display_name')
+
+
+class GameModeStatsAdmin(admin.ModelAdmin):
+    list_display = ('game_mode', 'matches_played', 'players_count',
+                    'average_elo', 'last_match_time')
+
+
 admin.site.site_header = "Second Robotics Admin Panel"
 admin.site.register(GameMode, GameModeAdmin)
 admin.site.register(Match, MatchAdmin)
 admin.site.register(PlayerElo, PlayerEloAdmin)
 admin.site.register(EloHistory, EloHistoryAdmin)
+admin.site.register(EloHistoryChunk, EloHistoryChunkAdmin)
+admin.site.register(GameModeActivity, GameModeActivityAdmin)
+admin.site.register(GameModeStats, GameModeStatsAdmin)
+admin.site.register(PlayerPairStats, PlayerPairStatsAdmin)
@@ -1,11 +1,19 @@
 from django.utils import timezone
 import math
+from rest_framework.fields import DateTimeField
 from rest_framework.response import Response
 from typing import List
 from discordoauth2.models import User
+from ranked.history import get_elos_at, truncate_elo_history
 from ranked.models import EloHistory, GameMode, Match, PlayerElo
+from ranked.pairs import record_pair_results
+from .serializers import PlayerEloSerializer
 from .elo_constants import N, K, R, B, C, D, A
 
+# PlayerElo fields changed by a match result
+PLAYER_ELO_UPDATE_FIELDS = ['elo', 'matches_played', 'matches_won', 'matches_lost', 'matches_drawn',
+                            'last_match_played_time', 'last_match_played_number', 'total_score']
+
 
 def validate_post_match_req_body(body: dict, players_per_alliance: int):
     if body is None or 'red_alliance' not in body or 'blue_alliance' not in body or \
@@ -37,12 +45,29 @@ def validate_post_match_req_body(body: dict, players_per_alliance: int):
     return None
 
 
+def validate_idempotency_key(idempotency_key):
+    if idempotency_key is None:
+        return None
+
+    if not isinstance(idempotency_key, str) or not 0 < len(idempotency_key) <= 64:
+        return Response(status=400, data={
+            'error': 'Idempotency key must be a string of 1 to 64 characters.'
+        })
+
+    return None
+
+
 def validate_patch_match_req_body(body: dict):
     if body is None or 'red_score' not in body or 'blue_score' not in body:
         return Response(status=400, data={
             'error': 'Missing required fields in request body.'
         })
 
+    if body.get('match_number') is not None and not isinstance(body['match_number'], int):
+        return Response(status=400, data={
+            'error': 'Match number must be an integer.'
+        })
+
     if not isinstance(body['red_score'], int) or not isinstance(body['blue_score'], int):
         return Response(status=400, data={
             'error': 'Score must be integers.'
@@ -56,133 +81,265 @@ def validate_patch_match_req_body(body: dict):
     return None
 
 
-def get_match_player_info(red_alliance: List[User], blue_alliance: List[User], game_mode: GameMode):
-    # Get players
-    red_players = []
-    for player_id in red_alliance:
+def resolve_players(player_ids: list, game_mode: GameMode):
+    """
+    Looks up the users and their PlayerElo for the given player ids in a couple
+    of queries, creating any missing PlayerElo. Returns an error response (or
+    None) and the users and player elos in the same order as `player_ids`.
+    A player listed more than once gets the same PlayerElo object each time.
+    """
+    ids = []
+    for player_id in player_ids:
         try:
-            player = User.objects.get(id=player_id)
-        except User.DoesNotExist:
+            ids.append(int(player_id))
+        except (TypeError, ValueError):
             return Response(status=404, data={
                 'error': f'Player {player_id} does not exist.'
-            }), None, None, None, None
-        red_players.append(player)
-    blue_players = []
-    for player_id in blue_alliance:
-        try:
-            player = User.objects.get(id=player_id)
-        except User.DoesNotExist:
+            }), None, None
+
+    users = User.objects.in_bulk(ids)
+    for player_id, user_id in zip(player_ids, ids):
+        if user_id not in users:
             return Response(status=404, data={
                 'error': f'Player {player_id} does not exist.'
-            }), None, None, None, None
-        blue_players.append(player)
+            }), None, None
 
-    # Get player elos
-    red_player_elos = []
-    for player in red_players:
-        player_elo = PlayerElo.objects.get_or_create(
-            player=player, game_mode=game_mode)[0]
-        red_player_elos.append(player_elo)
-    blue_player_elos = []
-    for player in blue_players:
-        player_elo = PlayerElo.objects.get_or_create(
-            player=player, game_mode=game_mode)[0]
-        blue_player_elos.append(player_elo)
+    player_elos = {player_elo.player_id: player_elo for player_elo in PlayerElo.objects.filter(
+        game_mode=game_mode, player_id__in=users)}
 
-    return None, red_players, blue_players, red_player_elos, blue_player_elos
+    missing = [user_id for user_id in users if user_id not in player_elos]
+    if missing:
+        PlayerElo.objects.bulk_create(
+            [PlayerElo(player_id=user_id, game_mode=game_mode) for user_id in missing])
+        player_elos.update({player_elo.player_id: player_elo for player_elo in PlayerElo.objects.filter(
+            game_mode=game_mode, player_id__in=missing)})
 
+    return None, [users[user_id] for user_id in ids], [player_elos[user_id] for user_id in ids]
+
+
+def get_idempotent_response(game_mode: GameMode, idempotency_key: str):
+    """
+    Gets the stored response of the match posted with this key, if any.
+    """
+    return Match.objects.filter(game_mode=game_mode, idempotency_key=idempotency_key).values_list(
+        'idempotent_response', flat=True).first()
+
+
+def get_match_player_info(red_alliance: List[int], blue_alliance: List[int], game_mode: GameMode):
+    res, players, player_elos = resolve_players(
+        red_alliance + blue_alliance, game_mode)
+    if res:
+        return res, None, None, None, None
+
+    red_count = len(red_alliance)
+    return None, players[:red_count], players[red_count:], player_elos[:red_count], player_elos[red_count:]
+
+
+def win_probability(elo: float, opponent_elo: float) -> float:
+    return 1 / (1 + 10 ** ((opponent_elo - elo) / N))
+
+
+def apply_match_elos(match: Match, red_player_elos: List[PlayerElo], blue_player_elos: List[PlayerElo], now=None):
+    """
+    Applies a match result to the given PlayerElo objects in memory. Nothing is
+    saved; returns the red and blue elo changes and the unsaved EloHistory
+    entries recording each player's elo before the match.
+    """
+    now = now or timezone.now()
 
-def update_player_elos(match: Match, red_player_elos: List[PlayerElo], blue_player_elos: List[PlayerElo]):
     red_elo = match.red_starting_elo
     blue_elo = match.blue_starting_elo
 
-    red_odds = 1 / (1 + 10 ** ((blue_elo - red_elo) / N))
-    blue_odds = 1 / (1 + 10 ** ((red_elo - blue_elo) / N))
+    red_odds = win_probability(red_elo, blue_elo)
+    blue_odds = win_probability(blue_elo, red_elo)
 
-    elo_changes = []
+    total_score = match.red_score + match.blue_score
+    relative_score_diff = abs(match.red_score - match.blue_score) / total_score if total_score else 0
 
-    for player in red_player_elos + blue_player_elos:
-        num_played = player.matches_played
-
-        EloHistory.objects.create(
-            player_elo=player,
-            match_number=match.match_number,
-            elo=player.elo,
-        )
-
-        if player in red_player_elos:
-            score_diff = match.red_score - match.blue_score
-            relative_score_diff = abs(score_diff) / (match.red_score + match.blue_score)
-            odds = red_odds
-            player.total_score += match.red_score
-        else:
-            score_diff = match.blue_score - match.red_score
-            relative_score_diff = abs(score_diff) / (match.red_score + match.blue_score)
-            odds = blue_odds
-            player.total_score += match.blue_score
-
-        if score_diff > 0:
-            odds_diff = 1 - odds
-            player.matches_won += 1
-        elif score_diff == 0:
-            odds_diff = 0.5 - odds
-            player.matches_drawn += 1
-        else:
-            odds_diff = 0 - odds
-            player.matches_lost += 1
-
-        # Increase the importance of the score difference
-        importance_factor = 1.5
-        adjusted_score_diff = importance_factor * relative_score_diff
-
-        elo_change = ((
-            K / (1 + 0) + 2 * math.log(adjusted_score_diff + 1, 8)) * (
-            odds_diff)) * (((B - 1) / (A ** num_played)) + 1)
-
-
-        elo_changes.append(elo_change)
-        player.elo += elo_change
-
-        player.matches_played += 1
-        player.last_match_played_time = timezone.now()
-        player.last_match_played_number = match.match_number
-
-        player.save()
+    # Increase the importance of the score difference
+    importance_factor = 1.5
+    adjusted_score_diff = importance_factor * relative_score_diff
+
+    elo_changes = []
+    elo_history = []
+
+    alliances = ((red_player_elos, match.red_score - match.blue_score, red_odds, match.red_score),
+                 (blue_player_elos, match.blue_score - match.red_score, blue_odds, match.blue_score))
+    for player_elos, score_diff, odds, score in alliances:
+        for player in player_elos:
+            num_played = player.matches_played
+
+            elo_history.append(EloHistory(
+                player_elo=player,
+                match_number=match.match_number,
+                elo=player.elo,
+            ))
+
+            player.total_score += score
+
+            if score_diff > 0:
+                odds_diff = 1 - odds
+                player.matches_won += 1
+            elif score_diff == 0:
+                odds_diff = 0.5 - odds
+                player.matches_drawn += 1
+            else:
+                odds_diff = 0 - odds
+                player.matches_lost += 1
+
+            elo_change = ((
+                K / (1 + 0) + 2 * math.log(adjusted_score_diff + 1, 8)) * (
+                odds_diff)) * (((B - 1) / (A ** num_played)) + 1)
+
+            elo_changes.append(elo_change)
+            player.elo += elo_change
+
+            player.matches_played += 1
+            player.last_match_played_time = now
+            player.last_match_played_number = match.match_number
 
     red_elo_changes = elo_changes[:len(red_player_elos)]
     blue_elo_changes = elo_changes[len(red_player_elos):]
 
+    return red_elo_changes, blue_elo_changes, elo_history
+
+
+def update_player_elos(match: Match, red_player_elos: List[PlayerElo], blue_player_elos: List[PlayerElo]):
+    red_elo_changes, blue_elo_changes, elo_history = apply_match_elos(
+        match, red_player_elos, blue_player_elos)
+
+    EloHistory.objects.bulk_create(elo_history)
+    PlayerElo.objects.bulk_update(
+        red_player_elos + blue_player_elos, PLAYER_ELO_UPDATE_FIELDS)
+    record_pair_results(match.game_mode_id, [(
+        [player.player_id for player in red_player_elos],
+        [player.player_id for player in blue_player_elos],
+        match.red_score, match.blue_score, 1)])
+
     return red_elo_changes, blue_elo_changes
 
 
-def revert_player_elos(match: Match, red_elo_history: List[EloHistory], blue_elo_history: List[EloHistory]):
-    # Revert the elo on PlayerElo to the elo on EloHistory
-    for elo_history_entry in red_elo_history:
-        elo_history_entry.player_elo.elo = elo_history_entry.elo
-        elo_history_entry.player_elo.matches_played -= 1
-        elo_history_entry.player_elo.total_score -= match.red_score
-
-        if match.red_score > match.blue_score:
-            elo_history_entry.player_elo.matches_won -= 1
-        elif match.red_score < match.blue_score:
-            elo_history_entry.player_elo.matches_lost -= 1
-        else:
-            elo_history_entry.player_elo.matches_drawn -= 1
-
-        elo_history_entry.player_elo.save()
-        elo_history_entry.delete()
-
-    for elo_history_entry in blue_elo_history:
-        elo_history_entry.player_elo.elo = elo_history_entry.elo
-        elo_history_entry.player_elo.matches_played -= 1
-        elo_history_entry.player_elo.total_score -= match.blue_score
-
-        if match.red_score < match.blue_score:
-            elo_history_entry.player_elo.matches_won -= 1
-        elif match.red_score > match.blue_score:
-            elo_history_entry.player_elo.matches_lost -= 1
-        else:
-            elo_history_entry.player_elo.matches_drawn -= 1
-
-        elo_history_entry.player_elo.save()
-        elo_history_entry.delete()
+def refresh_idempotent_response(match: Match, red_player_elos: List[PlayerElo], blue_player_elos: List[PlayerElo],
+                                red_elo_changes: List[float], blue_elo_changes: List[float]):
+    """
+    Rewrites the stored response of a keyed match after it was replayed, so a
+    retry of the original post sees the match as it stands now. Rosters and
+    display names can't change, so they are kept as stored.
+    """
+    response = match.idempotent_response
+    match.idempotent_response = {
+        **response,
+        'match': {
+            **response['match'],
+            'time': DateTimeField().to_representation(match.time),
+            'red_score': match.red_score,
+            'blue_score': match.blue_score,
+            'red_starting_elo': match.red_starting_elo,
+            'blue_starting_elo': match.blue_starting_elo,
+        },
+        'red_player_elos': PlayerEloSerializer(red_player_elos, many=True).data,
+        'blue_player_elos': PlayerEloSerializer(blue_player_elos, many=True).data,
+        'red_elo_changes': red_elo_changes,
+        'blue_elo_changes': blue_elo_changes,
+    }
+
+
+def correct_match_result(match: Match, red_score: int, blue_score: int):
+    """
+    Changes the score of any match and recomputes everything downstream of it.
+    Only the match's players, and whoever they went on to play with, are rolled
+    back (each from the match where they became affected), and only the later
+    matches involving them are replayed. Call this inside a transaction.
+
+    Returns the red and blue PlayerElo of the corrected match, its red and
+    blue elo changes, the number of matches replayed and how much the sum of
+    the affected players' elos changed.
+    """
+    rosters = {}
+    for through, alliance in ((Match.red_alliance.through, 0), (Match.blue_alliance.through, 1)):
+        memberships = through.objects.filter(
+            match__game_mode_id=match.game_mode_id, match_id__gte=match.match_number).order_by(
+            'id').values_list('match_id', 'user_id')
+        for match_number, user_id in memberships:
+            rosters.setdefault(match_number, ([], []))[alliance].append(user_id)
+
+    red_ids, blue_ids = rosters.get(match.match_number, ([], []))
+    first_affected = {user_id: match.match_number for user_id in red_ids + blue_ids}
+    replay = [match.match_number]
+    for match_number in sorted(rosters):
+        if match_number <= match.match_number:
+            continue
+
+        user_ids = rosters[match_number][0] + rosters[match_number][1]
+        if any(user_id in first_affected for user_id in user_ids):
+            replay.append(match_number)
+            for user_id in user_ids:
+                first_affected.setdefault(user_id, match_number)
+
+    player_elos = {player_elo.player_id: player_elo for player_elo in PlayerElo.objects.filter(
+        game_mode_id=match.game_mode_id, player_id__in=first_affected)}
+    elo_before = sum(player_elo.elo for player_elo in player_elos.values())
+    matches = Match.objects.in_bulk(replay)
+    matches[match.match_number] = match
+
+    # Undo what the replayed matches added to each player's record
+    for match_number in replay:
+        replayed_match = matches[match_number]
+        red_ids, blue_ids = rosters[match_number]
+        for user_ids, score, opponent_score in ((red_ids, replayed_match.red_score, replayed_match.blue_score),
+                                                (blue_ids, replayed_match.blue_score, replayed_match.red_score)):
+            for user_id in user_ids:
+                player_elo = player_elos[user_id]
+                player_elo.matches_played -= 1
+                player_elo.total_score -= score
+                if score > opponent_score:
+                    player_elo.matches_won -= 1
+                elif score < opponent_score:
+                    player_elo.matches_lost -= 1
+                else:
+                    player_elo.matches_drawn -= 1
+
+    rollback_points = {player_elos[user_id].id: match_number
+                       for user_id, match_number in first_affected.items()}
+    starting_elos = get_elos_at(rollback_points)
+    for player_elo in player_elos.values():
+        player_elo.elo = starting_elos.get(player_elo.id, player_elo.elo)
+    truncate_elo_history(rollback_points)
+
+    red_ids, blue_ids = rosters[match.match_number]
+    record_pair_results(match.game_mode_id, [
+        (red_ids, blue_ids, match.red_score, match.blue_score, -1),
+        (red_ids, blue_ids, red_score, blue_score, 1),
+    ])
+
+    match.red_score = red_score
+    match.blue_score = blue_score
+
+    elo_history = []
+    for match_number in replay:
+        replayed_match = matches[match_number]
+        red_player_elos = [player_elos[user_id] for user_id in rosters[match_number][0]]
+        blue_player_elos = [player_elos[user_id] for user_id in rosters[match_number][1]]
+
+        replayed_match.red_starting_elo = sum([elo.elo for elo in red_player_elos])
+        replayed_match.blue_starting_elo = sum([elo.elo for elo in blue_player_elos])
+
+        red_elo_changes, blue_elo_changes, match_elo_history = apply_match_elos(
+            replayed_match, red_player_elos, blue_player_elos, replayed_match.time)
+        elo_history += match_elo_history
+
+        if match_number == match.match_number:
+            corrected = (red_player_elos, blue_player_elos,
+                         red_elo_changes, blue_elo_changes)
+        if replayed_match.idempotent_response is not None:
+            refresh_idempotent_response(replayed_match, red_player_elos, blue_player_elos,
+                                        red_elo_changes, blue_elo_changes)
+
+    EloHistory.objects.bulk_create(elo_history)
+    PlayerElo.objects.bulk_update(
+        list(player_elos.values()), PLAYER_ELO_UPDATE_FIELDS)
+    Match.objects.bulk_update([matches[match_number] for match_number in replay], [
+        'time', 'red_score', 'blue_score', 'red_starting_elo', 'blue_starting_elo', 'idempotent_response'])
+
+    elo_change = sum(player_elo.elo for player_elo in player_elos.values()) - elo_before
+    return (*corrected, len(replay) - 1, elo_change)
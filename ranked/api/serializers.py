@@ -1,4 +1,6 @@
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import CharField, ModelSerializer
+from discordoauth2.models import User
+from SRCweb.serializers import ValuesSerializer
 from ranked.models import GameMode, Match, PlayerElo, EloHistory
 
 
@@ -11,7 +13,29 @@ class GameModeSerializer(ModelSerializer):
 class MatchSerializer(ModelSerializer):
     class Meta:
         model = Match
-        fields = '__all__'
+        exclude = ['idempotent_response']
+
+
+class RosterPlayerSerializer(ModelSerializer):
+    display_name = CharField(source='__str__')
+
+    class Meta:
+        model = User
+        fields = ['id', 'display_name']
+
+
+class MatchListSerializer(ModelSerializer):
+    """
+    A match with its alliances inlined. Prefetch both alliances when
+    serializing many, or each match costs two more queries.
+    """
+    red_alliance = RosterPlayerSerializer(many=True)
+    blue_alliance = RosterPlayerSerializer(many=True)
+
+    class Meta:
+        model = Match
+        fields = ['match_number', 'time', 'red_score', 'blue_score', 'red_starting_elo',
+                  'blue_starting_elo', 'red_alliance', 'blue_alliance']
 
 
 class PlayerEloSerializer(ModelSerializer):
@@ -24,3 +48,18 @@ class EloHistorySerializer(ModelSerializer):
     class Meta:
         model = EloHistory
         fields = '__all__'
+
+
+# Fast-path equivalents of the serializers above, built from `.values_list()`
+# rows. These must match the field order ModelSerializer produces for
+# `fields = '__all__'` (concrete fields first, then relations).
+
+class PlayerEloValuesSerializer(ValuesSerializer):
+    fields = ['id', 'elo', 'matches_played', 'matches_won', 'matches_lost',
+              'matches_drawn', 'last_match_played_time',
+              'last_match_played_number', 'total_score', 'player', 'game_mode']
+    datetime_fields = ('last_match_played_time',)
+
+
+class EloHistoryValuesSerializer(ValuesSerializer):
+    fields = ['id', 'match_number', 'elo', 'player_elo']
@@ -8,12 +8,24 @@ urlpatterns = [
     path('player/<str:player_id>/',
          views.get_player, name='get_player'),
     path('<str:game_mode_code>/', views.get_game_mode, name='get_game_mode'),
+    path('<str:game_mode_code>/distribution/',
+         views.get_distribution, name='get_distribution'),
+    path('<str:game_mode_code>/search/',
+         views.search_players, name='search_players'),
     path('<str:game_mode_code>/player/<str:player_id>/',
          views.get_player_stats, name='get_player_stats'),
     path('<str:game_mode_code>/player/<str:player_id>/history/',
          views.get_player_elo_history, name='get_player_elo_history'),
+    path('<str:game_mode_code>/player/<str:player_id>/pairs/',
+         views.get_player_pairs, name='get_player_pairs'),
     path('<str:game_mode_code>/match/',
          views.post_match_result, name='post_match_result'),
+    path('<str:game_mode_code>/matches/',
+         views.get_matches, name='get_matches'),
+    path('<str:game_mode_code>/matches/batch/',
+         views.post_match_results, name='post_match_results'),
     path('<str:game_mode_code>/match/edit/',
          views.edit_match_result, name='edit_match_result'),
+    path('<str:game_mode_code>/matchmake/',
+         views.matchmake, name='matchmake'),
 ]
@@ -1,14 +1,27 @@
-from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.decorators import api_view
 from SRCweb.settings import API_KEY
-from discordoauth2.models import User
-from .lib import revert_player_elos, update_player_elos, validate_patch_match_req_body, validate_post_match_req_body, get_match_player_info
-from ranked.api.serializers import EloHistorySerializer, GameModeSerializer, MatchSerializer, PlayerEloSerializer
-from ranked.models import EloHistory, GameMode, Match, PlayerElo
+from discordoauth2.models import User, normalize_search
+from .lib import PLAYER_ELO_UPDATE_FIELDS, apply_match_elos, correct_match_result, get_idempotent_response, resolve_players, update_player_elos, validate_idempotency_key, validate_patch_match_req_body, validate_post_match_req_body, get_match_player_info
+from ranked.api.serializers import EloHistoryValuesSerializer, GameModeSerializer, MatchListSerializer, MatchSerializer, PlayerEloSerializer, PlayerEloValuesSerializer
+from ranked.activity import get_game_modes_by_activity, record_matches, record_retimed_match
+from ranked.stats import get_game_mode_stats, played_elo_total, update_game_mode_stats
+from ranked.distribution import DEFAULT_BINS, MAX_BINS, get_elo_distribution
+from ranked.pairs import record_pair_results
+from ranked.ranking import get_ranking
+from ranked.matchmaking import balance_lobby, get_elos, group_queue
+from ranked.history import downsample, get_elo_history, get_packed_elo_history_entries
+from ranked.models import EloHistory, GameMode, Match, PlayerElo, PlayerPairStats
+
+# Most match results accepted by a single batch request
+MAX_BATCH_SIZE = 100
+MAX_MATCHMAKING_PLAYERS = 1000
+MAX_SEARCH_RESULTS = 10
+MATCHES_PAGE_SIZE = 50
 
 
 @api_view(['GET'])
@@ -18,12 +31,7 @@ def ranked_api(request: Request) -> Response:
     """
 
     # Sort the game modes by the number of matches played within the last week
-    game_modes = GameMode.objects.annotate(
-        match_count=Count(
-            'match',
-            filter=Q(match__time__gte=timezone.now() - timedelta(days=7))
-        )
-    ).order_by('-match_count')
+    game_modes = get_game_modes_by_activity()
 
     game_mode_serializer = GameModeSerializer(game_modes, many=True)
     return Response(game_mode_serializer.data)
@@ -34,6 +42,21 @@ def get_game_mode(request: Request, game_mode_code: str) -> Response:
     """
     Gets basic statistics for ranked matches played in a particular game mode.
     """
+    data = get_game_mode_stats(game_mode_code)
+    if data is None:
+        return Response(status=404, data={
+            'error': f'Game mode {game_mode_code} does not exist.'
+        })
+
+    return Response(data)
+
+
+@api_view(['GET'])
+def get_distribution(request: Request, game_mode_code: str) -> Response:
+    """
+    Gets a histogram and quantiles of player elos in a particular game mode.
+    Pass `?bins=N` for a different number of histogram bins.
+    """
     try:
         game_mode = GameMode.objects.get(short_code=game_mode_code)
     except GameMode.DoesNotExist:
@@ -41,15 +64,13 @@ def get_game_mode(request: Request, game_mode_code: str) -> Response:
             'error': f'Game mode {game_mode_code} does not exist.'
         })
 
-    serializer = GameModeSerializer(game_mode)
-    matches_played = Match.objects.filter(game_mode=game_mode).count()
-    players_count = PlayerElo.objects.filter(game_mode=game_mode).count()
+    bins = request.query_params.get('bins', str(DEFAULT_BINS))
+    if not bins.isdigit() or not 1 <= int(bins) <= MAX_BINS:
+        return Response(status=400, data={
+            'error': f'bins must be between 1 and {MAX_BINS}.'
+        })
 
-    return Response({
-        **serializer.data,
-        'matches_played': matches_played,
-        'players_count': players_count,
-    })
+    return Response(get_elo_distribution(game_mode, int(bins)))
 
 
 @api_view(['GET'])
@@ -78,26 +99,25 @@ def get_player_stats(request: Request, game_mode_code: str, player_id: str) -> R
     Gets statistics for a player in a particular game mode.
     """
     try:
-        game_mode = GameMode.objects.get(short_code=game_mode_code)
-    except GameMode.DoesNotExist:
-        return Response(status=404, data={
-            'error': f'Game mode {game_mode_code} does not exist.'
-        })
-
-    try:
-        player = User.objects.get(id=player_id)
-    except User.DoesNotExist:
-        return Response(status=404, data={
-            'error': f'Player {player_id} does not exist.'
-        })
-
-    try:
-        player_elo = PlayerElo.objects.get(player=player, game_mode=game_mode)
-    except PlayerElo.DoesNotExist:
+        player_elo = PlayerElo.objects.select_related('player', 'game_mode').get(
+            game_mode__short_code=game_mode_code, player_id=player_id)
+    except (PlayerElo.DoesNotExist, ValueError):
+        # Only work out what was missing when the lookup fails
+        if not GameMode.objects.filter(short_code=game_mode_code).exists():
+            return Response(status=404, data={
+                'error': f'Game mode {game_mode_code} does not exist.'
+            })
+        if not player_id.isdigit() or not User.objects.filter(id=player_id).exists():
+            return Response(status=404, data={
+                'error': f'Player {player_id} does not exist.'
+            })
         return Response(status=404, data={
             'error': f'Player {player_id} has no elo history for {game_mode_code}.'
         })
 
+    player = player_elo.player
+    game_mode = player_elo.game_mode
+
     game_mode_serializer = GameModeSerializer(game_mode)
     player_elo_serializer = PlayerEloSerializer(player_elo)
 
@@ -110,10 +130,52 @@ def get_player_stats(request: Request, game_mode_code: str, player_id: str) -> R
     })
 
 
+@api_view(['GET'])
+def search_players(request: Request, game_mode_code: str) -> Response:
+    """
+    Finds players in a game mode whose display name or username starts with
+    `?q=`, best ranked first.
+    """
+    try:
+        game_mode = GameMode.objects.get(short_code=game_mode_code)
+    except GameMode.DoesNotExist:
+        return Response(status=404, data={
+            'error': f'Game mode {game_mode_code} does not exist.'
+        })
+
+    query = normalize_search(request.query_params.get('q', '').strip())
+    if not query:
+        return Response(status=400, data={
+            'error': 'q must not be empty.'
+        })
+
+    # A prefix is the range [query, query + highest character), which the column indexes can serve
+    end = query + '\U0010ffff'
+    player_elos = PlayerElo.objects.filter(game_mode=game_mode).filter(
+        Q(player__search_display_name__gte=query, player__search_display_name__lt=end) |
+        Q(player__search_username__gte=query, player__search_username__lt=end)
+    ).select_related('player')
+
+    ranking = get_ranking(game_mode)
+    results = sorted(
+        (player_elo for player_elo in player_elos if player_elo.player_id in ranking),
+        key=lambda player_elo: ranking[player_elo.player_id]['rank'])[:MAX_SEARCH_RESULTS]
+
+    return Response([{
+        'id': player_elo.player_id,
+        'display_name': str(player_elo.player),
+        'username': player_elo.player.username,
+        'avatar': player_elo.player.avatar,
+        **ranking[player_elo.player_id],
+    } for player_elo in results])
+
+
 @api_view(['GET'])
 def get_player_elo_history(request: Request, game_mode_code: str, player_id: str) -> Response:
     """
     Gets the elo history and statistics for a player in a particular game mode.
+    Pass `?compact` for a columnar history, or `?max_points=N` to also
+    downsample it for charting.
     """
     try:
         game_mode = GameMode.objects.get(short_code=game_mode_code)
@@ -129,23 +191,131 @@ def get_player_elo_history(request: Request, game_mode_code: str, player_id: str
             'error': f'Player {player_id} does not exist.'
         })
 
-    player_elo = PlayerElo.objects.get(player=player, game_mode=game_mode)
+    player_elos = PlayerElo.objects.filter(player=player, game_mode=game_mode)
+
+    max_points = request.query_params.get('max_points')
+    if max_points is not None or 'compact' in request.query_params:
+        if max_points is not None and (not max_points.isdigit() or int(max_points) < 1):
+            return Response(status=400, data={
+                'error': 'max_points must be a positive integer.'
+            })
 
-    elo_history = EloHistory.objects.filter(player_elo=player_elo)
-    if not elo_history.exists():
+        return get_compact_elo_history(player, player_elos.first(), game_mode_code,
+                                       int(max_points) if max_points is not None else None)
+
+    player_elo = PlayerEloValuesSerializer.one(player_elos)
+    if player_elo is None:
         return Response(status=404, data={
             'error': f'Player {player_id} has no elo history for {game_mode_code}.'
         })
 
-    player_elo_serializer = PlayerEloSerializer(player_elo)
-    elo_history_serializer = EloHistorySerializer(elo_history, many=True)
+    elo_history = get_packed_elo_history_entries(player_elo['id'])
+    elo_history += EloHistoryValuesSerializer.many(
+        EloHistory.objects.filter(player_elo_id=player_elo['id']).order_by('match_number'))
+    if not elo_history:
+        return Response(status=404, data={
+            'error': f'Player {player_id} has no elo history for {game_mode_code}.'
+        })
 
     return Response({
         'display_name': str(player),
         'username': player.username,
         'avatar': player.avatar,
-        **player_elo_serializer.data,
-        'elo_history': elo_history_serializer.data,
+        **player_elo,
+        'elo_history': elo_history,
+    })
+
+
+def get_compact_elo_history(player: User, player_elo: PlayerElo, game_mode_code: str, max_points: int) -> Response:
+    """
+    Columnar form of the elo history, optionally downsampled to `max_points`.
+    """
+    match_numbers, elos = get_elo_history(player_elo) if player_elo else ([], [])
+    if not match_numbers:
+        return Response(status=404, data={
+            'error': f'Player {player.id} has no elo history for {game_mode_code}.'
+        })
+
+    if max_points is not None:
+        match_numbers, elos = downsample(match_numbers, elos, max_points)
+
+    return Response({
+        'display_name': str(player),
+        'username': player.username,
+        'avatar': player.avatar,
+        **PlayerEloSerializer(player_elo).data,
+        'elo_history': {
+            'match_numbers': match_numbers,
+            'elo': elos,
+        },
+    })
+
+
+@api_view(['GET'])
+def get_player_pairs(request: Request, game_mode_code: str, player_id: str) -> Response:
+    """
+    Gets how a player has done with and against everyone they have played
+    with in a particular game mode, most played first.
+    """
+    try:
+        player_elo = PlayerElo.objects.select_related('game_mode').get(
+            game_mode__short_code=game_mode_code, player_id=player_id)
+    except (PlayerElo.DoesNotExist, ValueError):
+        return Response(status=404, data={
+            'error': f'Player {player_id} has no matches in {game_mode_code}.'
+        })
+
+    pairs = PlayerPairStats.objects.filter(
+        game_mode=player_elo.game_mode, player_id=player_elo.player_id).select_related('other')
+
+    data = [{
+        'player': pair.other_id,
+        'display_name': str(pair.other),
+        'with': {
+            'wins': pair.wins_with,
+            'losses': pair.losses_with,
+            'draws': pair.draws_with,
+        },
+        'against': {
+            'wins': pair.wins_against,
+            'losses': pair.losses_against,
+            'draws': pair.draws_against,
+        },
+    } for pair in pairs]
+    data.sort(key=lambda pair: -sum(pair['with'].values()) - sum(pair['against'].values()))
+
+    return Response(data)
+
+
+@api_view(['GET'])
+def get_matches(request: Request, game_mode_code: str) -> Response:
+    """
+    Gets the matches of a game mode, newest first, a page at a time. Pass the
+    returned `next_before` as `?before=` to get the next page.
+    """
+    try:
+        game_mode = GameMode.objects.get(short_code=game_mode_code)
+    except GameMode.DoesNotExist:
+        return Response(status=404, data={
+            'error': f'Game mode {game_mode_code} does not exist.'
+        })
+
+    matches = Match.objects.filter(game_mode=game_mode)
+    before = request.query_params.get('before')
+    if before is not None:
+        if not before.isdigit():
+            return Response(status=400, data={
+                'error': 'before must be a match number.'
+            })
+        matches = matches.filter(match_number__lt=before)
+
+    # Keyset pagination: match numbers only go up, so a page never shifts as matches are added
+    matches = list(matches.order_by('-match_number').prefetch_related(
+        'red_alliance', 'blue_alliance')[:MATCHES_PAGE_SIZE])
+
+    return Response({
+        'matches': MatchListSerializer(matches, many=True).data,
+        'next_before': matches[-1].match_number if len(matches) == MATCHES_PAGE_SIZE else None,
     })
 
 
@@ -160,6 +330,9 @@ def post_match_result(request: Request, game_mode_code: str) -> Response:
         "red_score": 3,
         "blue_score": 1
     }
+    An optional idempotency key, sent as the `Idempotency-Key` header or an
+    "idempotency_key" field, makes retries return the original response
+    instead of recording the match again.
     """
     if request.META.get('HTTP_X_API_KEY') != API_KEY:
         return Response(status=401, data={
@@ -176,6 +349,17 @@ def post_match_result(request: Request, game_mode_code: str) -> Response:
     players_per_alliance = game_mode.players_per_alliance
 
     body = request.data
+    idempotency_key = request.META.get('HTTP_IDEMPOTENCY_KEY') or \
+        (body.get('idempotency_key') if isinstance(body, dict) else None)
+    res = validate_idempotency_key(idempotency_key)
+    if res:
+        return res
+
+    if idempotency_key is not None:
+        replayed = get_idempotent_response(game_mode, idempotency_key)
+        if replayed is not None:
+            return Response(replayed)
+
     res = validate_post_match_req_body(body, players_per_alliance)
     if res:
         return res
@@ -193,46 +377,233 @@ def post_match_result(request: Request, game_mode_code: str) -> Response:
     red_starting_elo = sum([elo.elo for elo in red_player_elos])
     blue_starting_elo = sum([elo.elo for elo in blue_player_elos])
 
-    match = Match(
-        game_mode=game_mode,
-        red_score=red_score,
-        blue_score=blue_score,
-        red_starting_elo=red_starting_elo,
-        blue_starting_elo=blue_starting_elo,
-    )
-    match.save()
-    match.red_alliance.set(red_players)
-    match.blue_alliance.set(blue_players)
-    match.save()
-
-    red_elo_changes, blue_elo_changes = update_player_elos(
-        match, red_player_elos, blue_player_elos)
+    try:
+        with transaction.atomic():
+            match = Match(
+                game_mode=game_mode,
+                red_score=red_score,
+                blue_score=blue_score,
+                red_starting_elo=red_starting_elo,
+                blue_starting_elo=blue_starting_elo,
+                idempotency_key=idempotency_key,
+            )
+            match.save()
+            match.red_alliance.set(red_players)
+            match.blue_alliance.set(blue_players)
+
+            played_before, elo_before = played_elo_total(red_player_elos + blue_player_elos)
+            red_elo_changes, blue_elo_changes = update_player_elos(
+                match, red_player_elos, blue_player_elos)
+            played_after, elo_after = played_elo_total(red_player_elos + blue_player_elos)
+            record_matches(game_mode, time=match.time)
+            update_game_mode_stats(game_mode, 1, match.time, played_after - played_before, elo_after - elo_before)
+
+            match_serializer = MatchSerializer(match)
+            red_player_elos_serializer = PlayerEloSerializer(
+                red_player_elos, many=True)
+            blue_player_elos_serializer = PlayerEloSerializer(
+                blue_player_elos, many=True)
+            red_display_names = [str(player) for player in red_players]
+            blue_display_names = [str(player) for player in blue_players]
+
+            data = {
+                'match': match_serializer.data,
+                'red_player_elos': red_player_elos_serializer.data,
+                'blue_player_elos': blue_player_elos_serializer.data,
+                'red_display_names': red_display_names,
+                'blue_display_names': blue_display_names,
+                'red_elo_changes': red_elo_changes,
+                'blue_elo_changes': blue_elo_changes,
+            }
+
+            if idempotency_key is not None:
+                match.idempotent_response = data
+                match.save(update_fields=['idempotent_response'])
+    except IntegrityError:
+        # Only a concurrent retry with the same key getting there first is expected
+        if idempotency_key is None or not Match.objects.filter(
+                game_mode=game_mode, idempotency_key=idempotency_key).exists():
+            raise
+        replayed = get_idempotent_response(game_mode, idempotency_key)
+        if replayed is None:
+            return Response(status=409, data={
+                'error': 'Another request is recording a match with this idempotency key. Retry the request.'
+            })
+        return Response(replayed)
+
+    return Response(data)
 
-    match_serializer = MatchSerializer(match)
-    red_player_elos_serializer = PlayerEloSerializer(
-        red_player_elos, many=True)
-    blue_player_elos_serializer = PlayerEloSerializer(
-        blue_player_elos, many=True)
-    red_display_names = [str(player) for player in red_players]
-    blue_display_names = [str(player) for player in blue_players]
 
-    return Response({
-        'match': match_serializer.data,
-        'red_player_elos': red_player_elos_serializer.data,
-        'blue_player_elos': blue_player_elos_serializer.data,
-        'red_display_names': red_display_names,
-        'blue_display_names': blue_display_names,
-        'red_elo_changes': red_elo_changes,
-        'blue_elo_changes': blue_elo_changes,
-    })
+@api_view(['POST'])
+def post_match_results(request: Request, game_mode_code: str) -> Response:
+    """
+    Post several match results at once. Results are applied in order and
+    committed together, so either every match is recorded or none are.
+    JSON body should be:
+    {
+        "matches": [
+            {
+                "red_alliance": [1111111111111111, 2222222222222222, 3333333333333333],
+                "blue_alliance": [4444444444444444, 5555555555555555, 6666666666666666],
+                "red_score": 3,
+                "blue_score": 1,
+                "idempotency_key": "optional, as for a single match"
+            },
+            ...
+        ]
+    }
+    """
+    if request.META.get('HTTP_X_API_KEY') != API_KEY:
+        return Response(status=401, data={
+            'error': 'Invalid API key.'
+        })
+
+    try:
+        game_mode = GameMode.objects.get(short_code=game_mode_code)
+    except GameMode.DoesNotExist:
+        return Response(status=404, data={
+            'error': f'Game mode {game_mode_code} does not exist.'
+        })
+
+    body = request.data
+    results = body.get('matches') if isinstance(body, dict) else None
+    if not isinstance(results, list) or not results:
+        return Response(status=400, data={
+            'error': 'matches must be a non-empty array.'
+        })
+
+    if len(results) > MAX_BATCH_SIZE:
+        return Response(status=400, data={
+            'error': f'Cannot post more than {MAX_BATCH_SIZE} matches at once.'
+        })
+
+    for index, result in enumerate(results):
+        res = validate_post_match_req_body(
+            result if isinstance(result, dict) else None, game_mode.players_per_alliance) or \
+            validate_idempotency_key(result.get('idempotency_key'))
+        if res:
+            res.data['index'] = index
+            return res
+
+    idempotency_keys = [result['idempotency_key']
+                        for result in results if result.get('idempotency_key') is not None]
+    if len(set(idempotency_keys)) != len(idempotency_keys):
+        return Response(status=400, data={
+            'error': 'Idempotency keys must be unique within a batch.'
+        })
+
+    # Results already recorded under their idempotency key are replayed, not applied again
+    replayed = dict(Match.objects.filter(game_mode=game_mode, idempotency_key__in=idempotency_keys).values_list(
+        'idempotency_key', 'idempotent_response'))
+    new_results = [result for result in results
+                   if result.get('idempotency_key') not in replayed]
+    if not new_results:
+        return Response({'matches': [replayed[result['idempotency_key']] for result in results]})
+
+    res, players, player_elos = resolve_players(
+        [player_id for result in new_results for player_id in result['red_alliance'] + result['blue_alliance']], game_mode)
+    if res:
+        return res
+
+    now = timezone.now()
+    match_results = {}
+    elo_history = []
+    pair_results = []
+    red_memberships = []
+    blue_memberships = []
+
+    played_before, elo_before = played_elo_total(player_elos)
+
+    try:
+        with transaction.atomic():
+            offset = 0
+            for result in new_results:
+                red_count = len(result['red_alliance'])
+                blue_count = len(result['blue_alliance'])
+                red_players = players[offset:offset + red_count]
+                blue_players = players[offset + red_count:offset + red_count + blue_count]
+                red_player_elos = player_elos[offset:offset + red_count]
+                blue_player_elos = player_elos[offset + red_count:offset + red_count + blue_count]
+                offset += red_count + blue_count
+
+                match = Match(
+                    game_mode=game_mode,
+                    red_score=result['red_score'],
+                    blue_score=result['blue_score'],
+                    red_starting_elo=sum([elo.elo for elo in red_player_elos]),
+                    blue_starting_elo=sum([elo.elo for elo in blue_player_elos]),
+                    idempotency_key=result.get('idempotency_key'),
+                )
+                match.save()
+
+                red_memberships += [Match.red_alliance.through(
+                    match_id=match.match_number, user_id=player.id) for player in red_players]
+                blue_memberships += [Match.blue_alliance.through(
+                    match_id=match.match_number, user_id=player.id) for player in blue_players]
+
+                red_elo_changes, blue_elo_changes, match_elo_history = apply_match_elos(
+                    match, red_player_elos, blue_player_elos, now)
+                elo_history += match_elo_history
+                pair_results.append(([player.id for player in red_players], [player.id for player in blue_players],
+                                     match.red_score, match.blue_score, 1))
+
+                # Player elos are serialized now, as later matches keep changing them
+                match_results[match.match_number] = {
+                    'match': None,
+                    'red_player_elos': PlayerEloSerializer(red_player_elos, many=True).data,
+                    'blue_player_elos': PlayerEloSerializer(blue_player_elos, many=True).data,
+                    'red_display_names': [str(player) for player in red_players],
+                    'blue_display_names': [str(player) for player in blue_players],
+                    'red_elo_changes': red_elo_changes,
+                    'blue_elo_changes': blue_elo_changes,
+                }
+
+            EloHistory.objects.bulk_create(elo_history)
+            Match.red_alliance.through.objects.bulk_create(red_memberships)
+            Match.blue_alliance.through.objects.bulk_create(blue_memberships)
+            PlayerElo.objects.bulk_update(
+                list({player_elo.id: player_elo for player_elo in player_elos}.values()), PLAYER_ELO_UPDATE_FIELDS)
+            record_pair_results(game_mode.id, pair_results)
+            played_after, elo_after = played_elo_total(player_elos)
+            record_matches(game_mode, len(new_results), now)
+            update_game_mode_stats(game_mode, len(new_results), match.time, played_after - played_before,
+                                   elo_after - elo_before)
+
+            matches = Match.objects.prefetch_related('red_alliance', 'blue_alliance').in_bulk(
+                list(match_results))
+            for match_number, match_result in match_results.items():
+                match = matches[match_number]
+                match_result['match'] = MatchSerializer(match).data
+                if match.idempotency_key is not None:
+                    match.idempotent_response = match_result
+
+            Match.objects.bulk_update(
+                [match for match in matches.values() if match.idempotency_key is not None], ['idempotent_response'])
+    except IntegrityError:
+        # Only a concurrent request recording one of the same keys is expected
+        new_keys = [result['idempotency_key'] for result in new_results if result.get('idempotency_key') is not None]
+        if not Match.objects.filter(game_mode=game_mode, idempotency_key__in=new_keys).exists():
+            raise
+        return Response(status=409, data={
+            'error': 'Another request is recording a match with one of these idempotency keys. Retry the batch.'
+        })
+
+    # Answer in the order the results were given
+    new_match_results = iter(match_results.values())
+    match_results = [replayed[result['idempotency_key']] if result.get('idempotency_key') in replayed
+                     else next(new_match_results) for result in results]
+
+    return Response({'matches': match_results})
 
 
 @api_view(['PATCH'])
 def edit_match_result(request: Request, game_mode_code: str) -> Response:
     """
-    Edit a match result. Can only edit the most recent match's score.
+    Edit a match result. Edits the most recent match unless a match number is
+    given; every later match that depends on it is recomputed.
     JSON body should be:
     {
+        "match_number": 1234, (optional)
         "red_score": 3,
         "blue_score": 1
     }
@@ -254,47 +625,46 @@ def edit_match_result(request: Request, game_mode_code: str) -> Response:
             'error': f'Game mode {game_mode_code} does not exist.'
         })
 
-    match = Match.objects.filter(
+    latest_match = Match.objects.filter(
         game_mode=game_mode).order_by('-match_number').first()
-    if not match:
+    if not latest_match:
         return Response(status=404, data={
             'error': f'No matches found for {game_mode_code}.'
         })
 
-    red_players = match.red_alliance.all()
-    blue_players = match.blue_alliance.all()
-    red_player_elos = PlayerElo.objects.filter(
-        player__in=red_players, game_mode=game_mode)
-    blue_player_elos = PlayerElo.objects.filter(
-        player__in=blue_players, game_mode=game_mode)
-
-    red_elo_history = EloHistory.objects.filter(
-        match_number=match.match_number, player_elo__in=red_player_elos)
-    blue_elo_history = EloHistory.objects.filter(
-        match_number=match.match_number, player_elo__in=blue_player_elos)
-
-    revert_player_elos(match, red_elo_history, blue_elo_history)
-
-    match.red_score = body['red_score']
-    match.blue_score = body['blue_score']
-    match.time = timezone.now()
-    match.save()
-
-    red_player_elos = PlayerElo.objects.filter(
-        player__in=red_players, game_mode=game_mode)
-    blue_player_elos = PlayerElo.objects.filter(
-        player__in=blue_players, game_mode=game_mode)
-
-    red_elo_changes, blue_elo_changes = update_player_elos(
-        match, list(red_player_elos), list(blue_player_elos))
+    match = latest_match
+    if body.get('match_number') is not None:
+        match = Match.objects.filter(
+            game_mode=game_mode, match_number=body['match_number']).first()
+        if not match:
+            return Response(status=404, data={
+                'error': f'Match {body["match_number"]} not found for {game_mode_code}.'
+            })
+
+    played_time = match.time
+    if match.match_number == latest_match.match_number:
+        match.time = timezone.now()
+
+    with transaction.atomic():
+        red_player_elos, blue_player_elos, red_elo_changes, blue_elo_changes, replayed_matches, elo_change = \
+            correct_match_result(match, body['red_score'], body['blue_score'])
+        record_retimed_match(game_mode, played_time, match.time)
+        update_game_mode_stats(
+            game_mode, last_match_time=match.time if match.match_number == latest_match.match_number else None,
+            elo_change=elo_change)
+
+    players = User.objects.in_bulk(
+        [player_elo.player_id for player_elo in red_player_elos + blue_player_elos])
 
     match_serializer = MatchSerializer(match)
     red_player_elos_serializer = PlayerEloSerializer(
         red_player_elos, many=True)
     blue_player_elos_serializer = PlayerEloSerializer(
         blue_player_elos, many=True)
-    red_display_names = [str(player) for player in red_players]
-    blue_display_names = [str(player) for player in blue_players]
+    red_display_names = [str(players[player_elo.player_id])
+                         for player_elo in red_player_elos]
+    blue_display_names = [str(players[player_elo.player_id])
+                          for player_elo in blue_player_elos]
 
     return Response({
         'match': match_serializer.data,
@@ -304,4 +674,100 @@ def edit_match_result(request: Request, game_mode_code: str) -> Response:
         'blue_display_names': blue_display_names,
         'red_elo_changes': red_elo_changes,
         'blue_elo_changes': blue_elo_changes,
+        'replayed_matches': replayed_matches,
+    })
+
+
+@api_view(['POST'])
+def matchmake(request: Request, game_mode_code: str) -> Response:
+    """
+    Propose balanced alliances. Either send a queue, which is grouped into
+    lobbies of similarly rated players, or send the lobbies themselves.
+    JSON body should be one of:
+    {
+        "queue": [1111111111111111, 2222222222222222, ...]
+    }
+    {
+        "lobbies": [
+            [1111111111111111, 2222222222222222, ...],
+            ...
+        ]
+    }
+    """
+    if request.META.get('HTTP_X_API_KEY') != API_KEY:
+        return Response(status=401, data={
+            'error': 'Invalid API key.'
+        })
+
+    try:
+        game_mode = GameMode.objects.get(short_code=game_mode_code)
+    except GameMode.DoesNotExist:
+        return Response(status=404, data={
+            'error': f'Game mode {game_mode_code} does not exist.'
+        })
+
+    body = request.data if isinstance(request.data, dict) else {}
+    lobby_size = game_mode.players_per_alliance * 2
+    queue = body.get('queue')
+    lobbies = body.get('lobbies')
+
+    if queue is not None:
+        if not isinstance(queue, list):
+            return Response(status=400, data={
+                'error': 'queue must be an array of player ids.'
+            })
+        player_ids = queue
+    elif lobbies is not None:
+        if not isinstance(lobbies, list) or not all(isinstance(lobby, list) for lobby in lobbies):
+            return Response(status=400, data={
+                'error': 'lobbies must be an array of arrays of player ids.'
+            })
+        for index, lobby in enumerate(lobbies):
+            if len(lobby) != lobby_size:
+                return Response(status=400, data={
+                    'error': f'Each lobby must have {lobby_size} players.',
+                    'index': index
+                })
+        player_ids = [player_id for lobby in lobbies for player_id in lobby]
+    else:
+        return Response(status=400, data={
+            'error': 'Missing required fields in request body.'
+        })
+
+    if len(player_ids) > MAX_MATCHMAKING_PLAYERS:
+        return Response(status=400, data={
+            'error': f'Cannot matchmake more than {MAX_MATCHMAKING_PLAYERS} players at once.'
+        })
+
+    try:
+        player_ids = [int(player_id) for player_id in player_ids]
+    except (TypeError, ValueError):
+        return Response(status=400, data={
+            'error': 'Player ids must be integers.'
+        })
+
+    if len(set(player_ids)) != len(player_ids):
+        return Response(status=400, data={
+            'error': 'A player cannot be listed more than once.'
+        })
+
+    # Players new to the game mode are fine, as posting a match would add them
+    users = set(User.objects.filter(id__in=player_ids).values_list('id', flat=True))
+    for player_id in player_ids:
+        if player_id not in users:
+            return Response(status=404, data={
+                'error': f'Player {player_id} does not exist.'
+            })
+
+    elos = get_elos(player_ids, game_mode)
+
+    unmatched = []
+    if queue is not None:
+        lobbies, unmatched = group_queue(player_ids, elos, lobby_size)
+    else:
+        lobbies = [player_ids[i:i + lobby_size] for i in range(0, len(player_ids), lobby_size)]
+
+    return Response({
+        'lobbies': [balance_lobby(lobby, elos) for lobby in lobbies],
+        'unmatched': unmatched,
     })
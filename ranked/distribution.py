@@ -0,0 +1,62 @@
+import numpy as np
+from django.core.cache import cache
+from .mmr import mmr_for
+from .models import GameMode, PlayerElo
+from .stats import STATS_CACHE_TIMEOUT, get_version
+from .tiers import TIERS, tier_boundaries
+
+DEFAULT_BINS = 20
+MAX_BINS = 100
+# Quantiles of raw elo; tier boundaries are on the MMR scale and given separately
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+def get_elo_distribution(game_mode: GameMode, bins: int = DEFAULT_BINS) -> dict:
+    """
+    Gets a histogram and quantiles of every rated player's elo in a game mode,
+    and the lowest MMR that reaches each tier, as the leaderboard assigns them.
+    Reads the players in one query and is cached until the next match.
+    """
+    cache_key = f'ranked_elo_distribution_{game_mode.short_code}_{bins}_{get_version(game_mode.short_code)}'
+    distribution = cache.get(cache_key)
+    if distribution is not None:
+        return distribution
+
+    players = list(PlayerElo.objects.filter(game_mode=game_mode).only(
+        'elo', 'matches_played', 'last_match_played_time'))
+    elos = np.fromiter((player.elo for player in players), dtype=np.float64, count=len(players))
+    boundaries = tier_boundaries(mmr_for(players)) or []
+
+    if elos.size:
+        counts, edges = np.histogram(elos, bins=bins)
+        quantiles = np.quantile(elos, QUANTILES)
+        distribution = {
+            'players_count': int(elos.size),
+            'mean': float(elos.mean()),
+            'min': float(elos.min()),
+            'max': float(elos.max()),
+            'histogram': {
+                'counts': counts.tolist(),
+                'edges': edges.tolist(),
+            },
+            'quantiles': {f'{q:g}': value for q, value in zip(QUANTILES, quantiles.tolist())},
+            # The last tier has no lower bound
+            'tiers': [{'tier': tier, 'color': color, 'min_mmr': boundary}
+                      for (tier, color), boundary in zip(TIERS, boundaries + [None])] if boundaries else [],
+        }
+    else:
+        distribution = {
+            'players_count': 0,
+            'mean': None,
+            'min': None,
+            'max': None,
+            'histogram': {
+                'counts': [],
+                'edges': [],
+            },
+            'quantiles': {},
+            'tiers': [],
+        }
+
+    cache.set(cache_key, distribution, STATS_CACHE_TIMEOUT)
+    return distribution
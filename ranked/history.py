@@ -0,0 +1,247 @@
+from array import array
+from bisect import bisect_left
+from functools import reduce
+from itertools import groupby
+from operator import or_
+import sys
+from typing import Dict, Iterable, List, Tuple
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from .models import EloHistory, EloHistoryChunk, PlayerElo
+
+# Entries per packed chunk; reading a long history touches length / CHUNK_SIZE rows
+CHUNK_SIZE = 512
+
+
+def _pack(typecode: str, values: Iterable) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    unpacked = array(typecode)
+    unpacked.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked
+
+
+def get_packed_elo_history(player_elo: PlayerElo) -> Tuple[List[int], List[float]]:
+    """
+    Returns only the part of a player's elo history that lives in packed chunks.
+    """
+    match_numbers = array('i')
+    elos = array('d')
+    for chunk_match_numbers, chunk_elos in EloHistoryChunk.objects.filter(
+            player_elo=player_elo).order_by('first_match_number').values_list('match_numbers', 'elos'):
+        match_numbers.extend(_unpack('i', chunk_match_numbers))
+        elos.extend(_unpack('d', chunk_elos))
+
+    return match_numbers.tolist(), elos.tolist()
+
+
+def get_packed_elo_history_entries(player_elo_id: int) -> List[dict]:
+    """
+    Returns the packed part of a player's elo history as entries shaped like
+    serialized EloHistory rows, with the ids the rows had before packing.
+    Chunks packed without ids give None.
+    """
+    entries = []
+    for chunk_ids, chunk_match_numbers, chunk_elos in EloHistoryChunk.objects.filter(
+            player_elo_id=player_elo_id).order_by('first_match_number').values_list('ids', 'match_numbers', 'elos'):
+        ids = _unpack('q', chunk_ids)
+        for index, (match_number, elo) in enumerate(zip(_unpack('i', chunk_match_numbers), _unpack('d', chunk_elos))):
+            entries.append({'id': ids[index] if index < len(ids) else None, 'match_number': match_number,
+                            'elo': elo, 'player_elo': player_elo_id})
+    return entries
+
+
+def get_elo_history(player_elo: PlayerElo) -> Tuple[List[int], List[float]]:
+    """
+    Returns a player's elo history as parallel (match_numbers, elos) lists,
+    ordered by match number. Packed chunks always precede the remaining rows.
+    """
+    match_numbers, elos = get_packed_elo_history(player_elo)
+
+    rows = EloHistory.objects.filter(player_elo=player_elo).order_by(
+        'match_number').values_list('match_number', 'elo')
+    for match_number, elo in rows:
+        match_numbers.append(match_number)
+        elos.append(elo)
+
+    return match_numbers, elos
+
+
+def pack_elo_history(rows: QuerySet) -> int:
+    """
+    Moves the given EloHistory rows into packed chunks, appending to each
+    player's last chunk until it is full. Rows must be newer than anything
+    already packed for their player. Returns the number of rows packed.
+    """
+    packed = 0
+    rows = rows.order_by('player_elo', 'match_number').values_list(
+        'id', 'player_elo', 'match_number', 'elo')
+
+    for player_elo_id, entries in groupby(rows.iterator(), key=lambda row: row[1]):
+        entries = list(entries)
+        with transaction.atomic():
+            _append_to_chunks(player_elo_id, entries)
+            EloHistory.objects.filter(id__in=[entry[0] for entry in entries]).delete()
+        packed += len(entries)
+
+    return packed
+
+
+def _append_to_chunks(player_elo_id: int, entries: List[tuple]):
+    chunk = EloHistoryChunk.objects.filter(
+        player_elo_id=player_elo_id).order_by('-first_match_number').first()
+    if chunk is not None and chunk.length >= CHUNK_SIZE:
+        chunk = None
+
+    ids = _unpack('q', chunk.ids) if chunk else array('q')
+    match_numbers = _unpack('i', chunk.match_numbers) if chunk else array('i')
+    elos = _unpack('d', chunk.elos) if chunk else array('d')
+
+    for entry_id, _, match_number, elo in entries:
+        if chunk is None:
+            chunk = EloHistoryChunk(player_elo_id=player_elo_id)
+            ids = array('q')
+            match_numbers = array('i')
+            elos = array('d')
+
+        ids.append(entry_id)
+        match_numbers.append(match_number)
+        elos.append(elo)
+
+        if len(match_numbers) >= CHUNK_SIZE:
+            _save_chunk(chunk, ids, match_numbers, elos)
+            chunk = None
+
+    if chunk is not None:
+        _save_chunk(chunk, ids, match_numbers, elos)
+
+
+def _save_chunk(chunk: EloHistoryChunk, ids: array, match_numbers: array, elos: array):
+    chunk.first_match_number = match_numbers[0]
+    chunk.last_match_number = match_numbers[-1]
+    chunk.length = len(match_numbers)
+    chunk.ids = _pack('q', ids)
+    chunk.match_numbers = _pack('i', match_numbers)
+    chunk.elos = _pack('d', elos)
+    chunk.save()
+
+
+def downsample(xs: List[int], ys: List[float], max_points: int) -> Tuple[List[int], List[float]]:
+    """
+    Reduces a series to at most `max_points` points using largest-triangle-
+    three-buckets, which keeps the peaks and dips that matter on a chart.
+    The first and last points are always kept.
+    """
+    length = len(xs)
+    if max_points >= length:
+        return list(xs), list(ys)
+    if max_points < 3:
+        return [xs[0], xs[-1]][:max_points], [ys[0], ys[-1]][:max_points]
+
+    sampled_xs = [xs[0]]
+    sampled_ys = [ys[0]]
+
+    # Every point except the first and last falls into one of these buckets
+    bucket_size = (length - 2) / (max_points - 2)
+    selected = 0
+
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket is the third corner of the triangle
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        next_count = next_end - end
+        avg_x = sum(xs[end:next_end]) / next_count
+        avg_y = sum(ys[end:next_end]) / next_count
+
+        selected_x = xs[selected]
+        selected_y = ys[selected]
+
+        best_area = -1
+        best = start
+        for i in range(start, end):
+            area = abs((selected_x - avg_x) * (ys[i] - selected_y) -
+                       (selected_x - xs[i]) * (avg_y - selected_y))
+            if area > best_area:
+                best_area = area
+                best = i
+
+        sampled_xs.append(xs[best])
+        sampled_ys.append(ys[best])
+        selected = best
+
+    sampled_xs.append(xs[-1])
+    sampled_ys.append(ys[-1])
+    return sampled_xs, sampled_ys
+
+
+def get_elos_at(match_numbers: Dict[int, int]) -> Dict[int, float]:
+    """
+    Takes a {player_elo_id: match_number} mapping and returns each player's
+    recorded elo going into that match, looking in packed chunks for entries
+    that are no longer rows.
+    """
+    elos = {}
+    rows = EloHistory.objects.filter(
+        player_elo_id__in=match_numbers, match_number__in=set(match_numbers.values())).values_list(
+        'player_elo_id', 'match_number', 'elo')
+    for player_elo_id, match_number, elo in rows:
+        if match_numbers[player_elo_id] == match_number:
+            elos[player_elo_id] = elo
+
+    for player_elo_id, match_number in match_numbers.items():
+        if player_elo_id in elos:
+            continue
+
+        chunk = EloHistoryChunk.objects.filter(
+            player_elo_id=player_elo_id, first_match_number__lte=match_number,
+            last_match_number__gte=match_number).first()
+        if chunk is None:
+            continue
+
+        chunk_match_numbers = _unpack('i', chunk.match_numbers)
+        index = bisect_left(chunk_match_numbers, match_number)
+        if index < len(chunk_match_numbers) and chunk_match_numbers[index] == match_number:
+            elos[player_elo_id] = _unpack('d', chunk.elos)[index]
+
+    return elos
+
+
+def truncate_elo_history(match_numbers: Dict[int, int]):
+    """
+    Takes a {player_elo_id: match_number} mapping and deletes each player's
+    history from that match onward, rows and packed entries alike.
+    """
+    by_match_number = {}
+    for player_elo_id, match_number in match_numbers.items():
+        by_match_number.setdefault(match_number, []).append(player_elo_id)
+
+    conditions = [Q(player_elo_id__in=player_elo_ids, match_number__gte=match_number)
+                  for match_number, player_elo_ids in by_match_number.items()]
+    # Keep each statement well under SQLite's expression depth limit
+    for start in range(0, len(conditions), 100):
+        EloHistory.objects.filter(reduce(or_, conditions[start:start + 100])).delete()
+
+    chunks = EloHistoryChunk.objects.filter(
+        player_elo_id__in=match_numbers, last_match_number__gte=min(match_numbers.values(), default=0))
+    for chunk in chunks:
+        match_number = match_numbers[chunk.player_elo_id]
+        if chunk.last_match_number < match_number:
+            continue
+
+        if chunk.first_match_number >= match_number:
+            chunk.delete()
+            continue
+
+        chunk_match_numbers = _unpack('i', chunk.match_numbers)
+        length = bisect_left(chunk_match_numbers, match_number)
+        _save_chunk(chunk, _unpack('q', chunk.ids)[:length], chunk_match_numbers[:length],
+                    _unpack('d', chunk.elos)[:length])
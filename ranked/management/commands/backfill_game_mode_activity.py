@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from ranked.models import GameModeActivity, Match
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily GameModeActivity counters from the Match table.'
+
+    def handle(self, *args, **options):
+        counts = Match.objects.annotate(date=TruncDate('time')).values(
+            'game_mode', 'date').annotate(match_count=Count('match_number')).order_by()
+
+        with transaction.atomic():
+            GameModeActivity.objects.all().delete()
+            GameModeActivity.objects.bulk_create([
+                GameModeActivity(game_mode_id=count['game_mode'], date=count['date'],
+                                 match_count=count['match_count'])
+                for count in counts
+            ], batch_size=1000)
+
+        self.stdout.write(
+            f'Recorded activity for {GameModeActivity.objects.count()} game mode days')
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ranked.models import GameMode, Match, PlayerPairStats
+from ranked.pairs import PAIR_STATS_FIELDS, pair_deltas
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds PlayerPairStats from the match history, reading matches in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game-mode', dest='game_mode',
+                            help='Only rebuild this game mode (by short code).')
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000,
+                            help='Matches read per batch.')
+
+    def handle(self, *args, **options):
+        game_modes = GameMode.objects.all()
+        if options['game_mode']:
+            game_modes = game_modes.filter(short_code=options['game_mode'])
+
+        for game_mode in game_modes:
+            totals = {}
+            last_match_number = 0
+            while True:
+                matches = list(Match.objects.filter(
+                    game_mode=game_mode, match_number__gt=last_match_number).order_by(
+                    'match_number').values_list('match_number', 'red_score', 'blue_score')[:options['batch_size']])
+                if not matches:
+                    break
+                last_match_number = matches[-1][0]
+
+                rosters = {match_number: ([], []) for match_number, _, _ in matches}
+                for through, alliance in ((Match.red_alliance.through, 0), (Match.blue_alliance.through, 1)):
+                    for match_number, user_id in through.objects.filter(match_id__in=rosters).values_list(
+                            'match_id', 'user_id'):
+                        rosters[match_number][alliance].append(user_id)
+
+                deltas = pair_deltas((*rosters[match_number], red_score, blue_score, 1)
+                                     for match_number, red_score, blue_score in matches)
+                for pair, delta in deltas.items():
+                    total = totals.setdefault(pair, dict.fromkeys(PAIR_STATS_FIELDS, 0))
+                    for field, change in delta.items():
+                        total[field] += change
+
+            with transaction.atomic():
+                PlayerPairStats.objects.filter(game_mode=game_mode).delete()
+                PlayerPairStats.objects.bulk_create([
+                    PlayerPairStats(game_mode=game_mode, player_id=player_id, other_id=other_id, **total)
+                    for (player_id, other_id), total in totals.items()
+                ], batch_size=1000)
+
+            self.stdout.write(f'{game_mode.short_code}: {len(totals)} player pairs')
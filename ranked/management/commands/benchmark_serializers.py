@@ -0,0 +1,78 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from discordoauth2.models import User
+from highscores.api.serializers import ScoreWithLeaderboardSerializer, ScoreWithLeaderboardValuesSerializer
+from highscores.models import Leaderboard, Score
+from ranked.api.serializers import EloHistorySerializer, EloHistoryValuesSerializer
+from ranked.models import EloHistory, GameMode, PlayerElo
+
+
+class Command(BaseCommand):
+    help = 'Compares the DRF serializers against the values-based fast path. ' \
+        'Runs inside a transaction that is always rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            elo_history, scores = self.create_rows(options['rows'])
+
+            self.compare('EloHistory', options['repeat'],
+                         lambda: EloHistorySerializer(elo_history, many=True).data,
+                         lambda: EloHistoryValuesSerializer.many(elo_history))
+            self.compare('Score + Leaderboard', options['repeat'],
+                         lambda: ScoreWithLeaderboardSerializer(
+                             scores.select_related('leaderboard'), many=True).data,
+                         lambda: ScoreWithLeaderboardValuesSerializer.many(scores))
+
+            transaction.set_rollback(True)
+
+    def create_rows(self, rows: int):
+        user = User.objects.create(
+            id=1, username='benchmark', discriminator='0000',
+            avatar='https://cdn.discordapp.com/avatars/1/benchmark.webp',
+            public_flags=0, flags=0, locale='en-US', mfa_enabled=False,
+            email='benchmark@secondrobotics.org', verified=True)
+
+        game_mode = GameMode.objects.create(
+            name='Benchmark', game='Benchmark', players_per_alliance=1,
+            short_code='bench')
+        player_elo = PlayerElo.objects.create(player=user, game_mode=game_mode)
+        EloHistory.objects.bulk_create(
+            EloHistory(player_elo=player_elo, match_number=i, elo=1200 + i / 7)
+            for i in range(rows))
+
+        leaderboard = Leaderboard.objects.create(
+            name='Benchmark', robot='Benchmark', game='Benchmark', game_slug='BM')
+        Score.objects.bulk_create(
+            Score(leaderboard=leaderboard, player=user, score=i, approved=True,
+                  source='https://secondrobotics.org/', clean_code='benchmark')
+            for i in range(rows))
+
+        return EloHistory.objects.filter(player_elo=player_elo).order_by('match_number'), \
+            Score.objects.filter(player=user).order_by('-score')
+
+    def compare(self, name: str, repeat: int, slow, fast):
+        renderer = JSONRenderer()
+        slow_time, slow_json = self.time(repeat, lambda: renderer.render(slow()))
+        fast_time, fast_json = self.time(repeat, lambda: renderer.render(fast()))
+
+        if slow_json != fast_json:
+            self.stderr.write(f'{name}: fast path output differs!')
+
+        self.stdout.write(
+            f'{name}: serializer {slow_time * 1000:.1f}ms, '
+            f'values {fast_time * 1000:.1f}ms ({slow_time / fast_time:.1f}x)')
+
+    def time(self, repeat: int, func):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            result = func()
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from ranked.history import pack_elo_history
+from ranked.models import EloHistory, GameMode
+
+
+class Command(BaseCommand):
+    help = 'Moves EloHistory rows into packed per-player chunks. Rows for the ' \
+        'latest match of each game mode are left alone so it can still be edited.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game-mode', dest='game_mode',
+                            help='Only pack this game mode (by short code).')
+
+    def handle(self, *args, **options):
+        game_modes = GameMode.objects.annotate(latest_match=Max('match__match_number'))
+        if options['game_mode']:
+            game_modes = game_modes.filter(short_code=options['game_mode'])
+
+        for game_mode in game_modes:
+            if game_mode.latest_match is None:
+                continue
+
+            packed = pack_elo_history(EloHistory.objects.filter(
+                player_elo__game_mode=game_mode, match_number__lt=game_mode.latest_match))
+            self.stdout.write(f'{game_mode.short_code}: packed {packed} rows')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from ranked.models import GameMode
+from ranked.stats import refresh_game_mode_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every GameModeStats row from the matches and player elos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game-mode', dest='game_mode',
+                            help='Only refresh this game mode (by short code).')
+
+    def handle(self, *args, **options):
+        game_modes = GameMode.objects.all()
+        if options['game_mode']:
+            game_modes = game_modes.filter(short_code=options['game_mode'])
+
+        for game_mode in game_modes:
+            stats = refresh_game_mode_stats(game_mode)
+            self.stdout.write(f'{game_mode.short_code}: {stats.matches_played} matches, {stats.players_count} players')
@@ -0,0 +1,104 @@
+from itertools import combinations
+from typing import Dict, List, Tuple
+from .api.lib import win_probability
+from .models import GameMode, PlayerElo
+
+# Lobbies up to this size are split by trying every possible alliance
+EXHAUSTIVE_MAX_PLAYERS = 12
+
+
+def get_elos(player_ids: List[int], game_mode: GameMode) -> Dict[int, float]:
+    """
+    Reads the elo of every given player in one query. Players who have not
+    played the game mode yet get the starting elo.
+    """
+    default_elo = PlayerElo._meta.get_field('elo').get_default()
+    elos = dict(PlayerElo.objects.filter(
+        game_mode=game_mode, player_id__in=player_ids).values_list('player_id', 'elo'))
+    return {player_id: elos.get(player_id, default_elo) for player_id in player_ids}
+
+
+def _exhaustive_split(elos: List[float]) -> Tuple[int, ...]:
+    # Player 0 always goes red, so each split is only tried once
+    half = len(elos) // 2
+    half_total = sum(elos) / 2
+    best, best_diff = None, None
+    for others in combinations(range(1, len(elos)), half - 1):
+        diff = abs(elos[0] + sum(elos[i] for i in others) - half_total)
+        if best_diff is None or diff < best_diff:
+            best, best_diff = others, diff
+    return (0,) + best
+
+
+def _heuristic_split(elos: List[float]) -> Tuple[int, ...]:
+    half = len(elos) // 2
+    red, blue = [], []
+    red_total = blue_total = 0
+    # Greedy: strongest players first, each to the weaker alliance with room left
+    for i in sorted(range(len(elos)), key=lambda i: -elos[i]):
+        if len(blue) == half or (len(red) < half and red_total <= blue_total):
+            red.append(i)
+            red_total += elos[i]
+        else:
+            blue.append(i)
+            blue_total += elos[i]
+
+    # Then keep making the best single swap until none helps
+    while True:
+        diff = red_total - blue_total
+        best, best_diff = None, abs(diff)
+        for r in range(half):
+            for b in range(half):
+                swap = elos[red[r]] - elos[blue[b]]
+                new_diff = abs(diff - 2 * swap)
+                if new_diff < best_diff:
+                    best, best_diff = (r, b, swap), new_diff
+        if best is None:
+            return tuple(red)
+        r, b, swap = best
+        red[r], blue[b] = blue[b], red[r]
+        red_total -= swap
+        blue_total += swap
+
+
+def balance_lobby(player_ids: List[int], elos: Dict[int, float]) -> dict:
+    """
+    Splits a lobby into the two alliances with the closest win odds. Alliance
+    elo is the sum of its players' elos, as when a match is posted, so the
+    closest odds come from the closest elo totals.
+    """
+    lobby_elos = [elos[player_id] for player_id in player_ids]
+    if len(player_ids) <= EXHAUSTIVE_MAX_PLAYERS:
+        red = _exhaustive_split(lobby_elos)
+    else:
+        red = _heuristic_split(lobby_elos)
+
+    red = set(red)
+    red_alliance = [player_id for i, player_id in enumerate(player_ids) if i in red]
+    blue_alliance = [player_id for i, player_id in enumerate(player_ids) if i not in red]
+    red_elo = sum(elos[player_id] for player_id in red_alliance)
+    blue_elo = sum(elos[player_id] for player_id in blue_alliance)
+
+    return {
+        'red_alliance': red_alliance,
+        'blue_alliance': blue_alliance,
+        'red_elo': red_elo,
+        'blue_elo': blue_elo,
+        'red_odds': win_probability(red_elo, blue_elo),
+        'blue_odds': win_probability(blue_elo, red_elo),
+    }
+
+
+def group_queue(player_ids: List[int], elos: Dict[int, float], lobby_size: int) -> Tuple[List[List[int]], List[int]]:
+    """
+    Groups a queue into lobbies of players with similar elo. Returns the lobbies
+    and the players left over when the queue does not divide evenly; the ones
+    left over are those who have waited the shortest.
+    """
+    lobby_count = len(player_ids) // lobby_size
+    queued = player_ids[:lobby_count * lobby_size]
+    unmatched = player_ids[lobby_count * lobby_size:]
+
+    queued = sorted(queued, key=lambda player_id: -elos[player_id])
+    lobbies = [queued[i:i + lobby_size] for i in range(0, len(queued), lobby_size)]
+    return lobbies, unmatched
@@ -0,0 +1,57 @@
+import math
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from django.utils import timezone
+from .models import PlayerElo
+
+# Beyond this many matches the experience factor is 1 to within float precision
+MATCHES_PLAYED_TABLE_SIZE = 128
+MATCHES_PLAYED_FACTORS = [1 + math.exp(-0.33 * matches_played)
+                          for matches_played in range(MATCHES_PLAYED_TABLE_SIZE)]
+
+
+def matches_played_factor(matches_played: int) -> float:
+    if matches_played < MATCHES_PLAYED_TABLE_SIZE:
+        return MATCHES_PLAYED_FACTORS[max(matches_played, 0)]
+    return 1 + math.exp(-0.33 * matches_played)
+
+
+@lru_cache(maxsize=None)
+def _decay_at_hour(hour: int) -> float:
+    return 1 + math.exp(1 / 168 * pow(hour, 0.63))
+
+
+def decay_factor(hours: Optional[float]) -> float:
+    """
+    Gets the inactivity factor after this many hours. The curve is cached per
+    whole hour and interpolated in between, except within the first hour where
+    it is too steep to interpolate.
+    """
+    if hours is None or hours <= 0:
+        return _decay_at_hour(0)
+    if hours < 1:
+        return 1 + math.exp(1 / 168 * pow(hours, 0.63))
+
+    hour = int(hours)
+    start = _decay_at_hour(hour)
+    return start + (_decay_at_hour(hour + 1) - start) * (hours - hour)
+
+
+def mmr(elo: float, matches_played: int, hours: Optional[float]) -> float:
+    """
+    Gets a player's MMR: their elo, discounted while they have played few
+    matches and as time passes since their last one.
+    """
+    return elo * 2 / (decay_factor(hours) * matches_played_factor(matches_played))
+
+
+def mmr_for(players: Iterable[PlayerElo], now: Optional[datetime] = None) -> List[float]:
+    """
+    Gets the MMR of every given player, in the same order.
+    """
+    now = now or timezone.now()
+    return [mmr(player.elo, player.matches_played,
+                (now - player.last_match_played_time).total_seconds() / 3600
+                if player.last_match_played_time else None)
+            for player in players]
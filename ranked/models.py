@@ -31,6 +31,19 @@ class Match(models.Model):
     red_starting_elo = models.FloatField()
     blue_starting_elo = models.FloatField()
 
+    # Client-supplied key so a retried post returns the original response
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    idempotent_response = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['game_mode', 'idempotency_key'], name='unique_match_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['game_mode', 'time']),
+        ]
+
     def get_red_players(self):
         return self.red_alliance.all()
 
@@ -71,5 +84,97 @@ class EloHistory(models.Model):
     match_number = models.IntegerField()
     elo = models.FloatField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['player_elo', 'match_number']),
+        ]
+
     def __str__(self):
         return f"{self.player_elo.player} - {self.match_number}"
+
+
+class EloHistoryChunk(models.Model):
+    """
+    Packed, append-only elo history for a player. Each chunk holds a run of
+    consecutive entries as little-endian int32 match numbers and float64 elos,
+    so a player's whole history can be read back from a handful of rows. The
+    int64 ids of the EloHistory rows they were packed from are kept too.
+    """
+    player_elo = models.ForeignKey(PlayerElo, on_delete=models.CASCADE)
+    first_match_number = models.IntegerField()
+    last_match_number = models.IntegerField()
+    length = models.IntegerField()
+
+    ids = models.BinaryField(default=b'')
+    match_numbers = models.BinaryField()
+    elos = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['player_elo', 'first_match_number']),
+        ]
+
+    def __str__(self):
+        return f"{self.player_elo.player} - {self.first_match_number} to {self.last_match_number}"
+
+
+class GameModeActivity(models.Model):
+    """
+    Number of matches played in a game mode on one day, kept up to date as
+    matches are posted so recent activity never has to be counted from Match.
+    """
+    game_mode = models.ForeignKey(GameMode, on_delete=models.CASCADE)
+    date = models.DateField()
+    match_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['game_mode', 'date'], name='unique_game_mode_activity_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_mode} - {self.date} - {self.match_count}"
+
+
+class GameModeStats(models.Model):
+    """
+    Running totals for a game mode, refreshed whenever a match is posted or
+    edited so the stats endpoint never has to count matches or players.
+    """
+    game_mode = models.OneToOneField(
+        GameMode, on_delete=models.CASCADE, related_name='stats')
+    matches_played = models.IntegerField(default=0)
+    players_count = models.IntegerField(default=0)
+    average_elo = models.FloatField(null=True, blank=True)
+    last_match_time = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.game_mode} - {self.matches_played} matches"
+
+
+class PlayerPairStats(models.Model):
+    """
+    How a player has done with and against another player in a game mode.
+    Every pair is stored both ways round, so a player's rows hold all of
+    their teammates and opponents.
+    """
+    game_mode = models.ForeignKey(GameMode, on_delete=models.CASCADE)
+    player = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    wins_with = models.IntegerField(default=0)
+    losses_with = models.IntegerField(default=0)
+    draws_with = models.IntegerField(default=0)
+    wins_against = models.IntegerField(default=0)
+    losses_against = models.IntegerField(default=0)
+    draws_against = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['game_mode', 'player', 'other'], name='unique_player_pair_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.game_mode} - {self.player} and {self.other}"
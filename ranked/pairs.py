@@ -0,0 +1,78 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import PlayerPairStats
+
+PAIR_STATS_FIELDS = ['wins_with', 'losses_with', 'draws_with',
+                     'wins_against', 'losses_against', 'draws_against']
+
+# (red player ids, blue player ids, red score, blue score, +1 to add the result or -1 to remove it)
+PairResult = Tuple[List[int], List[int], int, int, int]
+
+
+def pair_deltas(results: Iterable[PairResult]) -> Dict[Tuple[int, int], Dict[str, int]]:
+    """
+    Works out how each pair's stats change from a run of match results, keyed
+    by (player id, other player id).
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for red_ids, blue_ids, red_score, blue_score, sign in results:
+        for team, opponents, score, opponent_score in ((red_ids, blue_ids, red_score, blue_score),
+                                                       (blue_ids, red_ids, blue_score, red_score)):
+            if score > opponent_score:
+                outcome = 'wins'
+            elif score < opponent_score:
+                outcome = 'losses'
+            else:
+                outcome = 'draws'
+
+            for player_id in team:
+                for other_id in team:
+                    if other_id != player_id:
+                        deltas[player_id, other_id][f'{outcome}_with'] += sign
+                for other_id in opponents:
+                    if other_id != player_id:
+                        deltas[player_id, other_id][f'{outcome}_against'] += sign
+    return deltas
+
+
+def record_pair_results(game_mode_id: int, results: Iterable[PairResult]):
+    """
+    Applies match results to the pair stats. Existing rows are incremented in
+    the database, so concurrent results for the same pair are never lost, with
+    one update per distinct change rather than per pair.
+    """
+    deltas = pair_deltas(results)
+    if deltas:
+        _apply_deltas(game_mode_id, deltas)
+
+
+def _apply_deltas(game_mode_id: int, deltas: Dict[Tuple[int, int], Dict[str, int]]):
+    player_ids = {player_id for player_id, _ in deltas}
+    existing = {(player_id, other_id): stats_id for stats_id, player_id, other_id in PlayerPairStats.objects.filter(
+        game_mode_id=game_mode_id, player_id__in=player_ids, other_id__in=player_ids).values_list(
+        'id', 'player_id', 'other_id')}
+
+    increments = defaultdict(list)
+    for pair, stats_id in existing.items():
+        if pair in deltas:
+            change = tuple(sorted((field, value) for field, value in deltas[pair].items() if value))
+            if change:
+                increments[change].append(stats_id)
+    for change, stats_ids in increments.items():
+        PlayerPairStats.objects.filter(id__in=stats_ids).update(
+            **{field: F(field) + value for field, value in change})
+
+    missing = {pair: delta for pair, delta in deltas.items() if pair not in existing}
+    if not missing:
+        return
+
+    try:
+        with transaction.atomic():
+            PlayerPairStats.objects.bulk_create([
+                PlayerPairStats(game_mode_id=game_mode_id, player_id=player_id, other_id=other_id, **delta)
+                for (player_id, other_id), delta in missing.items()])
+    except IntegrityError:
+        # Another request created some of these pairs first
+        _apply_deltas(game_mode_id, missing)
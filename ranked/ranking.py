@@ -0,0 +1,35 @@
+from typing import Dict
+from django.core.cache import cache
+from .mmr import mmr_for
+from .models import GameMode, PlayerElo
+from .stats import get_version
+from .tiers import assign_tiers
+
+# MMR decays with time as well as with new matches, so cached ranks expire. This
+# is also how long another process can miss a match, as the version is per process
+RANKING_CACHE_TIMEOUT = 300
+
+
+def get_ranking(game_mode: GameMode) -> Dict[int, dict]:
+    """
+    Gets every player's leaderboard position, MMR and tier in a game mode,
+    keyed by player id. Cached until a match changes the board.
+    """
+    cache_key = f'ranked_ranking_{game_mode.short_code}_{get_version(game_mode.short_code)}'
+    ranking = cache.get(cache_key)
+    if ranking is not None:
+        return ranking
+
+    players = list(PlayerElo.objects.filter(game_mode=game_mode).only(
+        'player_id', 'elo', 'matches_played', 'last_match_played_time'))
+    mmrs = sorted(zip(mmr_for(players), (player.player_id for player in players)), reverse=True)
+    tiers = assign_tiers([mmr for mmr, _ in mmrs])
+
+    ranking = {player_id: {
+        'rank': rank,
+        'mmr': round(mmr, 1),
+        'tier': tier,
+        'tier_color': color,
+    } for rank, ((mmr, player_id), (tier, color)) in enumerate(zip(mmrs, tiers), start=1)}
+    cache.set(cache_key, ranking, RANKING_CACHE_TIMEOUT)
+    return ranking
@@ -0,0 +1,121 @@
+import time
+from typing import Iterable, Tuple
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Value
+from django.db.models.functions import Coalesce
+from rest_framework.fields import DateTimeField
+from .api.serializers import GameModeSerializer
+from .models import GameMode, GameModeStats, Match, PlayerElo
+
+# Stats are invalidated by bumping the game mode's version. The default cache
+# is per process, so only the process that posted the match sees the bump; this
+# bounds how stale the stats and distribution can be in the others
+STATS_CACHE_TIMEOUT = 60
+
+
+def _version_key(game_mode_code: str) -> str:
+    return f'ranked_game_mode_stats_version_{game_mode_code}'
+
+
+def get_version(game_mode_code: str) -> int:
+    version = cache.get(_version_key(game_mode_code))
+    if version is None:
+        # Start from the clock so a lost version never reuses an old key
+        cache.add(_version_key(game_mode_code), time.time_ns(), None)
+        version = cache.get(_version_key(game_mode_code))
+    return version
+
+
+def _bump_version(game_mode_code: str):
+    # Wait for the surrounding transaction, or readers could cache the old stats again
+    transaction.on_commit(lambda: _incr_version(game_mode_code))
+
+
+def _incr_version(game_mode_code: str):
+    try:
+        cache.incr(_version_key(game_mode_code))
+    except ValueError:
+        cache.set(_version_key(game_mode_code), time.time_ns(), None)
+
+
+def refresh_game_mode_stats(game_mode: GameMode) -> GameModeStats:
+    """
+    Recomputes a game mode's stats from scratch. Only players who have played
+    a match are counted.
+    """
+    matches = Match.objects.filter(game_mode=game_mode).aggregate(
+        matches_played=Count('match_number'), last_match_time=Max('time'))
+    player_elos = PlayerElo.objects.filter(game_mode=game_mode, matches_played__gt=0).aggregate(
+        players_count=Count('id'), average_elo=Avg('elo'))
+
+    stats, _ = GameModeStats.objects.update_or_create(
+        game_mode=game_mode, defaults={**matches, **player_elos})
+    _bump_version(game_mode.short_code)
+    return stats
+
+
+def played_elo_total(player_elos: Iterable[PlayerElo]) -> Tuple[int, float]:
+    """
+    Returns how many of the given players have played a match and the sum of
+    their elos. Taken before and after a change, the differences are what
+    update_game_mode_stats needs. Players listed twice are counted once.
+    """
+    played = [player_elo for player_elo in {player_elo.id: player_elo for player_elo in player_elos}.values()
+              if player_elo.matches_played > 0]
+    return len(played), sum(player_elo.elo for player_elo in played)
+
+
+def update_game_mode_stats(game_mode: GameMode, new_matches: int = 0, last_match_time=None,
+                           new_players: int = 0, elo_change: float = 0.0):
+    """
+    Updates a game mode's stats after matches are posted or edited, from what
+    changed rather than by recounting: the number of new matches, the number
+    of players who played their first match and the change in the sum of all
+    counted players' elos.
+    """
+    changes = {'matches_played': F('matches_played') + new_matches}
+    if last_match_time is not None:
+        changes['last_match_time'] = last_match_time
+    if new_players or elo_change:
+        elo_sum = Coalesce(F('average_elo'), Value(0.0)) * F('players_count')
+        changes['players_count'] = F('players_count') + new_players
+        changes['average_elo'] = ExpressionWrapper(
+            (elo_sum + Value(elo_change)) / (F('players_count') + new_players), output_field=FloatField())
+
+    if not GameModeStats.objects.filter(game_mode=game_mode).update(**changes):
+        refresh_game_mode_stats(game_mode)
+        return
+
+    _bump_version(game_mode.short_code)
+
+
+def get_game_mode_stats(game_mode_code: str):
+    """
+    Gets a game mode and its stats as served by the API, from the cache when
+    they haven't changed. Returns None if the game mode does not exist.
+    """
+    cache_key = f'ranked_game_mode_stats_{game_mode_code}_{get_version(game_mode_code)}'
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
+
+    game_mode = GameMode.objects.select_related('stats').filter(
+        short_code=game_mode_code).first()
+    if game_mode is None:
+        return None
+
+    try:
+        stats = game_mode.stats
+    except GameModeStats.DoesNotExist:
+        stats = refresh_game_mode_stats(game_mode)
+
+    data = {
+        **GameModeSerializer(game_mode).data,
+        'matches_played': stats.matches_played,
+        'players_count': stats.players_count,
+        'average_elo': stats.average_elo,
+        'last_match_time': DateTimeField().to_representation(stats.last_match_time),
+    }
+    cache.set(cache_key, data, STATS_CACHE_TIMEOUT)
+    return data
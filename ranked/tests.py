@@ -1,3 +1,503 @@
+import math
+from datetime import timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 
-# Create your tests here.
+from discordoauth2.models import User
+from SRCweb.settings import API_KEY
+from .api.serializers import EloHistorySerializer, EloHistoryValuesSerializer, PlayerEloSerializer, \
+    PlayerEloValuesSerializer
+from .activity import ACTIVITY_DAYS, get_game_modes_by_activity, record_matches, record_retimed_match
+from .distribution import MAX_BINS, get_elo_distribution
+from .history import get_elo_history, pack_elo_history
+from .matchmaking import balance_lobby
+from .mmr import mmr, mmr_for
+from .pairs import PAIR_STATS_FIELDS, pair_deltas, record_pair_results
+from .stats import refresh_game_mode_stats
+from .models import EloHistory, EloHistoryChunk, GameMode, GameModeActivity, GameModeStats, Match, PlayerElo, PlayerPairStats
+from .tiers import QUANTILE, LINEAR, TIERS, UNRANKED_TIER, assign_tiers, tier_for_mmr
+
+
+def create_user(user_id: int, username: str) -> User:
+    return User.objects.create(
+        id=user_id, username=username, discriminator='0000',
+        avatar=f'https://cdn.discordapp.com/avatars/{user_id}/{username}.webp',
+        public_flags=0, flags=0, locale='en-US', mfa_enabled=False,
+        email=f'{username}@secondrobotics.org', verified=True)
+
+
+class ValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=1, short_code='test')
+        PlayerElo.objects.create(player=create_user(1, 'played'), game_mode=game_mode,
+                                 last_match_played_time=timezone.now(), last_match_played_number=2)
+        PlayerElo.objects.create(player=create_user(2, 'unplayed'), game_mode=game_mode)
+        for match_number, elo in ((1, 1200), (2, 1216.5)):
+            EloHistory.objects.create(
+                player_elo=PlayerElo.objects.first(), match_number=match_number, elo=elo)
+
+    def test_player_elo_matches_serializer(self):
+        player_elos = PlayerElo.objects.order_by('id')
+        self.assertEqual(
+            JSONRenderer().render(PlayerEloValuesSerializer.many(player_elos)),
+            JSONRenderer().render(PlayerEloSerializer(player_elos, many=True).data))
+
+    def test_elo_history_matches_serializer(self):
+        elo_history = EloHistory.objects.order_by('match_number')
+        self.assertEqual(
+            JSONRenderer().render(EloHistoryValuesSerializer.many(elo_history)),
+            JSONRenderer().render(EloHistorySerializer(elo_history, many=True).data))
+
+    def test_packed_history_keeps_ids(self):
+        url = reverse('ranked-api:get_player_elo_history', args=['test', '1'])
+        before = self.client.get(url).json()
+        pack_elo_history(EloHistory.objects.all())
+
+        self.assertFalse(EloHistory.objects.exists())
+        self.assertEqual(self.client.get(url).json(), before)
+
+
+class MatchmakingTestCase(TestCase):
+    def test_lobby_split_evens_alliance_elo(self):
+        elos = {1: 1500, 2: 1400, 3: 1300, 4: 1100, 5: 1000, 6: 900}
+        lobby = balance_lobby(list(elos), elos)
+
+        self.assertEqual(len(lobby['red_alliance']), 3)
+        self.assertEqual(lobby['red_elo'], lobby['blue_elo'])
+        self.assertEqual(lobby['red_odds'], 0.5)
+
+
+class MatchmakeApiTestCase(TestCase):
+    def setUp(self):
+        self.game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=2, short_code='test')
+        for user_id, elo in ((1, 1500), (2, 1400), (3, 1100), (4, 1000)):
+            PlayerElo.objects.create(player=create_user(user_id, f'player{user_id}'), game_mode=self.game_mode,
+                                     elo=elo, matches_played=1)
+        create_user(5, 'newcomer')
+
+    def matchmake(self, body):
+        return self.client.post(reverse('ranked-api:matchmake', args=['test']), body,
+                                content_type='application/json', HTTP_X_API_KEY=API_KEY)
+
+    def test_lobbies_are_balanced(self):
+        response = self.matchmake({'lobbies': [[1, 2, 3, 4]]})
+
+        self.assertEqual(response.status_code, 200)
+        lobby = response.json()['lobbies'][0]
+        self.assertEqual(sorted(lobby['red_alliance'] + lobby['blue_alliance']), [1, 2, 3, 4])
+        self.assertEqual(lobby['red_elo'], lobby['blue_elo'])
+
+    def test_queue_leaves_remainder_unmatched(self):
+        response = self.matchmake({'queue': [1, 2, 3, 4, 5]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['lobbies']), 1)
+        self.assertEqual(len(response.json()['unmatched']), 1)
+
+    def test_invalid_requests(self):
+        for body, status in (({}, 400),
+                             ({'queue': 1}, 400),
+                             ({'lobbies': [[1, 2, 3]]}, 400),
+                             ({'queue': [1, 'x']}, 400),
+                             ({'queue': [1, 1, 2, 3]}, 400),
+                             ({'queue': [1, 2, 3, 99]}, 404)):
+            with self.subTest(body=body):
+                self.assertEqual(self.matchmake(body).status_code, status)
+
+        self.assertEqual(self.client.post(reverse('ranked-api:matchmake', args=['test']), {'queue': [1]},
+                                          content_type='application/json').status_code, 401)
+        self.assertEqual(self.client.post(reverse('ranked-api:matchmake', args=['missing']), {'queue': [1]},
+                                          content_type='application/json', HTTP_X_API_KEY=API_KEY).status_code,
+                         404)
+
+
+class SearchPlayersTestCase(TestCase):
+    def setUp(self):
+        game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=1, short_code='test')
+        for user_id, username, elo in ((1, 'alpha', 1100), (2, 'alphabet', 1300), (3, 'beta', 1200)):
+            PlayerElo.objects.create(player=create_user(user_id, username), game_mode=game_mode,
+                                     elo=elo, matches_played=5, last_match_played_time=timezone.now())
+
+    def search(self, query, game_mode_code='test'):
+        return self.client.get(reverse('ranked-api:search_players', args=[game_mode_code]), {'q': query})
+
+    def test_prefix_matches_best_ranked_first(self):
+        response = self.search('ALPH')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([player['id'] for player in response.json()], [2, 1])
+        self.assertEqual(response.json()[0]['rank'], 1)
+
+    def test_no_matches(self):
+        self.assertEqual(self.search('gamma').json(), [])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.search('  ').status_code, 400)
+        self.assertEqual(self.search('alpha', 'missing').status_code, 404)
+
+
+class TierTestCase(TestCase):
+    def test_empty_board(self):
+        self.assertEqual(assign_tiers([], LINEAR), [])
+        self.assertEqual(assign_tiers([], QUANTILE), [])
+
+    def test_equal_mmrs_are_unranked(self):
+        self.assertEqual(assign_tiers([1000, 1000], QUANTILE), [UNRANKED_TIER] * 2)
+
+    def test_ties_share_a_tier(self):
+        for mode in (LINEAR, QUANTILE):
+            tiers = assign_tiers([1500, 1200, 1200, 900], mode)
+            self.assertEqual(tiers[1], tiers[2])
+            self.assertEqual(tiers[0][0], 'Challenger')
+            self.assertEqual(tiers[3][0], 'Stone')
+
+    def test_quantile_ignores_outliers(self):
+        mmrs = [5000] + [1000 - i for i in range(9)]
+        self.assertEqual(assign_tiers(mmrs, LINEAR)[1][0], 'Stone')
+        self.assertEqual(assign_tiers(mmrs, QUANTILE)[1][0], 'Grandmaster')
+
+
+class MmrTestCase(TestCase):
+    @staticmethod
+    def formula(elo, matches_played, hours):
+        return elo * 2 / ((1 + pow(math.e, 1/168 * pow(hours, 0.63))) * (1 + pow(math.e, -0.33 * matches_played)))
+
+    def test_matches_formula(self):
+        for matches_played in (0, 1, 5, 40, 500):
+            for hours in (0, 0.01, 0.5, 1, 7.25, 168, 1000.5, 20000.9):
+                self.assertAlmostEqual(mmr(1234.5, matches_played, hours),
+                                       self.formula(1234.5, matches_played, hours), delta=0.05)
+
+    def test_batch_matches_single(self):
+        now = timezone.now()
+        players = [PlayerElo(elo=1000 + i, matches_played=i, last_match_played_time=now - timedelta(hours=i * 3.5))
+                   for i in range(10)]
+        self.assertEqual(mmr_for(players, now),
+                         [mmr(player.elo, player.matches_played, i * 3.5) for i, player in enumerate(players)])
+
+
+class MatchListTestCase(TestCase):
+    def setUp(self):
+        game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=2, short_code='test')
+        players = [create_user(user_id, f'player{user_id}') for user_id in range(1, 5)]
+        for _ in range(60):
+            match = Match.objects.create(game_mode=game_mode, red_score=1, blue_score=0,
+                                         red_starting_elo=2400, blue_starting_elo=2400)
+            match.red_alliance.set(players[:2])
+            match.blue_alliance.set(players[2:])
+
+    def test_constant_queries_per_page(self):
+        url = reverse('ranked-api:get_matches', args=['test'])
+        with self.assertNumQueries(4):
+            first_page = self.client.get(url).json()
+        with self.assertNumQueries(4):
+            second_page = self.client.get(url, {'before': first_page['next_before']}).json()
+
+        self.assertEqual(len(first_page['matches']), 50)
+        self.assertEqual(len(second_page['matches']), 10)
+        self.assertIsNone(second_page['next_before'])
+        self.assertEqual(first_page['matches'][0]['red_alliance'],
+                         [{'id': 1, 'display_name': 'player1'}, {'id': 2, 'display_name': 'player2'}])
+
+
+class IdempotentPostTestCase(TestCase):
+    def setUp(self):
+        GameMode.objects.create(name='Test Mode', game='Test', players_per_alliance=1, short_code='test')
+        for user_id in range(1, 5):
+            create_user(user_id, f'player{user_id}')
+
+    @staticmethod
+    def result(red_id, blue_id, key=None):
+        result = {'red_alliance': [red_id], 'blue_alliance': [blue_id], 'red_score': 3, 'blue_score': 1}
+        if key is not None:
+            result['idempotency_key'] = key
+        return result
+
+    def post(self, name, body):
+        return self.client.post(reverse(f'ranked-api:{name}', args=['test']), body,
+                                content_type='application/json', HTTP_X_API_KEY=API_KEY)
+
+    def test_single_replay(self):
+        first = self.post('post_match_result', self.result(1, 2, 'a'))
+        retry = self.post('post_match_result', self.result(1, 2, 'a'))
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_batch_mixes_replayed_and_new(self):
+        first = self.post('post_match_result', self.result(1, 2, 'a')).json()
+        response = self.post('post_match_results', {'matches': [
+            self.result(3, 4, 'b'), self.result(1, 2, 'a'), self.result(2, 3)]})
+
+        self.assertEqual(response.status_code, 200)
+        matches = response.json()['matches']
+        self.assertEqual(matches[1], first)
+        self.assertEqual([match['red_display_names'] for match in matches], [['player3'], ['player1'], ['player2']])
+        self.assertEqual(Match.objects.count(), 3)
+
+        retry = self.post('post_match_results', {'matches': [self.result(3, 4, 'b'), self.result(1, 2, 'a')]})
+        self.assertEqual(retry.json()['matches'], matches[:2])
+        self.assertEqual(Match.objects.count(), 3)
+
+    def test_replay_after_correction(self):
+        self.post('post_match_result', self.result(1, 2, 'a'))
+        self.post('post_match_results', {'matches': [self.result(2, 1, 'b'), self.result(3, 4, 'c')]})
+        corrected = self.client.patch(reverse('ranked-api:edit_match_result', args=['test']), {
+            'match_number': Match.objects.get(idempotency_key='a').match_number, 'red_score': 0, 'blue_score': 2,
+        }, content_type='application/json', HTTP_X_API_KEY=API_KEY).json()
+        self.assertEqual(corrected['replayed_matches'], 1)
+
+        # The stored response keeps the players as they were right after the match
+        retry = self.post('post_match_result', self.result(1, 2, 'a')).json()
+        self.assertEqual((retry['match']['red_score'], retry['match']['blue_score']), (0, 2))
+        self.assertEqual(retry['red_elo_changes'], corrected['red_elo_changes'])
+        self.assertEqual(retry['blue_elo_changes'], corrected['blue_elo_changes'])
+        self.assertEqual(retry['red_player_elos'][0]['matches_lost'], 1)
+        self.assertEqual(retry['red_player_elos'][0]['elo'],
+                         retry['match']['red_starting_elo'] + retry['red_elo_changes'][0])
+
+        # The later match between the same players was replayed too
+        replayed = self.post('post_match_result', self.result(2, 1, 'b')).json()
+        self.assertEqual(replayed['red_player_elos'], PlayerEloSerializer(
+            PlayerElo.objects.filter(player_id=2), many=True).data)
+        self.assertEqual(replayed['match']['red_starting_elo'], retry['blue_player_elos'][0]['elo'])
+        self.assertEqual(Match.objects.count(), 3)
+
+
+class CorrectMatchResultTestCase(TestCase):
+    """
+    Correcting an older match must leave everything as if the corrected
+    score had been posted in the first place.
+    """
+    MATCH_COUNT = 30
+    CORRECTED = 10
+
+    def setUp(self):
+        self.corrected = GameMode.objects.create(
+            name='Corrected', game='Test', players_per_alliance=2, short_code='corrected')
+        self.replayed = GameMode.objects.create(
+            name='Replayed', game='Test', players_per_alliance=2, short_code='replayed')
+        for user_id in range(1, 11):
+            create_user(user_id, f'player{user_id}')
+
+    def result(self, index):
+        if index % 5 == 4:
+            # Players 7-10 only ever play each other, so correcting never touches them
+            return [7, 8], [9, 10], index % 3, 1
+        return [index % 6 + 1, (index + 1) % 6 + 1], [(index + 2) % 6 + 1, (index + 4) % 6 + 1], index % 4, index * 3 % 5
+
+    def post_all(self, game_mode, corrected_score=None):
+        for index in range(self.MATCH_COUNT):
+            red_alliance, blue_alliance, red_score, blue_score = self.result(index)
+            if index == self.CORRECTED and corrected_score:
+                red_score, blue_score = corrected_score
+            self.client.post(reverse('ranked-api:post_match_result', args=[game_mode.short_code]), {
+                'red_alliance': red_alliance, 'blue_alliance': blue_alliance,
+                'red_score': red_score, 'blue_score': blue_score,
+            }, content_type='application/json', HTTP_X_API_KEY=API_KEY)
+
+    @staticmethod
+    def snapshot(game_mode):
+        # Match numbers differ between the game modes, so history is compared by position
+        player_elos = PlayerElo.objects.filter(game_mode=game_mode).order_by('player_id')
+        return (
+            [(player_elo.player_id, round(player_elo.elo, 6), player_elo.matches_played, player_elo.matches_won,
+              player_elo.matches_lost, player_elo.matches_drawn, player_elo.total_score,
+              [round(elo, 6) for elo in get_elo_history(player_elo)[1]])
+             for player_elo in player_elos],
+            list(PlayerPairStats.objects.filter(game_mode=game_mode).order_by('player_id', 'other_id').values_list(
+                'player_id', 'other_id', 'wins_with', 'losses_with', 'draws_with',
+                'wins_against', 'losses_against', 'draws_against')),
+        )
+
+    def correct(self, packed=False):
+        self.post_all(self.corrected)
+        self.post_all(self.replayed, corrected_score=(7, 0))
+        if packed:
+            pack_elo_history(EloHistory.objects.filter(player_elo__game_mode=self.corrected))
+
+        match_number = Match.objects.filter(game_mode=self.corrected).order_by(
+            'match_number').values_list('match_number', flat=True)[self.CORRECTED]
+        response = self.client.patch(reverse('ranked-api:edit_match_result', args=['corrected']), {
+            'match_number': match_number, 'red_score': 7, 'blue_score': 0,
+        }, content_type='application/json', HTTP_X_API_KEY=API_KEY)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.snapshot(self.corrected), self.snapshot(self.replayed))
+        return response.json()
+
+    def test_matches_full_replay(self):
+        data = self.correct()
+        # Every later match except the ones between players 7-10
+        self.assertEqual(data['replayed_matches'], 15)
+
+    def test_matches_full_replay_from_packed_history(self):
+        # The elos to roll back to have to be read from the packed chunks
+        self.correct(packed=True)
+        self.assertTrue(EloHistoryChunk.objects.filter(player_elo__game_mode=self.corrected).exists())
+
+
+class GameModeStatsTestCase(IdempotentPostTestCase):
+    @staticmethod
+    def stats():
+        stats = GameModeStats.objects.get()
+        return stats.matches_played, stats.players_count, round(stats.average_elo, 6), stats.last_match_time
+
+    def test_updates_match_refresh(self):
+        self.post('post_match_result', self.result(1, 2, 'a'))
+        self.post('post_match_results', {'matches': [self.result(2, 3), self.result(3, 4), self.result(1, 4)]})
+        self.client.patch(reverse('ranked-api:edit_match_result', args=['test']), {
+            'match_number': Match.objects.order_by('match_number').first().match_number,
+            'red_score': 0, 'blue_score': 5,
+        }, content_type='application/json', HTTP_X_API_KEY=API_KEY)
+
+        updated = self.stats()
+        refresh_game_mode_stats(GameMode.objects.get())
+        self.assertEqual(updated, self.stats())
+        self.assertEqual(updated[:2], (4, 4))
+
+    def test_replayed_batch_changes_nothing(self):
+        self.post('post_match_result', self.result(1, 2, 'a'))
+        stats = self.stats()
+        self.post('post_match_results', {'matches': [self.result(1, 2, 'a')]})
+        self.assertEqual(self.stats(), stats)
+
+
+class ActivityTestCase(TestCase):
+    def setUp(self):
+        self.counted = GameMode.objects.create(
+            name='Counted', game='Test', players_per_alliance=1, short_code='counted')
+        self.uncounted = GameMode.objects.create(
+            name='Uncounted', game='Test', players_per_alliance=1, short_code='uncounted')
+
+    @staticmethod
+    def add_match(game_mode, time):
+        match = Match.objects.create(game_mode=game_mode, red_score=1, blue_score=0,
+                                     red_starting_elo=1000, blue_starting_elo=1000)
+        Match.objects.filter(match_number=match.match_number).update(time=time)
+        return match
+
+    def activity(self):
+        return {game_mode.short_code: game_mode.match_count for game_mode in get_game_modes_by_activity()}
+
+    def test_record_matches(self):
+        now = timezone.now()
+        record_matches(self.counted, time=now)
+        record_matches(self.counted, 2, now)
+        record_matches(self.counted, time=now - timedelta(days=1))
+
+        self.assertEqual(GameModeActivity.objects.get(
+            game_mode=self.counted, date=timezone.localdate(now)).match_count, 3)
+        self.assertEqual(GameModeActivity.objects.count(), 2)
+
+    def test_falls_back_per_game_mode(self):
+        now = timezone.now()
+        for game_mode in (self.counted, self.uncounted):
+            self.add_match(game_mode, now)
+            self.add_match(game_mode, now - timedelta(days=2))
+        # Only the counted game mode's matches were recorded as they were posted
+        record_matches(self.counted, time=now)
+        record_matches(self.counted, time=now - timedelta(days=2))
+
+        self.assertEqual(self.activity(), {'counted': 2, 'uncounted': 2})
+
+    def test_window_is_rolling(self):
+        now = timezone.now()
+        for game_mode in (self.counted, self.uncounted):
+            for days in (ACTIVITY_DAYS - 0.01, ACTIVITY_DAYS + 0.01):
+                self.add_match(game_mode, now - timedelta(days=days))
+        record_matches(self.counted, time=now - timedelta(days=ACTIVITY_DAYS - 0.01))
+        record_matches(self.counted, time=now - timedelta(days=ACTIVITY_DAYS + 0.01))
+
+        self.assertEqual(self.activity(), {'counted': 1, 'uncounted': 1})
+
+    def test_retimed_match_moves_day(self):
+        now = timezone.now()
+        yesterday = now - timedelta(days=1)
+        record_matches(self.counted, time=yesterday)
+        record_retimed_match(self.counted, yesterday, now)
+
+        self.assertEqual(dict(GameModeActivity.objects.values_list('date', 'match_count')), {
+            timezone.localdate(yesterday): 0, timezone.localdate(now): 1})
+
+
+class PairStatsTestCase(TestCase):
+    def setUp(self):
+        self.game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=2, short_code='test')
+        for user_id in range(1, 5):
+            create_user(user_id, f'player{user_id}')
+
+    def stats(self, player_id, other_id):
+        return PlayerPairStats.objects.filter(game_mode=self.game_mode, player_id=player_id, other_id=other_id).values(
+            *PAIR_STATS_FIELDS).first()
+
+    def test_pair_deltas(self):
+        deltas = pair_deltas([([1, 2], [3, 4], 3, 1, 1), ([1, 3], [2, 4], 2, 2, 1), ([1, 2], [3, 4], 0, 1, -1)])
+
+        self.assertEqual(dict(deltas[1, 2]), {'wins_with': 1, 'draws_against': 1, 'losses_with': -1})
+        self.assertEqual(dict(deltas[3, 1]), {'losses_against': 1, 'draws_with': 1, 'wins_against': -1})
+        self.assertNotIn((1, 1), deltas)
+
+    def test_record_and_remove(self):
+        record_pair_results(self.game_mode.id, [([1, 2], [3, 4], 3, 1, 1)])
+        record_pair_results(self.game_mode.id, [([1, 2], [3, 4], 3, 1, 1), ([1, 3], [2, 4], 0, 1, 1)])
+
+        self.assertEqual(PlayerPairStats.objects.count(), 12)
+        self.assertEqual(self.stats(1, 2), {**dict.fromkeys(PAIR_STATS_FIELDS, 0), 'wins_with': 2, 'losses_against': 1})
+        self.assertEqual(self.stats(4, 1), {**dict.fromkeys(PAIR_STATS_FIELDS, 0), 'losses_against': 2, 'wins_against': 1})
+
+        record_pair_results(self.game_mode.id, [([1, 2], [3, 4], 3, 1, -1), ([1, 3], [2, 4], 0, 1, -1)])
+        self.assertEqual(self.stats(1, 2), {**dict.fromkeys(PAIR_STATS_FIELDS, 0), 'wins_with': 1})
+
+
+class DistributionTestCase(TestCase):
+    def setUp(self):
+        self.game_mode = GameMode.objects.create(
+            name='Test Mode', game='Test', players_per_alliance=1, short_code='test')
+        GameMode.objects.create(name='Empty', game='Test', players_per_alliance=1, short_code='empty')
+        for user_id in range(1, 21):
+            PlayerElo.objects.create(player=create_user(user_id, f'player{user_id}'), game_mode=self.game_mode,
+                                     elo=900 + user_id * 10 + (500 if user_id == 20 else 0),
+                                     matches_played=user_id % 7)
+
+    def test_histogram_and_quantiles(self):
+        distribution = get_elo_distribution(self.game_mode, 5)
+
+        self.assertEqual(distribution['players_count'], 20)
+        self.assertEqual((distribution['min'], distribution['max']), (910, 1600))
+        self.assertEqual(sum(distribution['histogram']['counts']), 20)
+        self.assertEqual(len(distribution['histogram']['edges']), 6)
+        self.assertEqual(distribution['quantiles']['0.5'], 1005)
+
+    def test_tiers_match_leaderboard(self):
+        for mode in (LINEAR, QUANTILE):
+            with self.subTest(mode=mode), self.settings(RANKED_TIER_MODE=mode):
+                cache.clear()
+                tiers = get_elo_distribution(self.game_mode)['tiers']
+                boundaries = [tier['min_mmr'] for tier in tiers[:-1]]
+
+                self.assertEqual([tier['tier'] for tier in tiers], [tier for tier, _ in TIERS])
+                self.assertIsNone(tiers[-1]['min_mmr'])
+                # Nobody has played recently, so MMRs don't move between calls
+                mmrs = mmr_for(PlayerElo.objects.filter(game_mode=self.game_mode))
+                self.assertEqual([tier_for_mmr(mmr, boundaries) for mmr in mmrs], assign_tiers(mmrs, mode))
+
+    def test_endpoint(self):
+        url = reverse('ranked-api:get_distribution', args=['test'])
+        response = self.client.get(url, {'bins': 4})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['histogram']['counts']), 4)
+        self.assertEqual(self.client.get(reverse('ranked-api:get_distribution', args=['empty'])).json()['tiers'], [])
+        for bins in ('0', 'x', str(MAX_BINS + 1)):
+            self.assertEqual(self.client.get(url, {'bins': bins}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('ranked-api:get_distribution', args=['missing'])).status_code, 404)
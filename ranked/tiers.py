@@ -0,0 +1,91 @@
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+from django.conf import settings
+
+# Tiers from best to worst, each covering a tenth of the percentile range
+TIERS = [
+    ('Challenger', '#c7ffff'),
+    ('Grandmaster', '#eb8686'),
+    ('Master', '#f985cb'),
+    ('Diamond', '#c6d2ff'),
+    ('Platinum', '#54eac1'),
+    ('Gold', '#ebce75'),
+    ('Silver', '#d9d9d9'),
+    ('Bronze', '#b8a25e'),
+    ('Iron', '#ffffff'),
+    ('Stone', '#000000'),
+]
+# Upper percentile bound of every tier but the last
+THRESHOLDS = [(i + 1) / len(TIERS) for i in range(len(TIERS) - 1)]
+# Given to everyone when all players have the same MMR
+UNRANKED_TIER = ('Stone', '#ffffff')
+
+LINEAR = 'linear'
+QUANTILE = 'quantile'
+
+
+def tier_for_mmr(mmr: float, boundaries: Sequence[float]) -> Tuple[str, str]:
+    """
+    Gets the tier for an MMR given the boundaries from `tier_boundaries`.
+    """
+    return TIERS[bisect_left([-boundary for boundary in boundaries], -mmr)]
+
+
+def _linear_boundaries(highest_mmr: float, lowest_mmr: float) -> List[float]:
+    return [highest_mmr - threshold * (highest_mmr - lowest_mmr) for threshold in THRESHOLDS]
+
+
+def linear_tier(mmr: float, highest_mmr: float, lowest_mmr: float) -> Tuple[str, str]:
+    if highest_mmr == lowest_mmr:
+        return UNRANKED_TIER
+    return tier_for_mmr(mmr, _linear_boundaries(highest_mmr, lowest_mmr))
+
+
+def tier_boundaries(mmrs: Sequence[float], mode: Optional[str] = None) -> Optional[List[float]]:
+    """
+    Gets the lowest MMR that still reaches each tier but the last, from best
+    to worst, for a leaderboard with these MMRs. Returns None when everyone
+    has the same MMR and is unranked.
+    """
+    if not mmrs:
+        return []
+
+    mode = mode or settings.RANKED_TIER_MODE
+    highest_mmr = max(mmrs)
+    lowest_mmr = min(mmrs)
+    if highest_mmr == lowest_mmr:
+        return None
+
+    if mode == LINEAR:
+        return _linear_boundaries(highest_mmr, lowest_mmr)
+    if mode == QUANTILE:
+        ordered = sorted(mmrs)
+        count = len(mmrs)
+        # A percentile is the share of the others ranked strictly above, so each
+        # tier starts at the lowest MMR with at most its share of players above
+        boundaries = []
+        index = count - 1
+        for threshold in THRESHOLDS:
+            while index > 0 and (count - index) / (count - 1) <= threshold:
+                index -= 1
+            boundaries.append(ordered[index])
+        return boundaries
+
+    raise ValueError(f'Unknown tier mode {mode}.')
+
+
+def assign_tiers(mmrs: Sequence[float], mode: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Assigns a tier to every MMR on a leaderboard, in the same order.
+
+    'linear' places each MMR between the lowest and highest, so one outlier
+    pushes everyone else down. 'quantile' uses the share of players ranked
+    above, so each tier holds about a tenth of the board. Either way, players with
+    the same MMR always share a tier.
+    """
+    boundaries = tier_boundaries(mmrs, mode)
+    if boundaries is None:
+        return [UNRANKED_TIER] * len(mmrs)
+
+    negated = [-boundary for boundary in boundaries]
+    return [TIERS[bisect_left(negated, -mmr)] for mmr in mmrs]
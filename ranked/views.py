@@ -1,21 +1,18 @@
 from django.shortcuts import render, HttpResponseRedirect
-from django.db.models import Max, Min, F, Q, Count, ExpressionWrapper, FloatField
-from django.utils import timezone
-from datetime import datetime, timedelta
-import math
 
-from .models import EloHistory, GameMode, PlayerElo
-from .templatetags.rank_filter import mmr_to_rank
+from .activity import get_game_modes_by_activity
+from .history import downsample, get_elo_history
+from .mmr import mmr_for
+from .models import GameMode, PlayerElo
+from .tiers import assign_tiers
 
 # Create your views here.
 
+# More points than this can't be told apart on the elo history chart
+ELO_CHART_MAX_POINTS = 500
+
 def ranked_home(request):
-    game_modes = GameMode.objects.annotate(
-        match_count=Count(
-            'match',
-            filter=Q(match__time__gte=timezone.now() - timedelta(days=7))
-        )
-    ).order_by('-match_count')
+    game_modes = get_game_modes_by_activity()
 
     # Create a dictionary mapping game name to array of game modes
     game_dict = {}
@@ -35,40 +32,19 @@ def leaderboard(request, name):
 
     gamemode = gamemode[0]
 
-    players = PlayerElo.objects.filter(game_mode=gamemode)
-    players = players.annotate(
-        time_delta=ExpressionWrapper(
-            datetime.now(timezone.utc) - F('last_match_played_time'),
-            output_field=FloatField()
-        ) / 3600000000
-    )
-
-    # Calculate MMR
-    players = players.annotate(
-        mmr=ExpressionWrapper(
-            F('elo') * 2 / (
-                (1 + pow(math.e, 1/168 * pow(F('time_delta'), 0.63))) *
-                (1 + pow(math.e, -0.33 * F('matches_played')))
-            ),
-            output_field=FloatField()
-        )
-    )
-
-    # Get highest and lowest MMR values
-    highest_mmr = players.aggregate(Max('mmr'))['mmr__max']
-    lowest_mmr = players.aggregate(Min('mmr'))['mmr__min']
-
-    players_with_rank = []
-    for player in players:
-        rank, color = mmr_to_rank(player.mmr, highest_mmr, lowest_mmr)
-        players_with_rank.append({
-            'player': player,
-            'rank': rank,
-            'color': color,
-        })
-
-    # Sort players_with_rank by MMR in descending order
-    players_with_rank = sorted(players_with_rank, key=lambda x: x['player'].mmr, reverse=True)
+    players = list(PlayerElo.objects.filter(game_mode=gamemode).select_related('player'))
+    for player, player_mmr in zip(players, mmr_for(players)):
+        player.mmr = player_mmr
+
+    # Sort players by MMR in descending order, then tier the whole board at once
+    players = sorted(players, key=lambda player: player.mmr, reverse=True)
+    tiers = assign_tiers([player.mmr for player in players])
+
+    players_with_rank = [{
+        'player': player,
+        'rank': rank,
+        'color': color,
+    } for player, (rank, color) in zip(players, tiers)]
 
     context = {
         'leaderboard_code': gamemode.short_code,
@@ -90,15 +66,11 @@ def player_info(request, name, player_id):
 
     player = player_info[0]
 
-    mmr = round(mmr_calc(player.elo, player.matches_played, (datetime.now(timezone.utc) - player.last_match_played_time).total_seconds()/3600), 1)
+    mmr = round(mmr_for([player])[0], 1)
 
-    elo_history = EloHistory.objects.filter(player_elo=player)
-    match_labels = [eh.match_number for eh in elo_history]
-    elo_history = [eh.elo for eh in elo_history]
+    match_labels, elo_history = downsample(
+        *get_elo_history(player), ELO_CHART_MAX_POINTS)
 
     context = {'player': player, 'mmr': mmr,
                'elo_history': elo_history, 'match_labels': match_labels}
     return render(request, 'ranked/player_info.html', context)
-
-def mmr_calc(elo, matches_played, delta_hours):
-    return elo * 2 / ((1 + pow(math.e, 1/168 * pow(delta_hours, 0.63))) * (1 + pow(math.e, -0.33 * matches_played)))
@@ -3,10 +3,46 @@ from .models import *
 
 # Register your models here.
 
+class AllianceAdmin(admin.ModelAdmin):
+    # Kept up to date from the published matchups; rebuild with the rebuild_standings command
+    readonly_fields = STANDINGS_FIELDS
+
+
+class MatchupGameInline(admin.TabularInline):
+    model = MatchupGame
+    fields = ('game_index', 'red', 'blue')
+
+    def get_extra(self, request, obj=None, **kwargs):
+        # Blank rows for the rest of the series
+        if obj is None:
+            return Matchup().game_count
+        return max(obj.game_count - obj.games.count(), 0)
+
+
 class MatchupAdmin(admin.ModelAdmin):
     list_display = ('red_alliance', 'blue_alliance', 'winner', 'week')
     list_filter = ('red_alliance', 'blue_alliance')
     search_fields = ('red_alliance__name', 'blue_alliance__name')
+    exclude = [field for fields in LEGACY_GAME_FIELDS for field in fields]
+    inlines = [MatchupGameInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('red_alliance', 'blue_alliance').prefetch_related('games')
+
+    def save_formset(self, request, form, formset, change):
+        # The games don't move the standings one at a time here; save_related moves them once
+        games = formset.save(commit=False)
+        for game in formset.deleted_objects:
+            game.delete(refresh_standings=False)
+        for game in games:
+            game.save(refresh_standings=False)
+        formset.save_m2m()
+
+    def save_related(self, request, form, formsets, change):
+        # The games are saved after the matchup, so move the standings to the new scores here
+        old = Matchup.objects.prefetch_related('games').get(pk=form.instance.pk)
+        super().save_related(request, form, formsets, change)
+        update_standings(old, Matchup.objects.prefetch_related('games').get(pk=form.instance.pk))
 
-admin.site.register(Alliance)
-admin.site.register(Matchup, MatchupAdmin)
\ No newline at end of file
+admin.site.register(Alliance, AllianceAdmin)
+admin.site.register(Matchup, MatchupAdmin)
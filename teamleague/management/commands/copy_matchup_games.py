@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from teamleague.models import LEGACY_GAME_FIELDS, Matchup, MatchupGame, calculate_rankings
+
+
+class Command(BaseCommand):
+    help = 'Copies the legacy match_N_red/match_N_blue columns into MatchupGame rows, then rebuilds the standings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replace', action='store_true',
+                            help='Also copy matchups that already have games, replacing them.')
+
+    def handle(self, *args, **options):
+        matchups = Matchup.objects.all()
+        if not options['replace']:
+            matchups = matchups.filter(games__isnull=True)
+        columns = [field for fields in LEGACY_GAME_FIELDS for field in fields]
+
+        games = []
+        copied = []
+        for pk, *scores in matchups.values_list('pk', *columns):
+            copied.append(pk)
+            for index in range(len(LEGACY_GAME_FIELDS)):
+                red, blue = scores[2 * index], scores[2 * index + 1]
+                if red is not None or blue is not None:
+                    games.append(MatchupGame(matchup_id=pk, game_index=index + 1, red=red, blue=blue))
+
+        with transaction.atomic():
+            MatchupGame.objects.filter(matchup_id__in=copied).delete()
+            MatchupGame.objects.bulk_create(games, batch_size=1000)
+            calculate_rankings()
+
+        self.stdout.write(f'{len(copied)} matchups, {len(games)} games copied')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from teamleague.models import Alliance, calculate_rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds every alliance\'s wins, tiebreaker, differential and total points from the published matchups.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            calculate_rankings()
+
+        self.stdout.write(f'Standings rebuilt for {Alliance.objects.count()} alliances')
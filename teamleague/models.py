@@ -1,6 +1,5 @@
-from django.db import models
-from django.db.models import Window, F, Count
-from django.db.models.functions import Rank
+from collections import Counter
+from django.db import models, transaction
 from SRCweb import settings
 
 # Create your models here.
@@ -41,6 +40,9 @@ class Alliance(models.Model):
         return self.player3_user
 
 
+STANDINGS_FIELDS = ['wins', 'tiebreaker', 'differential', 'total_points']
+
+
 class Matchup(models.Model):
     week = models.IntegerField()
 
@@ -49,85 +51,67 @@ class Matchup(models.Model):
 
     published = models.BooleanField(default=False)
 
-    def get_red_wins(self):
-        red_wins = 0
-
-        if self.match_1_red != None and self.match_1_blue != None:
-            if self.match_1_red > self.match_1_blue:
-                red_wins += 1
-
-        if self.match_2_red != None and self.match_2_blue != None:
-            if self.match_2_red > self.match_2_blue:
-                red_wins += 1
+    # The first alliance to win this many games takes the matchup
+    wins_needed = models.PositiveIntegerField(default=4)
 
-        if self.match_3_red != None and self.match_3_blue != None:
-            if self.match_3_red > self.match_3_blue:
-                red_wins += 1
-
-        if self.match_4_red != None and self.match_4_blue != None:
-            if self.match_4_red > self.match_4_blue:
-                red_wins += 1
-
-        if self.match_5_red != None and self.match_5_blue != None:
-            if self.match_5_red > self.match_5_blue:
-                red_wins += 1
-
-        if self.match_6_red != None and self.match_6_blue != None:
-            if self.match_6_red > self.match_6_blue:
-                red_wins += 1
-
-        if self.match_7_red != None and self.match_7_blue != None:
-            if self.match_7_red > self.match_7_blue:
-                red_wins += 1
+    @property
+    def game_count(self):
+        return 2 * self.wins_needed - 1
+
+    def results(self):
+        """
+        Walks the games once, returning (red wins, blue wins, red total score, blue total score).
+        Reads the prefetched games when the matchup was loaded with prefetch_related('games').
+        """
+        red_wins = blue_wins = red_total = blue_total = 0
+        for game in self.games.all():
+            red_total += int(game.red or 0)
+            blue_total += int(game.blue or 0)
+            if game.red is not None and game.blue is not None:
+                if game.red > game.blue:
+                    red_wins += 1
+                elif game.red < game.blue:
+                    blue_wins += 1
+        return red_wins, blue_wins, red_total, blue_total
 
-        return red_wins
+    def get_red_wins(self):
+        return self.results()[0]
 
     def get_blue_wins(self):
-        blue_wins = 0
-        if self.match_1_red != None and self.match_1_blue != None:
-            if self.match_1_red < self.match_1_blue:
-                blue_wins += 1
-
-        if self.match_2_red != None and self.match_2_blue != None:
-            if self.match_2_red < self.match_2_blue:
-                blue_wins += 1
-
-        if self.match_3_red != None and self.match_3_blue != None:
-            if self.match_3_red < self.match_3_blue:
-                blue_wins += 1
-
-        if self.match_4_red != None and self.match_4_blue != None:
-            if self.match_4_red < self.match_4_blue:
-                blue_wins += 1
-
-        if self.match_5_red != None and self.match_5_blue != None:
-            if self.match_5_red < self.match_5_blue:
-                blue_wins += 1
-
-        if self.match_6_red != None and self.match_6_blue != None:
-            if self.match_6_red < self.match_6_blue:
-                blue_wins += 1
-
-        if self.match_7_red != None and self.match_7_blue != None:
-            if self.match_7_red < self.match_7_blue:
-                blue_wins += 1
-
-        return blue_wins
+        return self.results()[1]
 
     def winner(self):
-        if self.get_red_wins() >= 4:
-            return 'r'
-        elif self.get_blue_wins() >= 4:
-            return 'b'
-        else:
-            return 'u'
+        red_wins, blue_wins, _, _ = self.results()
+        return _winner(red_wins, blue_wins, self.wins_needed)
 
     def get_red_total_score(self):
-        return int(self.match_1_red or 0) + int(self.match_2_red or 0) + int(self.match_3_red or 0) + int(self.match_4_red or 0) + int(self.match_5_red or 0) + int(self.match_6_red or 0) + int(self.match_7_red or 0)
-    
+        return self.results()[2]
+
     def get_blue_total_score(self):
-        return int(self.match_1_blue or 0) + int(self.match_2_blue or 0) + int(self.match_3_blue or 0) + int(self.match_4_blue or 0) + int(self.match_5_blue or 0) + int(self.match_6_blue or 0) + int(self.match_7_blue or 0)
+        return self.results()[3]
 
+    @property
+    def visible_games(self):
+        """
+        The games to list for the matchup. The first `wins_needed` are always
+        listed; game N after that once it has been played, or once N - 1 games
+        have been decided without a winner.
+        """
+        red_wins, blue_wins, _, _ = self.results()
+        played = red_wins + blue_wins
+        undecided = _winner(red_wins, blue_wins, self.wins_needed) == 'u'
+        games = {game.game_index: game for game in self.games.all()}
+
+        visible = []
+        for number in range(1, self.game_count + 1):
+            if number > self.wins_needed and not (
+                    self.published and ((played >= number - 1 and undecided) or played >= number)):
+                break
+            visible.append(games.get(number) or MatchupGame(matchup=self, game_index=number))
+        return visible
+
+    # Legacy per-game columns, only read by the copy_matchup_games command.
+    # Scores live in MatchupGame; drop these once every matchup has been copied.
     match_1_red = models.IntegerField(null=True, blank=True)
     match_1_blue = models.IntegerField(null=True, blank=True)
 
@@ -149,88 +133,164 @@ class Matchup(models.Model):
     match_7_red = models.IntegerField(null=True, blank=True)
     match_7_blue = models.IntegerField(null=True, blank=True)
 
-    @property
-    def show_match_5(self):
-        return (self.get_red_wins() + self.get_blue_wins() >= 4 and self.winner() == 'u') or self.get_red_wins() + self.get_blue_wins() >= 5
-
-    @property
-    def show_match_6(self):
-        return (self.get_red_wins() + self.get_blue_wins() >= 5 and self.winner() == 'u') or self.get_red_wins() + self.get_blue_wins() >= 6
-
-    @property
-    def show_match_7(self):
-        return (self.get_red_wins() + self.get_blue_wins() >= 6 and self.winner() == 'u') or self.get_red_wins() + self.get_blue_wins() >= 7
-
     def __str__(self):
         return "Week " + str(self.week) + " - " + self.red_alliance.name + " vs " + self.blue_alliance.name
     
     def save(self, *args, **kwargs):
-        super(Matchup, self).save(*args, **kwargs)
-        calculate_rankings()
+        with transaction.atomic():
+            old = Matchup.objects.prefetch_related('games').filter(pk=self.pk).first() if self.pk else None
+            super(Matchup, self).save(*args, **kwargs)
+            update_standings(old, self)
 
-def calculate_rankings():
-    teams = Alliance.objects.all()
-    matchups = Matchup.objects.filter(published=True)
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Read the games before they are deleted along with the matchup
+            old = Matchup.objects.prefetch_related('games').get(pk=self.pk)
+            result = super(Matchup, self).delete(*args, **kwargs)
+            update_standings(old, None)
+        return result
 
-    for team in teams:
-        red_matchups = matchups.filter(red_alliance=team)
-        blue_matchups = matchups.filter(blue_alliance=team)
 
-        wins = 0
-        differential = 0
-        total_points = 0
+# (red, blue) legacy column names for each game, in order
+LEGACY_GAME_FIELDS = [(f'match_{i}_red', f'match_{i}_blue') for i in range(1, 8)]
 
-        for matchup in red_matchups:
 
-            if matchup.winner() == 'r':
-                wins += 1
-            
-            differential += (matchup.get_red_total_score() - matchup.get_blue_total_score())
+class MatchupGame(models.Model):
+    matchup = models.ForeignKey(Matchup, on_delete=models.CASCADE, related_name='games')
+    game_index = models.PositiveIntegerField()
 
-            total_points += matchup.get_red_total_score()
-        
-        for matchup in blue_matchups:
+    red = models.IntegerField(null=True, blank=True)
+    blue = models.IntegerField(null=True, blank=True)
 
-            if matchup.winner() == 'b':
-                wins += 1
-            
-            differential += (matchup.get_blue_total_score() - matchup.get_red_total_score())
+    class Meta:
+        ordering = ['game_index']
+        constraints = [
+            models.UniqueConstraint(fields=['matchup', 'game_index'], name='unique_matchup_game'),
+        ]
 
-            total_points += matchup.get_blue_total_score()
-
-        team.wins = wins
-        team.tiebreaker = None
-        team.differential = differential
-        team.total_points = total_points
-        team.save()
-    
-    teams = Alliance.objects.filter()
-
-
-    duplicates = teams.values('wins').annotate(count=Count('wins')).filter(count__gt=1)
-    for count in duplicates:
-        wins = count['wins']
-        if wins == 0:
+    def __str__(self):
+        return f'{self.matchup} - Game {self.game_index}'
+
+    def save(self, *args, refresh_standings=True, **kwargs):
+        # Pass refresh_standings=False when the caller moves the standings itself, as the admin does
+        if not refresh_standings:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            old = Matchup.objects.prefetch_related('games').get(pk=self.matchup_id)
+            super().save(*args, **kwargs)
+            if old.published:
+                update_standings(old, Matchup.objects.prefetch_related('games').get(pk=self.matchup_id))
+
+    def delete(self, *args, refresh_standings=True, **kwargs):
+        if not refresh_standings:
+            return super().delete(*args, **kwargs)
+        with transaction.atomic():
+            old = Matchup.objects.prefetch_related('games').get(pk=self.matchup_id)
+            result = super().delete(*args, **kwargs)
+            if old.published:
+                update_standings(old, Matchup.objects.prefetch_related('games').get(pk=self.matchup_id))
+        return result
+
+
+def _winner(red_wins, blue_wins, wins_needed):
+    if red_wins >= wins_needed:
+        return 'r'
+    elif blue_wins >= wins_needed:
+        return 'b'
+    else:
+        return 'u'
+
+
+def _standings_changes(matchup, sign, changes):
+    """
+    Adds (or with a sign of -1, removes) a matchup's wins, differential and
+    total points to the per-alliance changes. Unpublished matchups count for nothing.
+    """
+    if matchup is None or not matchup.published:
+        return
+    red_wins, blue_wins, red_total, blue_total = matchup.results()
+    winner = _winner(red_wins, blue_wins, matchup.wins_needed)
+    for alliance_id, side, points, against in ((matchup.red_alliance_id, 'r', red_total, blue_total),
+                                               (matchup.blue_alliance_id, 'b', blue_total, red_total)):
+        change = changes.setdefault(alliance_id, [0, 0, 0])
+        change[0] += sign * (winner == side)
+        change[1] += sign * (points - against)
+        change[2] += sign * points
+
+
+def _assign_tiebreakers(teams, matchups):
+    """
+    Sets the tiebreaker of every given team to its head-to-head wins against
+    the other teams on the same number of wins. Teams that are not tied, or are
+    tied on 0 wins, get 0. Every team in a win-group must be passed in.
+    """
+    wins = {team.pk: team.wins for team in teams}
+    group_sizes = Counter(wins.values())
+    tiebreakers = dict.fromkeys(wins, 0)
+
+    for matchup in matchups:
+        red_wins = wins.get(matchup.red_alliance_id)
+        if not red_wins or red_wins != wins.get(matchup.blue_alliance_id) or group_sizes[red_wins] < 2:
             continue
-        tied_teams = teams.filter(wins=wins)
+        winner = matchup.winner()
+        if winner == 'r':
+            tiebreakers[matchup.red_alliance_id] += 1
+        elif winner == 'b':
+            tiebreakers[matchup.blue_alliance_id] += 1
 
-        matchups = Matchup.objects.filter(published=True, red_alliance__in=tied_teams, blue_alliance__in=tied_teams)
-
-        for team in tied_teams:
-            red_matchups = matchups.filter(red_alliance=team)
-            blue_matchups = matchups.filter(blue_alliance=team)
+    for team in teams:
+        team.tiebreaker = tiebreakers[team.pk]
+
+
+def update_standings(old, new):
+    """
+    Moves the standings from a matchup's old state to its new one (either may be
+    None for a created or deleted matchup). Only the matchup's alliances have
+    their totals changed; tiebreakers are then recomputed for the win-groups
+    those alliances left or joined.
+    """
+    changes = {}
+    _standings_changes(old, -1, changes)
+    _standings_changes(new, 1, changes)
+    changes = {alliance_id: change for alliance_id, change in changes.items() if any(change)}
+    if not changes:
+        return
+
+    changed = list(Alliance.objects.filter(pk__in=changes))
+    groups = set()
+    for team in changed:
+        wins_change, differential_change, points_change = changes[team.pk]
+        if wins_change:
+            groups.update((team.wins or 0, (team.wins or 0) + wins_change))
+        team.wins = (team.wins or 0) + wins_change
+        team.differential = (team.differential or 0) + differential_change
+        team.total_points = (team.total_points or 0) + points_change
+        team.tiebreaker = team.tiebreaker or 0
+
+    teams = changed
+    if groups:
+        teams = changed + list(Alliance.objects.filter(wins__in=groups).exclude(pk__in=changes))
+        grouped = [team for team in teams if team.wins in groups]
+        grouped_ids = [team.pk for team in grouped]
+        _assign_tiebreakers(grouped, Matchup.objects.filter(
+            published=True, red_alliance__in=grouped_ids, blue_alliance__in=grouped_ids).prefetch_related('games'))
+
+    Alliance.objects.bulk_update(teams, STANDINGS_FIELDS)
 
-            tiebreaker = 0
 
-            for matchup in red_matchups:
-                if matchup.winner() == 'r':
-                    tiebreaker += 1
-            
-            for matchup in blue_matchups:
-                if matchup.winner() == 'b':
-                    tiebreaker += 1
-            
-            team.tiebreaker = tiebreaker
-            team.save()
+def calculate_rankings():
+    """
+    Rebuilds every alliance's standings from scratch, reading the published
+    matchups once.
+    """
+    teams = list(Alliance.objects.all())
+    matchups = list(Matchup.objects.filter(published=True).prefetch_related('games'))
+
+    changes = {}
+    for matchup in matchups:
+        _standings_changes(matchup, 1, changes)
+    for team in teams:
+        team.wins, team.differential, team.total_points = changes.get(team.pk, (0, 0, 0))
 
-    Alliance.objects.filter(tiebreaker=None).update(tiebreaker=0)
+    _assign_tiebreakers(teams, matchups)
+    Alliance.objects.bulk_update(teams, STANDINGS_FIELDS)
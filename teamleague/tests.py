@@ -1,3 +1,155 @@
+import random
+import unittest
+from io import StringIO
+from django.apps import apps
+from django.core.management import call_command
 from django.test import TestCase
 
+if not apps.is_installed('teamleague'):
+    raise unittest.SkipTest('teamleague is not in INSTALLED_APPS')
+
+from .models import Alliance, Matchup, MatchupGame, STANDINGS_FIELDS, calculate_rankings, update_standings
+
 # Create your tests here.
+
+class StandingsTestCase(TestCase):
+    """
+    Moving the standings a matchup at a time must always match a rebuild.
+    """
+    def setUp(self):
+        self.alliances = [Alliance.objects.create(key=f'a{i}', name=f'Alliance {i}') for i in range(6)]
+        calculate_rankings()
+
+    def standings(self):
+        return {alliance.pk: [getattr(alliance, field) for field in STANDINGS_FIELDS]
+                for alliance in Alliance.objects.all()}
+
+    def assert_matches_rebuild(self):
+        incremental = self.standings()
+        calculate_rankings()
+        self.assertEqual(incremental, self.standings())
+
+    def set_games(self, matchup, scores):
+        # As the admin saves a matchup's games: after the matchup, then moving the standings
+        old = Matchup.objects.prefetch_related('games').get(pk=matchup.pk)
+        matchup.games.all().delete()
+        MatchupGame.objects.bulk_create([MatchupGame(matchup=matchup, game_index=index, red=red, blue=blue)
+                                         for index, (red, blue) in enumerate(scores, start=1)])
+        update_standings(old, Matchup.objects.prefetch_related('games').get(pk=matchup.pk))
+
+    def test_save_publish_edit_delete(self):
+        first = Matchup.objects.create(week=1, red_alliance=self.alliances[0], blue_alliance=self.alliances[1])
+        self.set_games(first, [(10, 5)] * 4)
+        self.assert_matches_rebuild()
+        self.assertEqual(Alliance.objects.get(pk=self.alliances[0].pk).wins, 0)
+
+        first.published = True
+        first.save()
+        self.assert_matches_rebuild()
+        self.assertEqual(Alliance.objects.get(pk=self.alliances[0].pk).wins, 1)
+
+        # Alliances 0 and 2 end up tied, so the head-to-head tiebreaker matters
+        second = Matchup.objects.create(week=2, red_alliance=self.alliances[2], blue_alliance=self.alliances[3],
+                                        published=True)
+        self.set_games(second, [(7, 3)] * 4)
+        third = Matchup.objects.create(week=3, red_alliance=self.alliances[0], blue_alliance=self.alliances[2],
+                                       published=True)
+        self.set_games(third, [(1, 2)] * 4)
+        self.assert_matches_rebuild()
+
+        self.set_games(third, [(2, 1)] * 3 + [(1, 2)] * 2)
+        self.assert_matches_rebuild()
+
+        third.delete()
+        self.assert_matches_rebuild()
+
+    def test_random_operations(self):
+        rng = random.Random(4)
+        matchups = []
+        for _ in range(60):
+            operation = rng.random()
+            if operation < 0.35 or not matchups:
+                red, blue = rng.sample(self.alliances, 2)
+                matchups.append(Matchup.objects.create(week=rng.randint(1, 5), red_alliance=red, blue_alliance=blue,
+                                                       published=rng.random() < 0.7))
+            elif operation < 0.7:
+                self.set_games(rng.choice(matchups), [(rng.randint(0, 3), rng.randint(0, 3))
+                                                      for _ in range(rng.randint(0, 7))])
+            elif operation < 0.9:
+                matchup = rng.choice(matchups)
+                matchup.published = not matchup.published
+                matchup.save()
+            else:
+                matchups.pop(rng.randrange(len(matchups))).delete()
+            self.assert_matches_rebuild()
+
+    def test_rebuild_command(self):
+        matchup = Matchup.objects.create(week=1, red_alliance=self.alliances[0], blue_alliance=self.alliances[1],
+                                         published=True)
+        self.set_games(matchup, [(10, 5)] * 4)
+        expected = self.standings()
+        Alliance.objects.update(wins=None, tiebreaker=None, differential=None, total_points=None)
+
+        call_command('rebuild_standings', stdout=StringIO())
+        self.assertEqual(self.standings(), expected)
+
+
+class MatchupGamesTestCase(TestCase):
+    def setUp(self):
+        self.red = Alliance.objects.create(key='red', name='Red')
+        self.blue = Alliance.objects.create(key='blue', name='Blue')
+        calculate_rankings()
+
+    def test_results_and_visible_games(self):
+        matchup = Matchup.objects.create(week=1, red_alliance=self.red, blue_alliance=self.blue)
+        for index, (red, blue) in enumerate([(10, 5), (5, 10), (8, 2), (3, 7)], start=1):
+            MatchupGame.objects.create(matchup=matchup, game_index=index, red=red, blue=blue)
+
+        self.assertEqual(matchup.results(), (2, 2, 26, 24))
+        self.assertEqual(matchup.winner(), 'u')
+        self.assertEqual([game.game_index for game in matchup.visible_games], [1, 2, 3, 4])
+
+        # Once published, the next game is listed while the series is still open
+        matchup.published = True
+        matchup.save()
+        visible = matchup.visible_games
+        self.assertEqual([game.game_index for game in visible], [1, 2, 3, 4, 5])
+        self.assertIsNone(visible[4].pk)
+
+        MatchupGame.objects.create(matchup=matchup, game_index=5, red=9, blue=1)
+        self.assertEqual([game.game_index for game in matchup.visible_games], [1, 2, 3, 4, 5, 6])
+
+        MatchupGame.objects.create(matchup=matchup, game_index=6, red=9, blue=1)
+        self.assertEqual(matchup.winner(), 'r')
+        self.assertEqual([game.game_index for game in matchup.visible_games], [1, 2, 3, 4, 5, 6])
+
+    def test_direct_game_changes_move_standings(self):
+        matchup = Matchup.objects.create(week=1, red_alliance=self.red, blue_alliance=self.blue, published=True)
+        games = [MatchupGame.objects.create(matchup=matchup, game_index=index, red=10, blue=5)
+                 for index in range(1, 5)]
+        self.assertEqual(Alliance.objects.get(pk=self.red.pk).wins, 1)
+        self.assertEqual(Alliance.objects.get(pk=self.blue.pk).total_points, 20)
+
+        games[0].blue = 20
+        games[0].save()
+        games[1].delete()
+        red = Alliance.objects.get(pk=self.red.pk)
+        self.assertEqual((red.wins, red.differential, red.total_points), (0, 0, 30))
+
+    def test_copy_legacy_games(self):
+        legacy = {'match_1_red': 10, 'match_1_blue': 5, 'match_2_red': 4, 'match_2_blue': 6,
+                  'match_3_red': 7, 'match_3_blue': 0, 'match_4_red': 8, 'match_4_blue': 8,
+                  'match_5_red': 9, 'match_5_blue': 2, 'match_6_red': 6, 'match_6_blue': None}
+        copied = Matchup.objects.create(week=1, red_alliance=self.red, blue_alliance=self.blue, published=True,
+                                        **legacy)
+        untouched = Matchup.objects.create(week=2, red_alliance=self.blue, blue_alliance=self.red)
+        MatchupGame.objects.create(matchup=untouched, game_index=1, red=1, blue=0)
+        call_command('copy_matchup_games', stdout=StringIO())
+
+        self.assertEqual([(game.game_index, game.red, game.blue) for game in copied.games.all()],
+                         [(1, 10, 5), (2, 4, 6), (3, 7, 0), (4, 8, 8), (5, 9, 2), (6, 6, None)])
+        # Wins count decided games; totals count every score that was entered
+        self.assertEqual(copied.results(), (3, 1, 44, 21))
+        self.assertEqual(untouched.games.count(), 1)
+        red = Alliance.objects.get(pk=self.red.pk)
+        self.assertEqual((red.wins, red.differential, red.total_points), (0, 23, 44))
@@ -1,4 +1,5 @@
-from django.db.models import Q
+from django.db.models import Q, Window, F
+from django.db.models.functions import Rank
 from django.shortcuts import render
 from .models import *
 
@@ -12,7 +13,7 @@ def index(response):
         )
     ).order_by("rank")
 
-    matchups = Matchup.objects.all()
+    matchups = Matchup.objects.select_related('red_alliance', 'blue_alliance').prefetch_related('games')
 
     week1_matchups = matchups.filter(week=1)
     week2_matchups = matchups.filter(week=2)
@@ -26,7 +27,8 @@ def index(response):
 def team_page(response, team_code):
     team = Alliance.objects.get(key=team_code)
 
-    matchups = Matchup.objects.filter(Q(red_alliance=team) | Q(blue_alliance=team)).order_by('week')
+    matchups = Matchup.objects.filter(Q(red_alliance=team) | Q(blue_alliance=team)).select_related(
+        'red_alliance', 'blue_alliance').prefetch_related('games').order_by('week')
 
     context = {'team': team, 'matchups':matchups}
     return render(response, "teamleague/team_page.html", context)